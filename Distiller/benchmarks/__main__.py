@@ -0,0 +1,8 @@
+import sys
+
+from bench import main
+
+__author__ = 'fcanas'
+
+
+sys.exit(main())
@@ -0,0 +1,253 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+import nltk
+
+from Distiller.distiller import Distiller
+from Distiller.preprocessing.pipeline import shared_tagger
+from Distiller.preprocessing.taggers import accuracy
+from Distiller.preprocessing.tokens import TokenStream
+from synthetic import SyntheticCorpus
+
+__author__ = 'fcanas'
+
+
+def run_size(config):
+    """
+    Input: {documents, length, vocabulary, seed, format, nlp_args, run_args}
+    Generate a synthetic corpus of that size, run Distiller over it and collect its metrics.
+    Output: {documents, tokens, seconds, peak_rss_kb, stages: {stage: timing}, caches} where each
+    timing is as in metrics.json, with documents_per_second added.
+    """
+    path = tempfile.mkdtemp(prefix='distiller-bench-')
+    try:
+        corpus = SyntheticCorpus(config['documents'], config['length'], config['vocabulary'], config['seed'])
+        document_file = corpus.write(os.path.join(path, 'corpus.' + config['format']))
+        start = time.time()
+        distiller = Distiller(document_file, os.path.join(path, 'reports'), config['nlp_args'], verbosity=0,
+                              run_args=dict(config['run_args'], metrics=False))
+        seconds = time.time() - start
+        report = distiller.metrics.report()
+    finally:
+        shutil.rmtree(path)
+
+    documents = config['documents']
+    for timing in report['stages'].values():
+        timing['documents_per_second'] = documents / max(timing['seconds'], 1e-9)
+    return {
+        'documents': documents,
+        'tokens': report['tokens'],
+        'seconds': seconds,
+        'documents_per_second': documents / max(seconds, 1e-9),
+        'tokens_per_second': report['tokens'] / max(seconds, 1e-9),
+        'peak_rss_kb': report['peak_rss_kb'],
+        'stages': report['stages'],
+        'caches': report['caches']
+    }
+
+
+def run_benchmark(sizes, length=200, vocabulary=5000, seed=0, corpus_format='json', nlp_args=None,
+                  run_args=None):
+    """
+    Run the benchmark for each corpus size, every size in a fresh process so that its peak
+    memory is its own.
+    Output: the results, ready to be saved as a baseline.
+    """
+    config = {
+        'length': length,
+        'vocabulary': vocabulary,
+        'seed': seed,
+        'format': corpus_format,
+        'nlp_args': nlp_args if nlp_args is not None else Distiller.default_args,
+        'run_args': run_args or {}
+    }
+    runs = []
+    for size in sizes:
+        pool = multiprocessing.Pool(1, maxtasksperchild=1)
+        try:
+            runs.append(pool.apply(run_size, (dict(config, documents=size),)))
+        finally:
+            pool.close()
+            pool.join()
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'nltk': nltk.__version__,
+            'cpus': multiprocessing.cpu_count()
+        },
+        'config': config,
+        'runs': runs
+    }
+
+
+def compare_taggers(taggers, sentences, gold=None):
+    """
+    Tag the same sentences with each of taggers, [(name, tagger), ...], in one batch each.
+    Accuracy is the share of words tagged as in gold, the tagged sentences, when given, or else as
+    by the first of taggers, the reference.
+    Output: [{tagger, tokens, seconds, tokens_per_second, accuracy}, ...] for each tagger.
+    """
+    tokens = sum(len(sentence) for sentence in sentences)
+    results = []
+    reference = gold
+    for name, tagger in taggers:
+        start = time.time()
+        tagged = tagger.tag_sents(sentences)
+        seconds = time.time() - start
+        if reference is None:
+            reference = tagged
+        results.append({
+            'tagger': name,
+            'tokens': tokens,
+            'seconds': seconds,
+            'tokens_per_second': tokens / max(seconds, 1e-9),
+            'accuracy': accuracy(tagged, reference)
+        })
+    return results
+
+
+def load_taggers(names):
+    """
+    Input: [backend or backend:model path, ...] of Pipeline's tagger backends.
+    Output: [(name, tagger), ...] of the loaded taggers.
+    """
+    taggers = []
+    for name in names:
+        backend, model = name.split(':', 1) if ':' in name else (name, None)
+        taggers.append((name, shared_tagger(backend, model)))
+    return taggers
+
+
+def load_gold(gold):
+    """
+    Output: [[(word, tag), ...], ...] the tagged sentences of nltk's treebank sample for 'treebank',
+    or else of the JSON file gold holds the path of.
+    """
+    if gold == 'treebank':
+        from nltk.corpus import treebank
+        return [[(word, tag) for word, tag in sentence if tag != '-NONE-'] for sentence in treebank.tagged_sents()]
+    with open(gold) as sentences:
+        return [[tuple(pair) for pair in sentence] for sentence in json.load(sentences)]
+
+
+def format_taggers(results):
+    """
+    Output: the results of compare_taggers as a table, one line per tagger.
+    """
+    return '\n'.join("{0:<30}{1:>10.3f}s {2:>12.0f} tokens/s {3:>8.1%} accuracy".format(
+        result['tagger'], result['seconds'], result['tokens_per_second'], result['accuracy']) for result in results)
+
+
+def compare(results, baseline, threshold=0.25, min_seconds=0.05):
+    """
+    Compare results against a baseline, run by run for the corpus sizes they share.
+    A stage regressed when it took more than (1 + threshold) times its baseline time, ignoring
+    stages faster than min_seconds in both, and a run regressed when its peak memory grew by
+    more than threshold.
+    Output: [(documents, stage or 'peak_rss_kb', baseline value, value, ratio), ...] of the
+    regressions.
+    """
+    regressions = []
+    baseline_runs = dict((run['documents'], run) for run in baseline['runs'])
+    for run in results['runs']:
+        base = baseline_runs.get(run['documents'])
+        if base is None:
+            continue
+        for stage, timing in run['stages'].items():
+            if stage not in base['stages']:
+                continue
+            before = base['stages'][stage]['seconds']
+            after = timing['seconds']
+            if max(before, after) < min_seconds:
+                continue
+            ratio = after / max(before, 1e-9)
+            if ratio > 1 + threshold:
+                regressions.append((run['documents'], stage, before, after, ratio))
+        ratio = float(run['peak_rss_kb']) / max(base['peak_rss_kb'], 1)
+        if ratio > 1 + threshold:
+            regressions.append((run['documents'], 'peak_rss_kb', base['peak_rss_kb'], run['peak_rss_kb'], ratio))
+    return regressions
+
+
+def format_results(results):
+    """
+    Output: the results as a table, one block per corpus size.
+    """
+    lines = []
+    for run in results['runs']:
+        lines.append("{0} documents, {1} tokens: {2:.2f}s, {3:.0f} tokens/s, peak {4:.1f} MB".format(
+            run['documents'], run['tokens'], run['seconds'], run['tokens_per_second'], run['peak_rss_kb'] / 1024.0))
+        for stage, timing in run['stages'].items():
+            line = "    {0:<14}{1:>10.3f}s".format(stage, timing['seconds'])
+            if timing['cpu_seconds'] is not None:
+                line += " {0:>10.3f}s cpu".format(timing['cpu_seconds'])
+            else:
+                line += " " * 15
+            line += " {0:>14.0f} tokens/s".format(timing['tokens_per_second'] or 0)
+            if timing['peak_rss_kb'] is not None:
+                line += " {0:>10.1f} MB".format(timing['peak_rss_kb'] / 1024.0)
+            lines.append(line)
+        for cache, info in sorted(run['caches'].items()):
+            lines.append("    {0} cache: {1:.1%} hits of {2}".format(cache, info['hit_rate'], info['hits'] + info['misses']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Distiller's stages on synthetic corpora.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+                        help="numbers of documents of the corpora to run")
+    parser.add_argument('--length', type=int, default=200, help="average words per document")
+    parser.add_argument('--vocabulary', type=int, default=5000, help="distinct content words")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', choices=['json', 'jsonl'], default='json', help="format of the corpus file")
+    parser.add_argument('--nlp-args', type=json.loads, default=None, help="nlp_args, as JSON")
+    parser.add_argument('--run-args', type=json.loads, default=None, help="run_args, as JSON")
+    parser.add_argument('--output', help="save the results, as a baseline, to this file")
+    parser.add_argument('--compare', help="baseline file to compare the results with")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="slowdown or memory growth over the baseline reported as a regression")
+    parser.add_argument('--taggers', nargs='+',
+                        help="compare the speed and accuracy of these tagger backends, as backend or "
+                             "backend:model, instead of running Distiller")
+    parser.add_argument('--gold', help="tagged sentences the taggers are scored against, 'treebank' for "
+                                       "nltk's sample or a JSON file, by default the first tagger's tags")
+    args = parser.parse_args(argv)
+
+    if args.taggers:
+        if args.gold:
+            gold = load_gold(args.gold)
+            sentences = [[word for word, tag in sentence] for sentence in gold]
+        else:
+            gold = None
+            corpus = SyntheticCorpus(args.sizes[0], args.length, args.vocabulary, args.seed)
+            sentences = [sentence for document in corpus for sentence in TokenStream(document['body']).sentences()]
+        results = compare_taggers(load_taggers(args.taggers), sentences, gold)
+        print format_taggers(results)
+        if args.output:
+            with open(args.output, 'w') as output:
+                json.dump(results, output, indent=2)
+        return 0
+
+    results = run_benchmark(args.sizes, args.length, args.vocabulary, args.seed, args.format,
+                            args.nlp_args, args.run_args)
+    print format_results(results)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        for documents, stage, before, after, ratio in regressions:
+            print "regression: {0} documents, {1}: {2:.3f} -> {3:.3f} ({4:.2f}x)".format(
+                documents, stage, before, after, ratio)
+        if regressions:
+            return 1
+    return 0
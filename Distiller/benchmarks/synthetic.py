@@ -0,0 +1,100 @@
+import bisect
+import json
+import random
+
+__author__ = 'fcanas'
+
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'zen', 'dor', 'bal', 'fin', 'gru', 'hap', 'jex',
+             'pol', 'qua', 'wex', 'yor', 'cre']
+
+# Function words mixed into the bodies, so the pipeline's stop word and POS filters have work to do.
+FUNCTION_WORDS = ['the', 'of', 'and', 'a', 'to', 'in', 'is', 'it', 'that', 'with', 'for', 'on', 'was', 'by']
+
+
+def make_vocabulary(size, seed=0):
+    """
+    Output: [word, ...] size distinct made up words of two to four syllables.
+    """
+    rng = random.Random(seed)
+    words = []
+    seen = set()
+    while len(words) < size:
+        word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+class SyntheticCorpus():
+    """
+    Generates a collection of documents in Distiller's JSON format, with a controlled number of
+    documents, document length and vocabulary. Content words follow a Zipf distribution over the
+    vocabulary, as in natural text, and about one word in three is a function word. Sentences of
+    5 to 20 words end in a period, and some words are capitalized.
+
+    The same arguments always generate the same corpus.
+    """
+
+    def __init__(self, documents=100, length=200, vocabulary=5000, seed=0, zipf=1.1):
+        self.documents = documents
+        self.length = length
+        self.seed = seed
+        self.words = make_vocabulary(vocabulary, seed)
+        weights = [1.0 / (rank ** zipf) for rank in range(1, vocabulary + 1)]
+        total = sum(weights)
+        self.cumulative = []
+        running = 0.0
+        for weight in weights:
+            running += weight / total
+            self.cumulative.append(running)
+
+    def word(self, rng):
+        if rng.random() < 0.33:
+            return rng.choice(FUNCTION_WORDS)
+        index = bisect.bisect_left(self.cumulative, rng.random())
+        return self.words[min(index, len(self.words) - 1)]
+
+    def body(self, rng):
+        """
+        Output: the text of one document, of length words on average.
+        """
+        length = max(1, int(rng.gauss(self.length, self.length / 4.0)))
+        sentences = []
+        written = 0
+        while written < length:
+            size = min(rng.randint(5, 20), length - written)
+            words = [self.word(rng) for _ in range(size)]
+            words[0] = words[0].capitalize()
+            if rng.random() < 0.1:
+                position = rng.randrange(size)
+                words[position] = words[position].capitalize()
+            sentences.append(' '.join(words) + '.')
+            written += size
+        return ' '.join(sentences)
+
+    def __iter__(self):
+        rng = random.Random(self.seed)
+        for doc_id in xrange(1, self.documents + 1):
+            yield {'id': doc_id, 'body': self.body(rng)}
+
+    def write(self, file_name):
+        """
+        Write the corpus to file_name, as JSON Lines when it ends in .jsonl and as a JSON document
+        collection otherwise, one document at a time.
+        """
+        metadata = {'base_url': 'http://example.com/{0}'}
+        with open(file_name, 'w') as out:
+            if file_name.endswith('.jsonl'):
+                out.write(json.dumps({'metadata': metadata}) + '\n')
+                for document in self:
+                    out.write(json.dumps(document) + '\n')
+            else:
+                out.write('{"metadata": ' + json.dumps(metadata) + ', "documents": [')
+                for number, document in enumerate(self):
+                    if number:
+                        out.write(', ')
+                    out.write(json.dumps(document))
+                out.write(']}')
+        return file_name
@@ -0,0 +1,189 @@
+import io
+import json
+
+__author__ = 'fcanas'
+
+
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+
+
+class Corpus():
+    """
+    Streams the documents of a collection without ever holding the whole file in memory.
+    Accepts the same JSON format that Distiller loads:
+
+    {
+    metadata : {
+        base_url : "..."
+        }
+    documents : [{...}, ...],
+    }
+
+    where the documents array is decoded one document at a time, or JSON Lines (.jsonl,
+    .ndjson) with one document per line and an optional metadata record:
+
+    {"metadata": {"base_url": "..."}}
+    {"id": INT, "body": "...", "description": "..."}
+    ...
+
+    Iterating a Corpus re-opens the file, so it can be read in more than one pass.
+    """
+
+    def __init__(self, path, lines=None):
+        self.path = path
+        if lines is None:
+            lines = path.lower().endswith(JSON_LINES_EXTENSIONS)
+        self.lines = lines
+        self._metadata = None
+
+    @property
+    def metadata(self):
+        """
+        The metadata dict of the collection. Found by scanning the file, which stops as soon as
+        the metadata record is read.
+        """
+        if self._metadata is None:
+            self._metadata = {}
+            for kind, value in self.records():
+                if kind == 'metadata':
+                    self._metadata = value
+                    break
+        return self._metadata
+
+    def __iter__(self):
+        for kind, value in self.records():
+            if kind == 'document':
+                yield value
+
+    def records(self):
+        """
+        Output: ('metadata', {...}) and ('document', {...}) pairs in file order.
+        """
+        if self.lines:
+            return iter_json_lines(self.path)
+        return iter_json_collection(self.path)
+
+
+def iter_json_lines(path):
+    """
+    Input: path to a JSON Lines collection.
+    Output: ('metadata', {...}) or ('document', {...}) for each non-empty line.
+    """
+    with io.open(path, 'r', encoding='utf-8') as lines:
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if 'metadata' in record and 'body' not in record:
+                yield 'metadata', record['metadata']
+            else:
+                yield 'document', record
+
+
+def iter_json_collection(path, buffer_size=1 << 16):
+    """
+    Input: path to a JSON collection of the form {metadata: {...}, documents: [...]}.
+    Output: ('metadata', {...}) and ('document', {...}) pairs in file order. Only one document
+    (plus a read buffer) is held in memory at a time. Other top level keys are skipped.
+    """
+    with io.open(path, 'r', encoding='utf-8') as stream:
+        reader = _JSONReader(stream, buffer_size)
+        reader.expect(u'{')
+        if reader.accept(u'}'):
+            return
+        while True:
+            key = reader.decode()
+            reader.expect(u':')
+            if key == u'documents':
+                reader.expect(u'[')
+                if not reader.accept(u']'):
+                    while True:
+                        yield 'document', reader.decode()
+                        if reader.accept(u']'):
+                            break
+                        reader.expect(u',')
+            elif key == u'metadata':
+                yield 'metadata', reader.decode()
+            else:
+                reader.decode()
+            if reader.accept(u'}'):
+                return
+            reader.expect(u',')
+
+
+class _JSONReader():
+    """
+    Decodes consecutive JSON values and punctuation from a text stream, reading it in
+    buffer_size pieces.
+    """
+
+    decoder = json.JSONDecoder()
+
+    def __init__(self, stream, buffer_size):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.buffer = u''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size=None):
+        """
+        Read another piece of the stream, of size characters or by default buffer_size, into the
+        buffer, dropping what was already consumed.
+        Output: False once the stream is exhausted.
+        """
+        if self.eof:
+            return False
+        data = self.stream.read(size or self.buffer_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Output: the next non-whitespace character, or None at the end of the stream.
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return None
+
+    def accept(self, char):
+        """
+        Consume char if it is the next non-whitespace character.
+        """
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, char):
+        if not self.accept(char):
+            raise ValueError("expected '{0}' at character {1} of the buffer".format(char, self.pos))
+
+    def decode(self):
+        """
+        Output: the next JSON value in the stream. A value ending right at the end of the buffer
+        is only trusted once the stream is exhausted, since a number may continue past it.
+        Decoding starts over from the beginning of the value after each read, so a value longer
+        than the buffer doubles what is buffered of it before every new attempt, and is decoded
+        a number of times logarithmic, not linear, in its length.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self.fill(max(self.buffer_size, len(self.buffer) - self.pos))
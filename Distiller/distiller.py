@@ -1,17 +1,49 @@
+import functools
 import os
 import json
 import logging
-import nltk
+import multiprocessing
+import time
+from collections import Counter, deque
+from itertools import chain, islice, izip
 
+from corpus import Corpus
+from doccache import DocumentCache
+from document import Document
+from duplicates import DuplicateDetector
 from features.Collocations import Collocations
 from features.Positioning import Positioning
-from features.tf_idf import TF_IDF
-from preprocessing.pipeline import Pipeline
+from features.tf_idf import TF_IDF, count_document_frequencies
+from preprocessing.pipeline import Pipeline, TAGGERS
+from preprocessing.tokens import TokenStream, split_text
+from preprocessing.vocabulary import Vocabulary, TAGS
+from reports import write_reports, iter_report, BULKY_FIELDS
+from index import compile_index, write_index
+from metrics import Metrics, Profiler, timed
+from sketch import HeavyHitters
+from spill import DocumentSpill, array_bytes
 
 
 __author__ = 'fcanas'
 
 
+def staged(requires=None):
+    """
+    Make a Distiller method a stage of its run: the stage it requires runs first, and the stage
+    itself only runs once, however often it is called.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def run_stage(self, *args, **kwargs):
+            if method.__name__ not in self.completed:
+                if requires is not None:
+                    getattr(self, requires)()
+                method(self, *args, **kwargs)
+                self.completed.add(method.__name__)
+        return run_stage
+    return decorate
+
+
 class Distiller():
     """
     Responsible for extracting features from a set of documents. Expects documents specified in JSON format:
@@ -28,13 +60,13 @@ class Distiller():
     }
 
 
-    The documents will be processed and kept in processed_documents dic, which will have this format:
+    The documents will be processed and exported in the docmap, which will have this format:
 
     {
     id => {
             id : INT,
 
-            tokenized_body : [token1, token2, ...] # where tokens are lowerecase unicode words that form text body
+            tokenized_body : [token1, token2, ...] # where tokens are lowerecase unicode words and punctuation that form text body
 
             # the resulting list from calling pre_process_pipeline()
             processed_body : [(processed_token1, POS1), (processed_token2, POS2),...],
@@ -45,6 +77,11 @@ class Distiller():
         }
     }
 
+    In memory, processed_documents holds id => Document, the compact form of the above: tokens are
+    ids of a corpus-wide Vocabulary, tags are ids of the POS tag enum, and token sequences are
+    arrays of ids. Features are computed over ids, and documents are decoded back to strings
+    only to compile and export the reports.
+
     nlp_args:
 
     A dictionary of arguments used by the pre-processing pipeline. Takes the following form:
@@ -55,9 +92,137 @@ class Distiller():
         lemmatize: Boolean,                 # lemmatize during pre processing
         tfidf_cutoff: Float,                # cutoff value to use for term-freq/doc-freq score
         pos_list: [STRING,...],             # POS white list used to filter for candidates
-        black_list: [token1, token2, ...]   # token list used to filter out from candidates
+        black_list: [token1, token2, ...],  # token list used to filter out from candidates
+        features: [STRING, ...],            # features to extract and report, see below
+        near_duplicates: Float,             # similarity at which documents are grouped, None never groups
+        group_idf: Boolean,                 # count each group of near-duplicates once for idf
+        tfidf_top: INT,                     # tf-idf scores kept per document, None keeps them all
+        statistics_top: INT,                # items kept per statistic when counting approximately, 0 counts exactly
+        statistics_error: Float,            # error bound epsilon of the approximate counts
+        tagger: STRING,                     # POS tagger backend, 'perceptron' or 'lexicon'
+        tagger_model: STRING                # path of the tagger's model, None for its default
+    }
+
+    features selects among positioning, tfidf, keywords, bigrams and trigrams. keywords needs tfidf
+    and positioning, which are extracted along with it. Only the selected features are extracted,
+    and only their reports are written: keywords with the keymap and keyword index, bigrams and
+    trigrams. Selecting bigrams and trigrams alone skips tf-idf and positioning altogether.
+
+    With near_duplicates, documents are grouped before pre-processing by the Jaccard similarity
+    of their word shingles, estimated by MinHash and LSH (see duplicates.DuplicateDetector). Only
+    the first document of a group is pre-processed and has its features extracted; the others
+    share its tokens and features, and are marked in the docmap by duplicate_of, the id of that
+    document. With group_idf, a group counts as a single document in the document frequencies.
+
+    With tfidf_top, only the best tfidf_top tf-idf scores of each document are kept, picked with a
+    heap rather than by sorting them all, and keywords are taken from those. With statistics_top,
+    the keywords, bigrams and trigrams statistics are counted in bounded memory by a count-min
+    sketch that tracks the statistics_top most frequent items (see sketch.HeavyHitters). Only those
+    items are reported. Each reported count is at least the true count, and with probability 0.99
+    at most statistics_error times the number of occurrences of the statistic above it. Every item
+    counted more often than the smallest reported count is reported.
+
+    tagger selects the POS tagger among the backends of the pipeline (see Pipeline): 'perceptron',
+    nltk's averaged perceptron, or 'lexicon', which tags each word by a lexicon of most frequent
+    tags and suffix rules, several times faster and less accurate. tagger_model is the path of a
+    model trained for the backend, by default its pretrained one.
+
+    run_args:
+
+    A dictionary of arguments controlling how Distiller executes. They never change the results:
+
+    {
+        workers: INT,                       # processes used for pre-processing and feature extraction
+        chunk_size: INT,                    # documents handed to a worker process at a time
+        split_size: INT,                    # characters past which a body is split into parts, 0 never
+        streaming: Boolean,                 # stream documents from the file instead of loading it whole
+        tag_cache_size: INT,                # sentences whose tags are cached, 0 tags whole documents
+        tfidf_engine: STRING,               # 'default', or 'matrix' to score all docs at once (numpy/scipy)
+        cache_size: INT,                    # (word, pos) results memoized by the pipeline, 0 disables
+        export_format: STRING,              # 'json' objects, or 'jsonl' for one [key, value] record per line
+        compress: Boolean,                  # gzip the reports
+        shard_size: INT,                    # split reports into files of at most this many bytes, 0 never
+        slim_docmap: Boolean,               # leave tokenized_body, processed_tokens and freq_distribution out
+        metrics: Boolean,                   # write metrics.json with the run's measurements
+        profile: STRING,                    # None, 'cprofile' or 'sample' to profile the run
+        document_cache: STRING,             # directory of the on-disk cache of pre-processed documents
+        document_cache_size: INT,           # bytes the document cache may hold
+        shard: [INT, INT],                  # [index, count] to run as one shard of count, see below
+        model: STRING,                      # None, 'idf' or 'ngrams' to write the corpus model, see below
+        memory_budget: INT                  # bytes of document arrays kept in memory, 0 keeps them all
     }
 
+    Reports are written record by record, the docmap decoding one document at a time, and with
+    several workers the reports are written concurrently. The export options only change how the
+    reports are written, except slim_docmap which leaves the bulky fields out of the docmap.
+
+    Every run is measured by a Metrics: the wall and CPU time and tokens per second of each stage
+    (ingestion, pre_process with its tagging and filtering, tfidf, features with its positioning,
+    tfidf and collocations, compile and export), the hit rates of the pipeline, tag and idf caches,
+    and the documents that took longest to extract features from. It is logged at the end of the
+    run and written to metrics.json next to the reports. With a profile, the main process is also
+    profiled, by cProfile (profile.pstats) or by stack sampling (profile.folded).
+
+    With a document_cache, the tokens and pre-processed tokens of every document are kept on disk,
+    keyed by a hash of its body and of the pipeline arguments, and later runs take unchanged
+    documents from the cache instead of the pipeline. The least recently used documents are
+    dropped once the cache holds document_cache_size bytes.
+
+    With a shard of [index, count], Distiller only runs the per-document part of the work, over
+    every count-th document of the file starting from index, and writes its partial state to the
+    target path instead of the reports: shard.json with the metadata, the vocabulary, the document
+    frequencies, the term counts and the n-gram counts of the shard, and the documents report
+    (JSON Lines) with each pre-processed document and the features that need nothing but the
+    document. merge_shards then combines the shards, computes the global idf, the tf-idf scores
+    and keywords, and writes the same reports as a run over the whole file. Near-duplicates are
+    only grouped within a shard.
+
+    With a model, the frozen state new documents are scored against is written to model.json (see
+    model.CorpusModel) after the reports: the nlp_args and pipeline arguments of the run and the
+    document frequencies of its tokens, and with 'ngrams', the bigrams and trigrams statistics as
+    well. A model.Scorer loads it once, and then extracts the features of new documents in a
+    fraction of the time of a run, without the corpus.
+
+    run_configurations runs several nlp_args over the same documents, each writing its reports to
+    its own subdirectory of the target path. Tokenizing and POS tagging only depend on the tagger,
+    so the documents are tagged once per tagger (see tag_documents), and held in memory with their
+    tags while each configuration filters, normalizes and scores them as a run of its own would.
+
+    With a split_size, the body of a document longer than split_size characters is split into parts
+    at the first sentence boundaries past every split_size characters, the parts are tokenized,
+    tagged and filtered apart, spread over the workers, and then joined back in order. The tokens
+    of the parts laid end to end are those of the whole body, so positions, term counts and the
+    offsets of the tokens are unchanged. The tagger sees each part on its own, so as with a
+    tag_cache_size, tags next to the cuts may differ from tagging the whole body; with a
+    tag_cache_size, documents are tagged sentence by sentence anyway, and splitting them changes
+    nothing.
+
+    With a memory_budget, the arrays of the processed documents (their tokens, tags and candidates)
+    are kept in memory up to memory_budget bytes, and the arrays of the documents past it are
+    spilled to a temporary file in the target path (see spill.DocumentSpill) as soon as they are
+    encoded. Compiling the statistics only needs the features, which stay in memory; extracting
+    the features and exporting the docmap read the arrays of a spilled document back from disk
+    while it is in use, one document at a time, or a window of documents per worker. Document
+    frequencies are then counted while pre-processing, as when streaming. The matrix tf-idf
+    engine still reads the arrays of every document at once. The number of documents spilled and
+    the peak memory of the run are logged with the metrics.
+
+    In streaming mode the document file is decoded one document at a time, either from the
+    documents array above or from JSON Lines (.jsonl) with an optional {"metadata": {...}} line.
+    Document frequencies are collected while the documents are pre-processed, so the raw
+    corpus is never held in memory.
+
+    Distiller runs every stage when it is created. With run=False nothing runs until asked for,
+    and each stage runs the stages before it that have not run yet, once:
+
+    >>> distiller = Distiller(data, target, options, run=False)
+    >>> distiller.load()                         # ingestion
+    >>> distiller.process_documents()            # pre-processing
+    >>> distiller.feature('trigrams', doc_id)    # extracts trigrams only, on first access
+    >>> distiller.statistic('keywords')          # extracts keywords, then compiles their report
+    >>> distiller.compile()                      # the reports of the selected features
+    >>> distiller.export()
+
     """
 
     default_args = {
@@ -66,96 +231,633 @@ class Distiller():
         'lemmatize': False,  # lemmatize during pre processing
         'tfidf_cutoff': 0.001,  # cutoff value to use for term-freq/doc-freq score
         'pos_list': ['NN', 'NNP'],  # POS white list used to filter for candidates
-        'black_list': []  # token list used to filter out from candidates
+        'black_list': [],  # token list used to filter out from candidates
+        'features': ['keywords', 'bigrams', 'trigrams'],  # features to extract and report
+        'near_duplicates': None,  # Jaccard similarity at which documents are grouped as near-duplicates, None disables
+        'group_idf': False,  # count each group of near-duplicates as one document for idf
+        'tfidf_top': None,  # tf-idf scores kept per document, the best first, None keeps them all
+        'statistics_top': 0,  # most frequent items kept per statistic, counted approximately, 0 counts every item exactly
+        'statistics_error': 0.0001,  # error bound of the approximate counts, as a share of the occurrences counted
+        'tagger': 'perceptron',  # POS tagger backend, 'perceptron' (nltk) or 'lexicon' (lexicon and suffix rules)
+        'tagger_model': None  # path of the model of the tagger backend, None for its default model
+    }
+
+    default_run_args = {
+        'workers': 1,  # processes used for pre-processing and feature extraction, 1 runs serially
+        'chunk_size': 16,  # documents handed to a worker process at a time
+        'split_size': 0,  # characters past which a body is split at sentence boundaries, its parts processed in parallel
+        'streaming': False,  # stream documents from the file instead of loading it whole
+        'tag_cache_size': 0,  # repeated sentences whose tags are cached, 0 tags whole documents uncached
+        'tfidf_engine': 'default',  # 'default', or 'matrix' to score all documents at once with numpy/scipy
+        'cache_size': 65536,  # (word, pos) results memoized by the pre-processing pipeline, 0 disables it
+        'export_format': 'json',  # 'json' objects, or 'jsonl' for JSON Lines of [key, value] records
+        'compress': False,  # gzip the reports
+        'shard_size': 0,  # split each report into files of at most this many bytes of JSON, 0 never splits
+        'slim_docmap': False,  # leave tokenized_body, processed_tokens and freq_distribution out of the docmap
+        'metrics': True,  # write the measurements of the run to metrics.json
+        'profile': None,  # None, 'cprofile' for profile.pstats or 'sample' for profile.folded
+        'document_cache': None,  # directory of the on-disk cache of pre-processed documents, None disables it
+        'document_cache_size': 2 ** 30,  # bytes the document cache may hold before evicting the least recently used
+        'shard': None,  # [index, count] to process every count-th document from index and write partial state
+        'model': None,  # None, 'idf' to write the corpus model for scoring new documents, 'ngrams' to add n-gram counts
+        'memory_budget': 0  # bytes of document arrays kept in memory, the rest spilled to disk, 0 keeps them all
     }
 
-    def __init__(self, document_file, target_path, nlp_args=default_args, verbosity=2):
+    def __init__(self, document_file, target_path, nlp_args=default_args, verbosity=2, run_args=default_run_args,
+                 run=True):
         """
-        Initialize Distiller for specified document file.
+        Initialize Distiller for specified document file, and run it unless run is False.
         """
+        self.document_file = document_file
+        self.completed = set()
+        self.extracted = set()
         self.processed_documents = {}
+        self.duplicates = []
+        self.input_positions = {}
+        self.tagged = None
+        self.spill = None
+        self.vocabulary = Vocabulary()
+        self.tags = Vocabulary(TAGS)
         self.statistics = {}
         self.collocations = Collocations()
         self.positioning = Positioning()
+        self.pipeline = None
+        self.tfidf = None
+        self.keymap = None
+        self.index = None
+        self.metrics = Metrics()
         self.path = make_path(target_path)
         logging.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
                             level=self.get_logging_level(verbosity))
 
-        with open(document_file) as d:
-            self.jdata = json.load(d)
-        d.close()
-
+        self.initialize_run_arguments(run_args)
         self.initialize_arguments(nlp_args)
-        self.process_documents()
-        self.tfidf = TF_IDF(self.processed_doc_bodies)
-        self.extract_features()
-        self.compile()
-        self.export()
+        if run:
+            self.run()
+
+    def run(self):
+        """
+        Run every stage that has not run yet, through to the export, then report the metrics.
+        The spill of a memory_budget is closed once the run ends, see close.
+        """
+        profiler = Profiler(self.profile, self.path) if self.profile else None
+        if profiler is not None:
+            profiler.start()
+        try:
+            try:
+                self.load()
+                self.process_documents()
+                if self.shard:
+                    self.export_shard()
+                else:
+                    self.extract_features()
+                    self.compile()
+                    self.export()
+                    if self.model:
+                        self.export_model()
+            finally:
+                if profiler is not None:
+                    self.metrics.info['profile'] = profiler.stop()
+            self.report_metrics()
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Close the file the arrays of documents were spilled to with a memory_budget, removing it.
+        Spilled documents keep their features, and reading their arrays fails from then on. Runs
+        started with run=False close it once done with the documents.
+        """
+        if self.spill is not None:
+            self.spill.close()
+
+    @staged()
+    def load(self, document_file=None):
+        """
+        Load the document file, by default the one Distiller was created for, or open it for
+        streaming. A shard only keeps its own partition of the documents.
+        """
+        if document_file is None:
+            document_file = self.document_file
+        with self.metrics.stage('ingestion'):
+            if self.streaming:
+                self.documents = Corpus(document_file)
+                self.metadata = self.documents.metadata
+            else:
+                with open(document_file) as d:
+                    self.jdata = json.load(d)
+                d.close()
+                self.metadata = self.jdata['metadata']
+                self.documents = self.jdata['documents']
+            if self.shard:
+                self.documents = self.partition(self.documents)
+        self.base_url = self.metadata['base_url']
+
+    def partition(self, documents):
+        """
+        Input: an iterable of documents from json.
+        Output: a generator of the documents of this shard, keeping their positions in the input.
+        """
+        index, count = self.shard
+        for position, document in enumerate(islice(documents, index, None, count)):
+            self.input_positions[document['id']] = index + position * count
+            yield document
 
     def initialize_arguments(self, nlp_args):
         """
-        Read args from json metadata and initialize Distiller arguments.
+        Initialize Distiller arguments.
         """
         logging.info("initializing Distiller")
-        self.base_url = self.jdata['metadata']['base_url']
-        self.documents = self.jdata['documents']
         self.normalize = nlp_args.get('normalize', self.default_args['normalize'])
         self.stem = nlp_args.get('stem', self.default_args['stem'])
         self.lemmatize = nlp_args.get('lemmatize', self.default_args['lemmatize'])
         self.pos_list = nlp_args.get('pos_list', self.default_args['pos_list'])
         self.tfidf_cutoff = nlp_args.get('tfidf_cutoff', self.default_args['tfidf_cutoff'])
         self.black_list = nlp_args.get('black_list', self.default_args['black_list'])
+        self.features = nlp_args.get('features', self.default_args['features'])
+        self.required = required_features(self.features)
+        self.near_duplicates = nlp_args.get('near_duplicates', self.default_args['near_duplicates'])
+        self.group_idf = nlp_args.get('group_idf', self.default_args['group_idf'])
+        self.tfidf_top = nlp_args.get('tfidf_top', self.default_args['tfidf_top'])
+        self.statistics_top = nlp_args.get('statistics_top', self.default_args['statistics_top'])
+        self.statistics_error = nlp_args.get('statistics_error', self.default_args['statistics_error'])
+        self.tagger = nlp_args.get('tagger', self.default_args['tagger'])
+        self.tagger_model = nlp_args.get('tagger_model', self.default_args['tagger_model'])
+        if self.tagger not in TAGGERS:
+            raise ValueError("unknown tagger {0}, not one of {1}".format(self.tagger, sorted(TAGGERS)))
+        self.nlp_args = dict((arg, getattr(self, arg)) for arg in self.default_args)
+
+    def initialize_run_arguments(self, run_args):
+        """
+        Initialize the arguments that control how Distiller executes.
+        """
+        self.workers = max(1, run_args.get('workers', self.default_run_args['workers']))
+        self.chunk_size = max(1, run_args.get('chunk_size', self.default_run_args['chunk_size']))
+        self.split_size = run_args.get('split_size', self.default_run_args['split_size'])
+        self.streaming = run_args.get('streaming', self.default_run_args['streaming'])
+        self.tfidf_engine = run_args.get('tfidf_engine', self.default_run_args['tfidf_engine'])
+        self.cache_size = run_args.get('cache_size', self.default_run_args['cache_size'])
+        self.tag_cache_size = run_args.get('tag_cache_size', self.default_run_args['tag_cache_size'])
+        self.export_format = run_args.get('export_format', self.default_run_args['export_format'])
+        self.compress = run_args.get('compress', self.default_run_args['compress'])
+        self.shard_size = run_args.get('shard_size', self.default_run_args['shard_size'])
+        self.slim_docmap = run_args.get('slim_docmap', self.default_run_args['slim_docmap'])
+        self.write_metrics = run_args.get('metrics', self.default_run_args['metrics'])
+        self.profile = run_args.get('profile', self.default_run_args['profile'])
+        self.document_cache = run_args.get('document_cache', self.default_run_args['document_cache'])
+        self.document_cache_size = run_args.get('document_cache_size', self.default_run_args['document_cache_size'])
+        self.shard = run_args.get('shard', self.default_run_args['shard'])
+        if self.shard and not 0 <= self.shard[0] < self.shard[1]:
+            raise ValueError("shard index must be in [0, count), not {0}".format(self.shard))
+        self.model = run_args.get('model', self.default_run_args['model'])
+        if self.model not in (None, 'idf', 'ngrams'):
+            raise ValueError("model must be None, 'idf' or 'ngrams', not {0}".format(self.model))
+        self.memory_budget = run_args.get('memory_budget', self.default_run_args['memory_budget'])
 
+    def pipeline_arguments(self):
+        """
+        Return the keyword arguments used to build the pre-processing Pipeline.
+        """
+        return {
+            'black_list': self.black_list,
+            'pos_list': self.pos_list,
+            'normalize': self.normalize,
+            'stem': self.stem,
+            'lemmatize': self.lemmatize,
+            'cache_size': self.cache_size,
+            'tag_cache_size': self.tag_cache_size,
+            'tagger': self.tagger,
+            'tagger_model': self.tagger_model
+        }
+
+    def cache_arguments(self):
+        """
+        Return the arguments the pre-processed documents depend on, which key the document cache.
+        """
+        import nltk
+        return {
+            'black_list': self.black_list,
+            'pos_list': self.pos_list,
+            'normalize': self.normalize,
+            'stem': self.stem,
+            'lemmatize': self.lemmatize,
+            'sentence_tags': bool(self.tag_cache_size),
+            'split_size': self.split_size,
+            'tagger': self.tagger,
+            'tagger_model': self.tagger_model,
+            'nltk': nltk.__version__
+        }
+
+    @staged('load')
     def process_documents(self):
         """
-        Run documents from json through pre-processing.
+        Run documents from json through pre-processing, and keep them as Documents. When
+        streaming, the document frequencies are counted in the same pass, if tf-idf is among the
+        features. Once every token is in the vocabulary, the ids are renumbered in token order,
+        so sorting ids sorts tokens. With near_duplicates, only the first document of each group
+        goes through the pipeline, and the others are added sharing its tokens. With a
+        memory_budget, the arrays of the documents past it are spilled to disk once counted, and
+        renumbered there one document at a time.
         """
-        pipeline = Pipeline(black_list=self.black_list,
-                            pos_list=self.pos_list,
-                            normalize=self.normalize,
-                            stem=self.stem,
-                            lemmatize=self.lemmatize)
+        doc_freqs = {} if (self.streaming or self.memory_budget) and 'tfidf' in self.required else None
+        lengths = {}
+        resident = 0
+        with self.metrics.stage('pre_process'):
+            documents = self.documents
+            if self.near_duplicates:
+                documents = self.iter_unique(documents, DuplicateDetector(self.near_duplicates))
+            if self.document_cache and self.tagged is None:
+                cache = DocumentCache(self.document_cache, self.cache_arguments(), self.document_cache_size)
+                processed = self.iter_cached(documents, cache)
+            else:
+                cache = None
+                processed = self.iter_processed(documents)
+            if self.memory_budget and self.spill is None:
+                self.spill = DocumentSpill(self.path)
+            for doc in processed:
+                doc = Document.encode(doc, self.vocabulary, self.tags)
+                self.processed_documents[doc.id] = doc
+                lengths[doc.id] = len(doc.body)
+                if doc_freqs is not None:
+                    count_document_frequencies(doc_freqs, doc.candidates)
+                if self.spill is not None:
+                    if resident + array_bytes(doc) > self.memory_budget:
+                        self.spill.spill(doc)
+                    else:
+                        resident += array_bytes(doc)
 
-        for document in self.documents:
-            logging.info("processing document {0}".format(document['id']))
+            token_ids = self.vocabulary.sort()
+            tag_ids = self.tags.sort()
+            for doc in self.processed_documents.values():
+                spilled = self.spill is not None and self.spill.restore(doc)
+                doc.remap(token_ids, tag_ids)
+                if spilled:
+                    self.spill.spill(doc)
+            if doc_freqs is not None:
+                doc_freqs = dict((token_ids[token], count) for token, count in doc_freqs.items())
+            for doc_id, description, representative in self.duplicates:
+                doc = self.processed_documents[representative].duplicate(doc_id, self.base_url.format(int(doc_id)),
+                                                                         description)
+                self.processed_documents[doc_id] = doc
+                if self.spill is not None and representative in self.spill:
+                    self.spill.alias(doc_id, representative)
+                if doc_freqs is not None and not self.group_idf:
+                    for restored in self.restored([doc]):
+                        count_document_frequencies(doc_freqs, restored.candidates)
+            self.doc_freqs = doc_freqs
+            self.lowered = self.vocabulary.lowered()
+        if cache is not None:
+            logging.info("document cache: {0}".format(cache.info()))
+            self.metrics.cache('documents', cache.info())
+        logging.info("vocabulary of {0} tokens".format(len(self.vocabulary)))
+        if self.spill is not None:
+            logging.info("spilled {0} of {1} documents to disk".format(len(self.spill), len(self.processed_documents)))
+        self.metrics.info['documents'] = len(self.processed_documents)
+        self.metrics.info['tokens'] = sum(lengths.values()) + sum(lengths[duplicate[2]] for duplicate in self.duplicates)
+        self.metrics.info['vocabulary'] = len(self.vocabulary)
+        if self.near_duplicates:
+            logging.info("{0} near-duplicate documents".format(len(self.duplicates)))
+            self.metrics.info['duplicates'] = len(self.duplicates)
 
-            doc = {
-                'id': document['id'],
-                'url': self.base_url.format(int(document['id'])),
-                'tokenized_body': map(unicode.lower, nltk.word_tokenize(document['body'])),
-                'processed_tokens': pipeline.pre_process(text=document['body']),
-                'description': document.get('description', '')
-            }
+        if self.streaming or self.spill is not None:
+            self.processed_doc_bodies = None
+        else:
+            self.processed_doc_bodies = [document['candidates'] for document in self.idf_documents()]
+
+    def iter_unique(self, documents, detector):
+        """
+        Input: an iterable of documents from json, and the DuplicateDetector grouping them.
+        Output: a generator of the documents that are not near-duplicates of an earlier one. The
+        others are kept in duplicates, as (id, description, id of the document they duplicate).
+        """
+        timings = {}
+        for document in documents:
+            with timed(timings, 'duplicates'):
+                representative = detector.add(document['id'], document['body'])
+            if representative is None:
+                yield document
+            else:
+                self.duplicates.append((document['id'], document.get('description', ''), representative))
+        self.record_worker(timings, None, {})
+
+    def unique_documents(self):
+        """
+        Output: [Document, ...] of every document but the near-duplicates of another.
+        """
+        return [document for document in self.processed_documents.values() if document.duplicate_of is None]
 
-            if not doc['processed_tokens']:
-                doc['candidates'] = []
+    def idf_documents(self):
+        """
+        Output: [Document, ...] of the documents counted in the document frequencies, every one of
+        them unless group_idf counts each group of near-duplicates once.
+        """
+        if self.group_idf:
+            return self.unique_documents()
+        return self.processed_documents.values()
+
+    def restored(self, documents, fields=None):
+        """
+        Input: an iterable of Documents, and optionally the fields that will be read from them.
+        Output: a generator of the documents, the arrays of each spilled one read back from disk
+        while it is in use, and released again once the next document is asked for. Documents
+        are not read back when none of the fields come from their arrays.
+        """
+        spill = self.spill
+        if fields is not None and not any(field in Document.ARRAY_FIELDS for field in fields):
+            spill = None
+        for document in documents:
+            if spill is not None and spill.restore(document):
+                try:
+                    yield document
+                finally:
+                    spill.release(document)
             else:
-                doc['candidates'] = list(set(zip(*doc['processed_tokens'])[0]))
-            doc['freq_distribution'] = nltk.FreqDist(doc['tokenized_body'])
-            self.processed_documents[doc['id']] = doc
+                yield document
+
+    @staged('load')
+    def tag_documents(self):
+        """
+        Tokenize and POS tag every document once, keeping the documents and their tagged tokens in
+        memory, for the Distillers of other nlp_args to share by load_tagged. See run_configurations.
+        """
+        self.documents = list(self.documents)
+        self.tagged = {}
+        with self.metrics.stage('pre_process'):
+            for tagged, timings, pid, caches in self.iter_tagged(self.documents):
+                self.record_worker(timings, pid, caches)
+                for doc_id, part, (lowered, tagged_tokens) in tagged:
+                    if part:
+                        joined = self.tagged[doc_id]
+                        lowered, tagged_tokens = joined[0] + lowered, joined[1] + tagged_tokens
+                    self.tagged[doc_id] = (lowered, tagged_tokens)
+        self.metrics.info['documents'] = len(self.documents)
+        self.metrics.info['tokens'] = sum(len(lowered) for lowered, tagged in self.tagged.values())
 
-        self.processed_doc_bodies = [document['processed_tokens'] for document in self.processed_documents.values()]
+    def iter_tagged(self, documents):
+        """
+        Output: a generator of ([(doc id, part number, (lowercase tokens, tagged tokens)), ...],
+        timings, pid, caches) for each chunk of the documents, tagged across the workers. The parts
+        of a split document are tagged apart, and numbered from 0, as whole documents are.
+        """
+        batches = batch_documents(documents, self.chunk_size, self.split_size)
+        if self.workers > 1:
+            pool = multiprocessing.Pool(self.workers,
+                                        initializer=_init_process_worker,
+                                        initargs=(self.pipeline_arguments(), self.base_url))
+            try:
+                for result in pool.imap(_tag_worker, batches):
+                    yield result
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            pipeline = Pipeline(**self.pipeline_arguments())
+            for batch in batches:
+                timings = {}
+                yield tagged_parts(batch, tag_batch(pipeline, batch, timings)), timings, None, \
+                    {'tags': pipeline.tag_cache_info()}
+
+    def load_tagged(self, distiller):
+        """
+        Share the documents loaded and tagged by another Distiller, in place of loading them, so
+        that pre-processing only filters their tagged tokens with these nlp_args.
+        """
+        distiller.tag_documents()
+        self.metadata = distiller.metadata
+        self.base_url = distiller.base_url
+        self.documents = distiller.documents
+        self.input_positions = distiller.input_positions
+        self.tagged = distiller.tagged
+        self.completed.add('load')
+
+    def iter_cached(self, documents, cache):
+        """
+        Input: an iterable of documents from json, and the DocumentCache.
+        Output: a generator of processed documents, in input order. Documents found in the cache
+        are built from it, and the others go through the pipeline, as in iter_processed, and are
+        added to the cache. Documents are only looked up as far ahead as the pipeline reads.
+        """
+        lookups = deque()
+
+        def misses():
+            for document in documents:
+                key = cache.key(document['body'])
+                cached = cache.get(key)
+                lookups.append((document, key, cached))
+                if cached is None:
+                    yield document
+
+        processed = self.iter_processed(misses())
+        results = deque()
+        while True:
+            if not lookups:
+                # Reading the next processed document looks up every document up to its own.
+                for doc in processed:
+                    results.append(doc)
+                    break
+                if not lookups:
+                    return
+            document, key, cached = lookups.popleft()
+            if cached is None:
+                doc = results.popleft() if results else next(processed)
+                cache.put(key, doc['tokenized_body'], doc['processed_tokens'])
+            else:
+                doc = build_document(document, cached[0], cached[1], self.base_url, counts=False)
+            yield doc
+
+    def iter_processed(self, documents):
+        """
+        Input: an iterable of documents from json.
+        Output: a generator of processed documents, in input order. Documents go through the
+        pipeline chunk_size at a time, so their tokens are tagged in one batch. With several
+        workers, a few chunks per worker are read at a time, so a streamed corpus stays streamed.
+        Documents tagged by tag_documents are only filtered. With a split_size, the parts of long
+        documents are pre-processed apart, by as many workers as there are, and joined back.
+        """
+        return join_parts(self.iter_parts(documents))
+
+    def iter_parts(self, documents):
+        """
+        Output: a generator of processed documents, and parts of documents split by split_size, in
+        input order, see iter_processed. Documents tagged by tag_documents were split there, if at
+        all, and are filtered whole.
+        """
+        if self.tagged is not None:
+            self.pipeline = Pipeline(**self.pipeline_arguments())
+            for batch in chunks(documents, self.chunk_size):
+                timings = {}
+                processed = filter_batch(self.pipeline, batch, [self.tagged[document['id']] for document in batch],
+                                         self.base_url, timings, counts=False)
+                self.record_worker(timings, None, {'pipeline': self.pipeline.cache_info()})
+                for doc in processed:
+                    yield doc
+            return
+        batches = batch_documents(documents, self.chunk_size, self.split_size)
+        if self.workers > 1:
+            pool = multiprocessing.Pool(self.workers,
+                                        initializer=_init_process_worker,
+                                        initargs=(self.pipeline_arguments(), self.base_url))
+            try:
+                window = list(islice(batches, self.workers * 4))
+                while window:
+                    for processed, timings, pid, caches in pool.imap(_process_worker, window):
+                        self.record_worker(timings, pid, caches)
+                        for doc in processed:
+                            yield doc
+                    window = list(islice(batches, self.workers * 4))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            self.pipeline = Pipeline(**self.pipeline_arguments())
+            for batch in batches:
+                timings = {}
+                processed = process_batch(self.pipeline, batch, self.base_url, timings, counts=False)
+                self.record_worker(timings, None, {'pipeline': self.pipeline.cache_info(),
+                                                   'tags': self.pipeline.tag_cache_info()})
+                for doc in processed:
+                    yield doc
+            logging.info("pipeline cache: {0}".format(self.pipeline.cache_info()))
+            if self.pipeline.tag_cache is not None:
+                logging.info("tag cache: {0}".format(self.pipeline.tag_cache_info()))
+
+    def record_worker(self, timings, pid, caches):
+        """
+        Add the timings of a batch of work to the metrics, with the state of the caches of the
+        process, pid, that did it.
+        """
+        for name, seconds in timings.items():
+            self.metrics.add(name, seconds)
+        for name, info in caches.items():
+            self.metrics.cache(name, info, pid)
+
+    def record_document(self, document, timings):
+        """
+        Add the timings of extracting the features of document to the metrics.
+        """
+        for name, seconds in timings.items():
+            self.metrics.add(name, seconds)
+        self.metrics.document('features', document.id, sum(timings.values()), len(document.body))
 
-    def extract_features(self):
+    def build_tfidf(self):
         """
-        Extract the features for each pre-processed document, given the entire body of docs.
+        Build the tf-idf scorer from the processed bodies, or from the document frequencies
+        collected while streaming, counted now if they were not.
         """
-        for document in self.processed_documents.values():
-            logging.info("computing statistics for {0}".format(document['id']))
-            document['tfidf'] = self.tfidf.compute(
-                document['candidates'],
-                document['tokenized_body'])
+        engine = TF_IDF
+        if self.tfidf_engine == 'matrix':
+            from features.tfidf_matrix import TF_IDF_Matrix
+            engine = TF_IDF_Matrix
+        with self.metrics.stage('tfidf'):
+            if self.processed_doc_bodies is None:
+                if self.doc_freqs is None:
+                    self.doc_freqs = {}
+                    for doc in self.restored(self.idf_documents()):
+                        count_document_frequencies(self.doc_freqs, doc.candidates)
+                return engine(doc_freqs=self.doc_freqs, docs_number=len(self.idf_documents()),
+                              lowered=self.lowered)
+            return engine(self.processed_doc_bodies, lowered=self.lowered)
 
-            document['positioning'] = self.positioning.compute_position_score(document['candidates'],
-                                                                              document['tokenized_body'])
+    def extract_features(self, features=None):
+        """
+        Extract the given features, by default the selected ones, for each pre-processed document,
+        given the entire body of docs. Each feature is extracted once, along with the features it
+        needs. The matrix engine scores every document in one batch up front, and a serial run
+        scores the positioning of every document in one batch, unless documents were spilled to
+        disk. Near-duplicates take the features of the document they duplicate.
+        """
+        needed = [feature for feature in required_features(self.features if features is None else features)
+                  if feature not in self.extracted]
+        if not needed:
+            return
+        self.process_documents()
+        with self.metrics.stage('features'):
+            documents = self.unique_documents()
+            scores = [document.tfidf for document in documents]
+            positions = [document.positioning for document in documents]
+            tfidf = None
+            if 'tfidf' in needed:
+                if self.tfidf is None:
+                    self.tfidf = self.build_tfidf()
+                if hasattr(self.tfidf, 'compute_all'):
+                    with self.metrics.stage('tfidf'):
+                        arrays = [(document['candidates'], document['tokenized_body'])
+                                  for document in self.restored(documents)]
+                        scores = self.tfidf.compute_all([candidates for candidates, body in arrays],
+                                                        [body for candidates, body in arrays],
+                                                        top=self.tfidf_top)
+                else:
+                    tfidf = self.tfidf
 
-            document['keywords'] = self.extract_keywords(document['tfidf'],
-                                                         document['positioning'],
-                                                         lower_cutoff=self.tfidf_cutoff)
+            if self.workers > 1:
+                pool = multiprocessing.Pool(self.workers,
+                                            initializer=_init_feature_worker,
+                                            initargs=(tfidf, self.tfidf_cutoff, needed, self.tfidf_top))
+                try:
+                    # Spilled documents are read back a few chunks per worker at a time.
+                    size = len(documents) if self.spill is None else self.workers * 4 * self.chunk_size
+                    for start in range(0, len(documents), max(1, size)):
+                        window = documents[start:start + size]
+                        spilled = [document for document in window
+                                   if self.spill is not None and self.spill.restore(document)]
+                        results = pool.imap(_feature_worker,
+                                            zip(window, scores[start:start + size], positions[start:start + size]),
+                                            self.chunk_size)
+                        for document, (feature, timings, pid, caches) in zip(window, results):
+                            document.update(feature)
+                            self.record_document(document, timings)
+                            self.record_worker({}, pid, caches)
+                        for document in spilled:
+                            self.spill.release(document)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                if 'positioning' in needed and self.spill is None:
+                    with self.metrics.stage('positioning'):
+                        positions = self.positioning.compute_all(
+                            [document['candidates'] for document in documents],
+                            [document['tokenized_body'] for document in documents],
+                            [document['id'] for document in documents])
+                for document, tfidf_scores, positioning_scores in izip(self.restored(documents), scores, positions):
+                    timings = {}
+                    document.update(compute_features(document,
+                                                     tfidf,
+                                                     self.positioning,
+                                                     self.collocations,
+                                                     self.tfidf_cutoff,
+                                                     tfidf_scores,
+                                                     positioning_scores,
+                                                     timings,
+                                                     needed,
+                                                     self.tfidf_top))
+                    self.record_document(document, timings)
+            for document in self.processed_documents.values():
+                if document.duplicate_of is not None:
+                    representative = self.processed_documents[document.duplicate_of]
+                    document.update(dict((feature, representative[feature]) for feature in needed))
+            if 'tfidf' in needed and (tfidf is None or self.workers == 1):
+                self.metrics.cache('idf', self.tfidf.cache_info())
+        self.extracted.update(needed)
 
-            document['bigrams'] = self.collocations.find_ngrams(2, document['processed_tokens'])
+    def feature(self, feature, doc_id):
+        """
+        Output: the feature of document doc_id, decoded to strings, extracting it first if needed.
+        """
+        self.extract_features([feature])
+        return self.processed_documents[doc_id].decode(self.vocabulary, self.tags, [feature])[feature]
 
-            document['trigrams'] = self.collocations.find_ngrams(2, document['processed_tokens'])
+    def statistic(self, stat):
+        """
+        Output: the compiled report of stat, 'keywords', 'bigrams' or 'trigrams', extracting its
+        feature first if needed.
+        """
+        if stat not in self.statistics:
+            self.extract_features([stat])
+            with self.metrics.stage('compile'):
+                self.compile_statistic(stat, dict(STATISTICS)[stat], self.compiler(),
+                                       self.decoded_documents(['id', stat]))
+        return self.statistics[stat]
 
     @staticmethod
     def extract_keywords(tf_idf_scores, positioning_scores, lower_cutoff=0.0001):
@@ -172,51 +874,207 @@ class Distiller():
                 keywords.append((candidate[0], score))
         return keywords
 
+    @staged('extract_features')
     def compile(self):
         """
-        Compile the statistics of all extracted features.
+        Compile the statistics of the selected features, over the features decoded to strings,
+        and the keyword collections when keywords are among them.
         """
-        self.compile_statistic('keywords', lambda x: x[0], nltk.FreqDist)
-        self.compile_statistic('bigrams', lambda x: ' '.join(map(lambda y: y[0], x)), nltk.FreqDist)
-        self.compile_statistic('trigrams', lambda x: ' '.join(map(lambda y: y[0], x)), nltk.FreqDist)
-        self.compile_collections()
+        stats = [(stat, transformer) for stat, transformer in STATISTICS
+                 if stat in self.features and stat not in self.statistics]
+        with self.metrics.stage('compile'):
+            fields = ['id', 'keywords'] + [stat for stat, transformer in stats if stat != 'keywords']
+            documents = self.decoded_documents(fields)
+            for stat, transformer in stats:
+                self.compile_statistic(stat, transformer, self.compiler(), documents)
+            if 'keywords' in self.extracted:
+                self.compile_collections(documents)
 
+    def compiler(self):
+        """
+        Output: the compiler of the statistics, exact frequencies, or approximate ones with a
+        statistics_top.
+        """
+        if self.statistics_top:
+            return approximate_frequencies(self.statistics_top, self.statistics_error)
+        return frequencies
+
+    def decoded_documents(self, fields=None):
+        """
+        Output: [processed document dict, ...] with the tokens and tags of every Document, holding
+        only the given fields when any.
+        """
+        return [document.decode(self.vocabulary, self.tags, fields)
+                for document in self.restored(self.processed_documents.values(), fields)]
+
+    def iter_docmap(self):
+        """
+        Output: a generator of (doc id, processed document dict), decoding one document at a time,
+        and reading the arrays of a spilled document back from disk only while it is decoded.
+        """
+        fields = [field for field in Document.FIELDS if not (self.slim_docmap and field in BULKY_FIELDS)]
+        for document in self.restored(self.processed_documents.values(), fields):
+            yield document.id, document.decode(self.vocabulary, self.tags, fields)
+
+    @staged('compile')
     def export(self):
         """
-        Write all of the stats and processed documents out to the target path.
+        Write all of the compiled stats and processed documents out to the target path.
+        """
+        with self.metrics.stage('export'):
+            export_reports(self.path, self.statistics, self.keymap, self.iter_docmap(),
+                           index=self.index,
+                           export_format=self.export_format,
+                           compress=self.compress,
+                           shard_size=self.shard_size,
+                           workers=self.workers)
+
+    @staged('compile')
+    def export_model(self):
+        """
+        Write the corpus model to the target path: the document frequencies of the tokens counted
+        for idf, keeping only the lowercase tokens tf-idf looks up, and with the 'ngrams' model,
+        the compiled bigrams and trigrams statistics.
+        Output: the model.CorpusModel written.
         """
-        logging.info("exporting statistics to {0}".format(self.path))
-        for key, value in self.statistics.items():
-            export_to_file(self.path, key, value)
+        from model import CorpusModel
+        with self.metrics.stage('export'):
+            doc_freqs = self.doc_freqs
+            if doc_freqs is None:
+                doc_freqs = {}
+                for document in self.restored(self.idf_documents()):
+                    count_document_frequencies(doc_freqs, document.candidates)
+            tokens = self.vocabulary.tokens
+            doc_freqs = dict((tokens[token], count) for token, count in doc_freqs.items()
+                             if tokens[token] == tokens[token].lower())
+            statistics = {}
+            if self.model == 'ngrams':
+                statistics = dict((stat, dict(self.statistics[stat])) for stat in ('bigrams', 'trigrams')
+                                  if stat in self.statistics)
+            model = CorpusModel(self.nlp_args, self.pipeline_arguments(), self.base_url,
+                                len(self.idf_documents()), doc_freqs, statistics)
+            model.write(self.path, self.compress)
+        logging.info("corpus model of {0} tokens".format(len(doc_freqs)))
+        return model
+
+    @staged('process_documents')
+    def export_shard(self):
+        """
+        Extract the features that need nothing but their document, and write the partial state of
+        the shard to the target path, to be combined by merge_shards.
+        """
+        self.extract_features([feature for feature in self.required if feature not in CORPUS_FEATURES])
+        counts = dict((stat, self.statistic(stat)) for stat, transformer in STATISTICS
+                      if stat in self.features and stat not in CORPUS_FEATURES)
+        with self.metrics.stage('export'):
+            tokens = self.vocabulary.tokens
+            doc_freqs = {}
+            for document in self.restored(self.idf_documents()):
+                count_document_frequencies(doc_freqs, document.candidates)
+            term_counts = Counter()
+            for document in self.restored(self.processed_documents.values()):
+                term_counts.update(document.body)
+            state = {
+                'shard': self.shard,
+                'metadata': self.metadata,
+                'nlp_args': self.nlp_args,
+                'extracted': sorted(self.extracted),
+                'vocabulary': tokens,
+                'tags': self.tags.tokens,
+                'doc_freqs': dict((tokens[token], count) for token, count in doc_freqs.items()),
+                'term_counts': dict((tokens[token], count) for token, count in term_counts.items()),
+                'ngram_counts': counts
+            }
+            fields = [field for field in Document.FIELDS if field != 'freq_distribution']
+            records = ((document.id, [self.input_positions[document.id],
+                                      document.decode(self.vocabulary, self.tags, fields)])
+                       for document in self.restored(self.processed_documents.values()))
+            write_reports(self.path, [('documents', records)], 'jsonl', self.compress)
+            with open(self.path + 'shard.json', 'w') as out:
+                json.dump(state, out)
 
-        export_to_file(self.path, 'keymap', self.keymap)
-        export_to_file(self.path, 'docmap', self.docmap)
+    def load_shards(self, paths):
+        """
+        Combine the partial states written by the shard runs in paths, in place of loading and
+        pre-processing the documents: the documents are encoded with the union of the shards'
+        vocabularies, in the order of the input, and the document frequencies and n-gram counts
+        are summed. The remaining stages then run as over the whole corpus.
+        """
+        with self.metrics.stage('ingestion'):
+            states = [read_shard(path) for path in paths]
+            for path, state in zip(paths, states):
+                if state['nlp_args'] != self.nlp_args:
+                    raise ValueError("shard at {0} was run with different nlp_args".format(path))
+            self.metadata = states[0]['metadata']
+            self.base_url = self.metadata['base_url']
+            self.vocabulary = Vocabulary(sorted(set(chain(*[state['vocabulary'] for state in states]))))
+            self.tags = Vocabulary(sorted(set(chain(TAGS, *[state['tags'] for state in states]))))
+            self.lowered = self.vocabulary.lowered()
+
+            documents = {}
+            order = []
+            for number, path in enumerate(paths):
+                for doc_id, (position, doc) in iter_report(path, 'documents'):
+                    document = Document.encode(doc, self.vocabulary, self.tags)
+                    document.encode_features(dict((feature, doc[feature]) for feature in Document.FEATURES
+                                                  if feature in doc), self.vocabulary, self.tags)
+                    document.duplicate_of = doc.get('duplicate_of')
+                    documents[document.id] = document
+                    order.append((position, number, document.id))
+            self.processed_documents = dict((doc_id, documents[doc_id]) for position, number, doc_id in sorted(order))
+
+            doc_freqs = Counter()
+            counts = {}
+            for state in states:
+                doc_freqs.update(state['doc_freqs'])
+                for stat, stat_counts in state['ngram_counts'].items():
+                    counts.setdefault(stat, Counter()).update(stat_counts)
+            self.doc_freqs = dict((self.vocabulary.get(token), count) for token, count in doc_freqs.items())
+            self.processed_doc_bodies = None
+            self.term_counts = Counter()
+            for state in states:
+                self.term_counts.update(state['term_counts'])
+            for stat, stat_counts in counts.items():
+                self.statistics[stat] = frequencies(())
+                self.statistics[stat].update(stat_counts)
+            self.extracted = set.intersection(*[set(state['extracted']) for state in states])
+        self.completed.update(['load', 'process_documents'])
+        self.metrics.info['shards'] = len(paths)
+        self.metrics.info['documents'] = len(self.processed_documents)
+        self.metrics.info['tokens'] = sum(len(doc.body) for doc in self.processed_documents.values())
+        self.metrics.info['vocabulary'] = len(self.vocabulary)
+
+    def report_metrics(self):
+        """
+        Log the measurements of the run, and write them to metrics.json in the target path.
+        """
+        if self.spill is not None:
+            self.metrics.info['spill'] = self.spill.info()
+        for line in self.metrics.summary():
+            logging.info(line)
+        if self.write_metrics:
+            self.metrics.write(self.path)
 
-    def compile_statistic(self, stat, transformer=lambda x: x, compiler=lambda x: x):
+    def compile_statistic(self, stat, transformer=lambda x: x, compiler=list, documents=None):
         """
         Creates a json output file for the given stat and set of bugs.
         """
-        stats = []
-        for doc in self.processed_documents.values():
-            for item in doc[stat]:
-                stats.append(transformer(item))
-        self.statistics[stat] = compiler(stats)
+        if documents is None:
+            documents = self.decoded_documents()
+        self.statistics[stat] = compile_statistic(documents, stat, transformer, compiler)
 
-    def compile_collections(self):
+    def compile_collections(self, documents=None):
         """
-        Stores the collections:
+        Stores the keyword collection:
         (keyword => [BZ id, ...])
-        (BZ id => Bug)
-        """
-        self.keymap = {}
-        self.docmap = {}
-        logging.info("storing document and keyword collections to {0}".format(self.path))
-        for doc in self.processed_documents.values():
-            self.docmap[doc['id']] = doc
-            for word in doc['keywords']:
-                if not word[0] in self.keymap:
-                    self.keymap[word[0]] = []
-                self.keymap[word[0]].append(str(doc['id']))
+        and the postings (keyword => [(BZ id, score), ...]) of the binary keyword index.
+        The document collection (BZ id => Bug) is decoded as it is exported, see iter_docmap.
+        """
+        logging.info("storing keyword collection to {0}".format(self.path))
+        if documents is None:
+            documents = self.decoded_documents(['id', 'keywords'])
+        self.keymap = compile_keymap(documents)
+        self.index = compile_index(documents)
 
     @staticmethod
     def get_logging_level(verbosity):
@@ -233,13 +1091,458 @@ class Distiller():
             return logging.DEBUG
 
 
-def export_to_file(path, stat, col):
+# The compiled statistics, with the transformer that turns a document's feature into its key.
+STATISTICS = [
+    ('keywords', lambda x: x[0]),
+    ('bigrams', lambda x: ' '.join(map(lambda y: y[0], x))),
+    ('trigrams', lambda x: ' '.join(map(lambda y: y[0], x)))
+]
+
+
+# Features that need the document frequencies of the whole corpus, left to merge_shards by a shard.
+CORPUS_FEATURES = ('tfidf', 'keywords')
+
+
+# Features that need others to be extracted first.
+FEATURE_DEPENDENCIES = {
+    'keywords': ('tfidf', 'positioning')
+}
+
+
+def required_features(features):
+    """
+    Input: [feature, ...] of Document.FEATURES.
+    Output: [feature, ...] the features with those they need, in the order of Document.FEATURES.
+    """
+    for feature in features:
+        if feature not in Document.FEATURES:
+            raise ValueError("unknown feature {0}".format(feature))
+    required = set(features)
+    for feature in features:
+        required.update(FEATURE_DEPENDENCIES.get(feature, ()))
+    return [feature for feature in Document.FEATURES if feature in required]
+
+
+def read_shard(path):
+    """
+    Output: the state of the shard written to path, as in shard.json.
+    """
+    with open(os.path.join(path, 'shard.json')) as state:
+        return json.load(state)
+
+
+def merge_shards(paths, target_path, verbosity=2, run_args=Distiller.default_run_args):
+    """
+    Combine the partial states of shard runs into the reports of the whole corpus, the same as a
+    run over it. The shards must have been run with the same nlp_args; run_args controls the
+    merge, as those of a Distiller run.
+    Output: the Distiller of the merge.
+    """
+    if not paths:
+        raise ValueError("no shards to merge")
+    distiller = Distiller(None, target_path, read_shard(paths[0])['nlp_args'], verbosity, run_args, run=False)
+    distiller.load_shards(paths)
+    distiller.run()
+    return distiller
+
+
+def run_configurations(document_file, target_path, configurations, verbosity=2, run_args=Distiller.default_run_args):
+    """
+    Run Distiller over the same documents with each of configurations, a list of nlp_args, or a
+    dict of name => nlp_args. The reports of each go to its own subdirectory of target_path, named
+    by its position in the list, or by its name. The documents are tokenized and POS tagged once
+    per tagger, by the first configuration using it, and every configuration then only filters,
+    normalizes and scores them. run_args apply to every run.
+    Output: [Distiller, ...] of each configuration.
+    """
+    if isinstance(configurations, dict):
+        names = sorted(configurations)
+        configurations = [configurations[name] for name in names]
+    else:
+        names = [str(number) for number in range(len(configurations))]
+    if not configurations:
+        raise ValueError("no configurations to run")
+    distillers = [Distiller(document_file, os.path.join(target_path, name), nlp_args, verbosity, run_args, run=False)
+                  for name, nlp_args in zip(names, configurations)]
+    taggers = {}
+    for distiller in distillers:
+        distiller.load_tagged(taggers.setdefault((distiller.tagger, distiller.tagger_model), distiller))
+        distiller.run()
+    for distiller in distillers:
+        distiller.tagged = None
+    return distillers
+
+
+def frequencies(items):
+    """
+    Output: nltk.FreqDist of items, the compiler of the statistics.
+    """
+    import nltk
+    return nltk.FreqDist(items)
+
+
+def approximate_frequencies(top, epsilon):
+    """
+    Output: a compiler of statistics like frequencies, counting in bounded memory only the top
+    most frequent items, within epsilon times the number of items counted, see HeavyHitters.
+    """
+    def compile_frequencies(items):
+        counts = frequencies(())
+        counts.update(HeavyHitters(top, epsilon).update(items).counts())
+        return counts
+    return compile_frequencies
+
+
+def chunks(iterable, size):
+    """
+    Output: a generator of lists of up to size consecutive items of iterable.
+    """
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def batch_documents(documents, size, split_size=0):
+    """
+    Output: a generator of lists of up to size consecutive documents, as chunks. With a split_size,
+    a document whose body is longer is split into parts by split_document, and each part is a list
+    of its own, for the parts to be pre-processed side by side.
+    """
+    batch = []
+    for document in documents:
+        parts = split_document(document, split_size) if split_size else [document]
+        if len(parts) == 1:
+            batch.append(document)
+            if len(batch) == size:
+                yield batch
+                batch = []
+            continue
+        if batch:
+            yield batch
+            batch = []
+        for part in parts:
+            yield [part]
+    if batch:
+        yield batch
+
+
+def split_document(document, size):
+    """
+    Input: a document from json, and the characters past which its body is split.
+    Output: [document] when the body is not split, or else the parts of the document, each a copy
+    of it holding a part of the body cut at a sentence boundary (see tokens.split_text), with the
+    offset of the part in the body, and part, its (number, count).
+    """
+    parts = split_text(document['body'], size)
+    if len(parts) == 1:
+        return [document]
+    return [dict(document, body=body, offset=offset, part=(number, len(parts)))
+            for number, (offset, body) in enumerate(parts)]
+
+
+def join_parts(processed):
+    """
+    Input: an iterable of processed documents and of the processed parts of split documents, in
+    input order.
+    Output: a generator of the processed documents, the parts of each split document joined back
+    into it: the tokens of the parts laid end to end are the tokens of the whole body, so the
+    positions and term counts are those of the whole document.
+    """
+    parts = []
+    for doc in processed:
+        if 'part' not in doc:
+            yield doc
+            continue
+        number, count = doc.pop('part')
+        parts.append(doc)
+        if number == count - 1:
+            joined = parts[0]
+            for part in parts[1:]:
+                joined['tokenized_body'] = joined['tokenized_body'] + part['tokenized_body']
+                joined['processed_tokens'] = joined['processed_tokens'] + part['processed_tokens']
+            joined['candidates'] = sorted(set(chain(*[part['candidates'] for part in parts])))
+            if 'freq_distribution' in joined:
+                joined['freq_distribution'] = frequencies(joined['tokenized_body'])
+            parts = []
+            yield joined
+
+
+def tagged_parts(documents, tagged):
+    """
+    Output: [(doc id, part number, tagged), ...] of a batch of documents or parts and their tags.
+    """
+    return [(document['id'], document.get('part', (0, 1))[0], tags) for document, tags in zip(documents, tagged)]
+
+
+def process_document(pipeline, document, base_url):
+    """
+    Run a single document from json through the pre-processing pipeline.
+    Output: the processed document dict, as stored in Distiller.processed_documents.
+    """
+    return process_batch(pipeline, [document], base_url)[0]
+
+
+def process_batch(pipeline, documents, base_url, timings=None, counts=True):
+    """
+    Run a batch of documents from json through the pre-processing pipeline, tagging all of their
+    tokens in one call. Each body is tokenized once, and the same token stream feeds tagging,
+    term counts, positions and candidates. The seconds spent 'tokenizing', 'tagging' and
+    'filtering' are added to timings, when given. Without counts, the term counts are left to
+    whoever needs them, as Documents count them from their body.
+    Output: [processed document dict, ...] as stored in Distiller.processed_documents.
+    """
+    return filter_batch(pipeline, documents, tag_batch(pipeline, documents, timings), base_url, timings, counts)
+
+
+def tag_batch(pipeline, documents, timings=None):
+    """
+    Tokenize and POS tag a batch of documents from json, the part of pre-processing that does not
+    depend on the filtering nlp_args. The seconds spent 'tokenizing' and 'tagging' are added to
+    timings, when given.
+    Output: [(lowercase tokens, [(word, tag), ...]), ...] for each document.
+    """
+    if timings is None:
+        timings = {}
+    with timed(timings, 'tokenizing'):
+        streams = [TokenStream(document['body'], document.get('offset', 0)) for document in documents]
+    return zip([stream.lowered for stream in streams], pipeline.tag_batch(streams, timings))
+
+
+def filter_batch(pipeline, documents, tagged, base_url, timings=None, counts=True):
+    """
+    Input: a batch of documents from json, and their lowercase and tagged tokens from tag_batch.
+    Output: [processed document dict, ...] of the documents, their tagged tokens filtered by the
+    pipeline, adding the seconds spent 'filtering' to timings, when given.
+    """
+    processed = pipeline.filter_batch([tagged_tokens for lowered, tagged_tokens in tagged], timings)
+    return [build_document(document, lowered, processed_tokens, base_url, counts)
+            for document, (lowered, tagged_tokens), processed_tokens in zip(documents, tagged, processed)]
+
+
+def build_document(document, tokenized_body, processed_tokens, base_url, counts=True):
+    """
+    Input: a document from json, the lowercase tokens of its body and its pre-processed tokens.
+    Output: the processed document dict, with freq_distribution only when counts is True.
+    """
+    logging.debug("processing document {0}".format(document['id']))
+    doc = {
+        'id': document['id'],
+        'url': base_url.format(int(document['id'])),
+        'tokenized_body': tokenized_body,
+        'processed_tokens': processed_tokens,
+        'description': document.get('description', '')
+    }
+
+    if not doc['processed_tokens']:
+        doc['candidates'] = []
+    else:
+        doc['candidates'] = sorted(set(zip(*doc['processed_tokens'])[0]))
+    if counts:
+        doc['freq_distribution'] = frequencies(doc['tokenized_body'])
+    if 'part' in document:
+        doc['part'] = document['part']
+    return doc
+
+
+def compute_features(document, tfidf, positioning, collocations, cutoff, tfidf_scores=None,
+                     positioning_scores=None, timings=None, features=Document.FEATURES, top=None):
+    """
+    Extract the features of a single pre-processed document, given the tf-idf scorer for
+    the entire body of docs. The document's tf-idf and positioning scores are passed in when
+    they were computed in a batch, or before. The seconds spent on each feature are added to
+    timings, when given. Only the top tf-idf scores are kept, when given.
+    Output: {feature: value} for each of the features.
+    """
+    logging.debug("computing statistics for {0}".format(document['id']))
+    extracted = compute_document_features(document, positioning, collocations, positioning_scores, timings,
+                                          features)
+    if 'tfidf' in features or 'keywords' in features:
+        extracted.update(score_keywords(document, extracted.get('positioning', positioning_scores), tfidf, cutoff,
+                                        tfidf_scores, timings, features, top))
+    return extracted
+
+
+def compute_document_features(document, positioning, collocations, positioning_scores=None, timings=None,
+                              features=Document.FEATURES):
+    """
+    Extract the features that depend on nothing but the document itself, adding the seconds
+    spent on 'positioning' and 'collocations' to timings, when given.
+    Output: {feature: value} for those of positioning, bigrams and trigrams among the features.
+    """
+    if timings is None:
+        timings = {}
+    extracted = {}
+    if 'positioning' in features:
+        if positioning_scores is None:
+            with timed(timings, 'positioning'):
+                positioning_scores = positioning.compute_position_score(document['candidates'],
+                                                                        document['tokenized_body'],
+                                                                        key=document['id'])
+        extracted['positioning'] = positioning_scores
+    for n, feature in ((2, 'bigrams'), (3, 'trigrams')):
+        if feature in features:
+            with timed(timings, 'collocations'):
+                extracted[feature] = collocations.find_ngrams(n, document['processed_tokens'])
+    return extracted
+
+
+def score_keywords(document, positioning_scores, tfidf, cutoff, tfidf_scores=None, timings=None,
+                   features=Document.FEATURES, top=None):
+    """
+    Score the document's candidates against the entire body of docs, keeping the top scores
+    when given, and adding the seconds spent to timings['tfidf'], when given.
+    Output: {feature: value} for those of tfidf and keywords among the features.
+    """
+    if timings is None:
+        timings = {}
+    extracted = {}
+    with timed(timings, 'tfidf'):
+        if tfidf_scores is None:
+            tfidf_scores = tfidf.compute(document['candidates'],
+                                         document['tokenized_body'],
+                                         document['freq_distribution'],
+                                         top)
+        if 'tfidf' in features:
+            extracted['tfidf'] = tfidf_scores
+        if 'keywords' in features:
+            extracted['keywords'] = Distiller.extract_keywords(tfidf_scores, positioning_scores, lower_cutoff=cutoff)
+    return extracted
+
+
+def compile_statistic(documents, stat, transformer=lambda x: x, compiler=list):
+    """
+    Input: processed documents, the feature to compile and how to key and compile its items.
+    Output: the compiled statistic over all of the documents. The compiler is handed the items
+    as they are read, never collected in a list.
+    """
+    return compiler(transformer(item) for doc in documents for item in doc[stat])
+
+
+def compile_collections(documents):
+    """
+    Input: processed documents.
+    Output: (keymap, docmap) where keymap is keyword => [doc id, ...] and docmap is
+    doc id => processed document.
+    """
+    docmap = {}
+    for doc in documents:
+        docmap[doc['id']] = doc
+    return compile_keymap(documents), docmap
+
+
+def compile_keymap(documents):
+    """
+    Input: processed documents.
+    Output: keymap, keyword => [doc id, ...]
+    """
+    keymap = {}
+    for doc in documents:
+        for word in doc['keywords']:
+            if not word[0] in keymap:
+                keymap[word[0]] = []
+            keymap[word[0]].append(str(doc['id']))
+    return keymap
+
+
+def export_reports(path, statistics, keymap, docmap, index=None, export_format='json', compress=False,
+                   shard_size=0, workers=1):
+    """
+    Write the compiled statistics and collections out to the target path, record by record.
+    docmap is a dict, or an iterable of (doc id, processed document) decoded as it is written.
+    The keymap is left out when None, as when keywords were not extracted. The postings of index,
+    when given, are written to the binary keyword index keymap.idx.
+    The export options are those of reports.write_reports.
+    """
+    logging.info("exporting statistics to {0}".format(path))
+    reports = [('docmap', docmap)] + ([('keymap', keymap)] if keymap is not None else []) + sorted(statistics.items())
+    write_reports(path, reports, export_format, compress, shard_size, workers)
+    if index is not None:
+        write_index(path + 'keymap.idx', index)
+
+
+# State of a worker process, set up once by the pool initializers below.
+_worker = {}
+
+
+def _init_process_worker(pipeline_args, base_url):
+    """
+    Keep the arguments of the worker's pipeline, built by its first batch, see _worker_pipeline.
+    """
+    _worker['pipeline_args'] = pipeline_args
+    _worker['pipeline'] = None
+    _worker['base_url'] = base_url
+
+
+def _worker_pipeline():
+    """
+    Output: the worker's pipeline, built and with its tagger and stop words loaded by the first
+    batch. Loading them in the pool initializer instead would kill the worker when they are
+    missing, and the pool would respawn it forever, while an error in a batch reaches the caller.
+    """
+    if _worker['pipeline'] is None:
+        pipeline = Pipeline(**_worker['pipeline_args'])
+        pipeline.load_resources()
+        _worker['pipeline'] = pipeline
+    return _worker['pipeline']
+
+
+def _process_worker(documents):
+    """
+    Output: (processed documents, timings, pid, caches) where caches holds the state of the
+    worker's pipeline caches.
+    """
+    pipeline = _worker_pipeline()
+    timings = {}
+    processed = process_batch(pipeline, documents, _worker['base_url'], timings, counts=False)
+    caches = {'pipeline': pipeline.cache_info(), 'tags': pipeline.tag_cache_info()}
+    return processed, timings, os.getpid(), caches
+
+
+def _tag_worker(documents):
+    """
+    Output: ([(doc id, part number, (lowercase tokens, tagged tokens)), ...], timings, pid, caches)
+    for a batch of documents, tagged by the worker's pipeline.
+    """
+    pipeline = _worker_pipeline()
+    timings = {}
+    tagged = tag_batch(pipeline, documents, timings)
+    caches = {'tags': pipeline.tag_cache_info()}
+    return tagged_parts(documents, tagged), timings, os.getpid(), caches
+
+
+def _init_feature_worker(tfidf, cutoff, features, top):
+    """
+    Keep the tf-idf scorer, its cutoff and top, and the features to extract, along with the
+    worker's own positioning and collocations scorers, see _feature_worker.
+    """
+    _worker['tfidf'] = tfidf
+    _worker['top'] = top
+    _worker['cutoff'] = cutoff
+    _worker['features'] = features
+    _worker['positioning'] = Positioning()
+    _worker['collocations'] = Collocations()
+
+
+def _feature_worker(task):
     """
-    Export the given stat to file in the given path.
+    Output: (features, timings, pid, caches) where caches holds the state of the worker's idf cache.
     """
-    with open(path + '/' + stat + '.json', 'w') as outfile:
-        json.dump(col, outfile)
-    outfile.close()
+    document, tfidf_scores, positioning_scores = task
+    timings = {}
+    features = compute_features(document,
+                                _worker['tfidf'],
+                                _worker['positioning'],
+                                _worker['collocations'],
+                                _worker['cutoff'],
+                                tfidf_scores,
+                                positioning_scores,
+                                timings,
+                                _worker['features'],
+                                _worker['top'])
+    caches = {'idf': _worker['tfidf'].cache_info()} if _worker['tfidf'] is not None else {}
+    return features, timings, os.getpid(), caches
 
 
 def make_path(path):
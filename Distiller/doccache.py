@@ -0,0 +1,197 @@
+import hashlib
+import json
+import logging
+import os
+import struct
+import zlib
+from array import array
+from collections import OrderedDict
+
+__author__ = 'fcanas'
+
+
+MAGIC = 'DDC2'
+
+# magic, number of strings, bytes of strings, length of the body, number of processed tokens.
+HEADER = struct.Struct('<4sIIII')
+
+
+def encode_entry(tokenized_body, processed_tokens):
+    """
+    Input: the lowercase tokens of a document's body, and its pre-processed [(token, tag), ...]
+    Output: the bytes of the cache entry: a header, the utf-8 lengths of the distinct strings of
+    the document, the strings themselves as utf-8, then arrays of the string numbers of the body,
+    of the processed tokens and of their tags, all zlib compressed. Strings are found by their
+    lengths rather than a separator, as a body may hold any character, NUL included.
+    """
+    numbers = {}
+    strings = []
+
+    def number(string):
+        if string not in numbers:
+            numbers[string] = len(strings)
+            strings.append(string)
+        return numbers[string]
+
+    body = array('I', [number(token) for token in tokenized_body])
+    tokens = array('I', [number(token) for token, tag in processed_tokens])
+    tags = array('I', [number(tag) for token, tag in processed_tokens])
+    encoded = [unicode(string).encode('utf-8') for string in strings]
+    lengths = array('I', [len(string) for string in encoded])
+    data = ''.join(encoded)
+    header = HEADER.pack(MAGIC, len(strings), len(data), len(body), len(tokens))
+    return zlib.compress(header + lengths.tostring() + data + body.tostring() + tokens.tostring() +
+                         tags.tostring())
+
+
+def decode_entry(entry):
+    """
+    Input: the bytes of a cache entry, as encoded by encode_entry.
+    Output: (tokenized_body, processed_tokens)
+    """
+    try:
+        entry = zlib.decompress(entry)
+    except zlib.error:
+        raise ValueError("not a document cache entry")
+    magic, strings_number, data_size, body_size, tokens_size = HEADER.unpack_from(entry, 0)
+    if magic != MAGIC:
+        raise ValueError("not a document cache entry")
+    position = HEADER.size
+    lengths = array('I')
+    lengths.fromstring(entry[position:position + strings_number * lengths.itemsize])
+    position += strings_number * lengths.itemsize
+    if sum(lengths) != data_size:
+        raise ValueError("truncated document cache entry")
+    strings = []
+    for length in lengths:
+        strings.append(entry[position:position + length].decode('utf-8'))
+        position += length
+    arrays = []
+    for size in (body_size, tokens_size, tokens_size):
+        numbers = array('I')
+        numbers.fromstring(entry[position:position + size * numbers.itemsize])
+        arrays.append(numbers)
+        position += size * numbers.itemsize
+    body, tokens, tags = arrays
+    return [strings[number] for number in body], [(strings[token], strings[tag]) for token, tag in zip(tokens, tags)]
+
+
+class DocumentCache():
+    """
+    A persistent cache of pre-processed documents, addressed by the content of their body: the key
+    of a document is the sha1 of its body and of the pipeline arguments it was processed with, so
+    a document whose body or arguments changed is simply not found. Each entry holds the tokens
+    of the body and the pre-processed tokens, in a file of its own under path, named by its key
+    (ab/cdef...). The term counts are not stored, as they are counted from the body's tokens.
+
+    The cache holds at most max_bytes of entries. Past that, the least recently used entries are
+    removed, as told by the modification time of their files, which every hit refreshes.
+    """
+
+    def __init__(self, path, arguments, max_bytes=2 ** 30):
+        """
+        Open the cache at path, creating it if needed, for documents processed with arguments, a
+        JSON serializable dict.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.namespace = json.dumps(arguments, sort_keys=True)
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        if not os.path.exists(path):
+            os.makedirs(path)
+        found = []
+        for directory, directories, files in os.walk(path):
+            for name in files:
+                if len(name) == 38 and not name.endswith('.tmp'):
+                    stat = os.stat(os.path.join(directory, name))
+                    found.append((stat.st_mtime, os.path.basename(directory) + name, stat.st_size))
+        for mtime, key, size in sorted(found):
+            self.entries[key] = size
+            self.bytes += size
+        self.evict()
+
+    def key(self, body):
+        """
+        Output: the key of a document's body.
+        """
+        if isinstance(body, unicode):
+            body = body.encode('utf-8')
+        return hashlib.sha1(self.namespace + '\0' + body).hexdigest()
+
+    def file_name(self, key):
+        return os.path.join(self.path, key[:2], key[2:])
+
+    def get(self, key):
+        """
+        Output: (tokenized_body, processed_tokens) cached for key, or None.
+        """
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        file_name = self.file_name(key)
+        try:
+            with open(file_name, 'rb') as entry:
+                cached = decode_entry(entry.read())
+            os.utime(file_name, None)
+        except (IOError, OSError, ValueError, struct.error) as e:
+            logging.warning("dropping unreadable document cache entry {0}: {1}".format(key, e))
+            self.remove(key)
+            self.misses += 1
+            return None
+        self.entries[key] = self.entries.pop(key)
+        self.hits += 1
+        return cached
+
+    def put(self, key, tokenized_body, processed_tokens):
+        """
+        Cache the pre-processed document for key, then evict entries past max_bytes.
+        """
+        entry = encode_entry(tokenized_body, processed_tokens)
+        file_name = self.file_name(key)
+        if not os.path.exists(os.path.dirname(file_name)):
+            os.makedirs(os.path.dirname(file_name))
+        temporary = '{0}.{1}.tmp'.format(file_name, os.getpid())
+        with open(temporary, 'wb') as out:
+            out.write(entry)
+        os.rename(temporary, file_name)
+        self.bytes += len(entry) - self.entries.pop(key, 0)
+        self.entries[key] = len(entry)
+        self.evict()
+
+    def remove(self, key):
+        self.bytes -= self.entries.pop(key, 0)
+        try:
+            os.remove(self.file_name(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache holds at most max_bytes.
+        """
+        while self.bytes > self.max_bytes and self.entries:
+            self.remove(next(iter(self.entries)))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def info(self):
+        """
+        Output: {hits, misses, hit_rate, size, maxsize, bytes, max_bytes}
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / float(lookups) if lookups else 0.0,
+            'size': len(self.entries),
+            'maxsize': None,
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes
+        }
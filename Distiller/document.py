@@ -0,0 +1,176 @@
+from array import array
+from collections import Counter
+
+__author__ = 'fcanas'
+
+
+class Document(object):
+    """
+    Compact form of a processed document. Tokens are ids of a corpus-wide Vocabulary and POS tags
+    are ids of the tag enum, kept in arrays:
+
+    body:       array('I') of the lowercase tokens of the body (tokenized_body)
+    tokens:     array('I') of the pre-processed tokens (processed_tokens)
+    tags:       array('B') of the tag of each pre-processed token
+    candidates: array('I') of the distinct pre-processed tokens, sorted
+
+    The term counts (freq_distribution) are not stored but counted from the body when asked for.
+    A near-duplicate of another document shares its arrays and features, and holds the id of that
+    document in duplicate_of. The arrays of a document spilled to disk (see spill.DocumentSpill)
+    are None until it is restored.
+    Features are kept as computed, over ids. Item access by the keys of the processed document
+    dict, e.g. document['candidates'], lets the feature functions take either form, and decode
+    turns a Document back into that dict, with strings, for export.
+    """
+
+    __slots__ = ('id', 'url', 'description', 'body', 'tokens', 'tags', 'candidates',
+                 'positioning', 'tfidf', 'keywords', 'bigrams', 'trigrams', 'duplicate_of')
+
+    FEATURES = ('positioning', 'tfidf', 'keywords', 'bigrams', 'trigrams')
+
+    # The keys of the processed document dict.
+    FIELDS = ('id', 'url', 'description', 'tokenized_body', 'processed_tokens', 'candidates',
+              'freq_distribution') + FEATURES + ('duplicate_of',)
+
+    # The fields decoded from the arrays, which a document spilled to disk has to read back.
+    ARRAY_FIELDS = ('tokenized_body', 'processed_tokens', 'candidates', 'freq_distribution')
+
+    def __init__(self, doc_id, url, description, body, tokens, tags):
+        self.id = doc_id
+        self.url = url
+        self.description = description
+        self.body = body
+        self.tokens = tokens
+        self.tags = tags
+        self.candidates = array('I', sorted(set(tokens)))
+        for feature in self.FEATURES:
+            setattr(self, feature, None)
+        self.duplicate_of = None
+
+    @classmethod
+    def encode(cls, doc, vocabulary, tags):
+        """
+        Input: a processed document dict, and the Vocabulary of tokens and of tags to encode it with.
+        Output: the Document.
+        """
+        processed = doc['processed_tokens']
+        return cls(doc['id'],
+                   doc['url'],
+                   doc['description'],
+                   array('I', vocabulary.encode(doc['tokenized_body'])),
+                   array('I', vocabulary.encode([token for token, tag in processed])),
+                   array('B', tags.encode([tag for token, tag in processed])))
+
+    def duplicate(self, doc_id, url, description):
+        """
+        Output: the Document of a near-duplicate of this one, with its own id, url and description
+        but sharing this document's tokens and features.
+        """
+        document = Document.__new__(Document)
+        document.__setstate__(self.__getstate__())
+        document.id = doc_id
+        document.url = url
+        document.description = description
+        document.duplicate_of = self.id
+        return document
+
+    def remap(self, token_ids, tag_ids):
+        """
+        Renumber the document's tokens and tags, after their Vocabularies were sorted.
+        Input: array mapping old token id => new id, and the same for tags.
+        """
+        self.body = array('I', [token_ids[token] for token in self.body])
+        self.tokens = array('I', [token_ids[token] for token in self.tokens])
+        self.tags = array('B', [tag_ids[tag] for tag in self.tags])
+        self.candidates = array('I', sorted(set(self.tokens)))
+
+    @property
+    def tokenized_body(self):
+        return self.body
+
+    @property
+    def processed_tokens(self):
+        """
+        Output: [(token id, tag id), ...]
+        """
+        return zip(self.tokens, self.tags)
+
+    @property
+    def freq_distribution(self):
+        """
+        Output: {token id: count} over the body.
+        """
+        return Counter(self.body)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def update(self, features):
+        """
+        Set the features, {feature: value}, as computed over ids.
+        """
+        for feature, value in features.items():
+            setattr(self, feature, value)
+
+    def decode(self, vocabulary, tags, fields=None):
+        """
+        Input: the Vocabularies of tokens and tags, and optionally the fields to decode, by default
+        every field of the processed document dict (FIELDS).
+        Output: the processed document dict, with the tokens and tags of the Vocabularies. Features
+        not computed yet are left out, and so is duplicate_of when the document is none.
+        """
+        tokens = vocabulary.tokens
+        tag_names = tags.tokens
+        decode_scores = lambda scores: [(tokens[token], score) for token, score in scores]
+        decode_ngrams = lambda ngrams: [tuple((tokens[token], tag_names[tag]) for token, tag in ngram)
+                                        for ngram in ngrams]
+        decoders = {
+            'tokenized_body': lambda: vocabulary.decode(self.body),
+            'processed_tokens': lambda: [(tokens[token], tag_names[tag])
+                                         for token, tag in zip(self.tokens, self.tags)],
+            'candidates': lambda: vocabulary.decode(self.candidates),
+            'freq_distribution': lambda: dict((tokens[token], count)
+                                              for token, count in self.freq_distribution.items()),
+            'positioning': lambda: dict((tokens[token], score) for token, score in self.positioning.items()),
+            'tfidf': lambda: decode_scores(self.tfidf),
+            'keywords': lambda: decode_scores(self.keywords),
+            'bigrams': lambda: decode_ngrams(self.bigrams),
+            'trigrams': lambda: decode_ngrams(self.trigrams)
+        }
+        doc = {}
+        for field in fields if fields is not None else self.FIELDS:
+            if (field in self.FEATURES or field == 'duplicate_of') and getattr(self, field) is None:
+                continue
+            doc[field] = decoders[field]() if field in decoders else getattr(self, field)
+        return doc
+
+    def encode_features(self, features, vocabulary, tags):
+        """
+        Set the features as decode gives them, {feature: value} over tokens and tags, encoding
+        them with the Vocabularies. Positioning scores are added in token order, as computed.
+        """
+        encode_scores = lambda scores: [(vocabulary.add(token), score) for token, score in scores]
+        encode_ngrams = lambda ngrams: [tuple((vocabulary.add(token), tags.add(tag)) for token, tag in ngram)
+                                        for ngram in ngrams]
+        encoders = {
+            'positioning': lambda scores: dict(sorted((vocabulary.add(token), score) for token, score in scores.items())),
+            'tfidf': encode_scores,
+            'keywords': encode_scores,
+            'bigrams': encode_ngrams,
+            'trigrams': encode_ngrams
+        }
+        self.update(dict((feature, encoders[feature](value)) for feature, value in features.items()))
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        self.duplicate_of = None
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+    def __eq__(self, other):
+        return isinstance(other, Document) and self.__getstate__() == other.__getstate__()
+
+    def __ne__(self, other):
+        return not self == other
@@ -0,0 +1,153 @@
+import random
+import re
+import zlib
+from array import array
+from collections import OrderedDict
+
+__author__ = 'fcanas'
+
+
+# A Mersenne prime above the 32 bit shingle hashes, the modulus of the MinHash permutations.
+PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+WORDS = re.compile(r'\w+', re.UNICODE)
+
+
+def shingles(text, size=3):
+    """
+    Input: the body of a document.
+    Output: set of the 32 bit hashes of every run of size consecutive lowercase words. A text of
+    fewer words is a single shingle, and a text without words has none.
+    """
+    words = WORDS.findall(text.lower())
+    if len(words) <= size:
+        runs = [words] if words else []
+    else:
+        runs = (words[start:start + size] for start in xrange(len(words) - size + 1))
+    return set(zlib.crc32(u' '.join(run).encode('utf-8')) & MAX_HASH for run in runs)
+
+
+def similarity(signature, other):
+    """
+    Output: the Jaccard similarity of two sets estimated from their MinHash signatures, the
+    fraction of the permutations on which they agree.
+    """
+    return sum(1 for a, b in zip(signature, other) if a == b) / float(len(signature))
+
+
+def choose_bands(permutations, threshold):
+    """
+    Output: (bands, rows) splitting the signatures into LSH bands, with bands * rows ==
+    permutations. Two sets of similarity s share a band with probability 1 - (1 - s^rows)^bands,
+    which rises steeply around (1 / bands)^(1 / rows): the largest such point not above threshold
+    is chosen, so that pairs above the threshold are almost always compared, and the comparison
+    weeds out the rest.
+    """
+    splits = [(permutations / rows, rows) for rows in range(1, permutations + 1) if permutations % rows == 0]
+    below = [(bands, rows) for bands, rows in splits if (1.0 / bands) ** (1.0 / rows) <= threshold]
+    return below[-1] if below else splits[0]
+
+
+class MinHash():
+    """
+    MinHash signatures of sets of 32 bit hashes, by one permutation hashing: a seeded mix of each
+    hash picks one of the permutations bins for it and its value there, and every bin keeps its
+    smallest value, so a signature takes a single pass over the set instead of one per
+    permutation. An empty bin borrows the value of the next bin that is not, offset by how far
+    it is (rotation densification), so that the bins of two sets still agree with a probability
+    of their Jaccard similarity. Signatures are comparable across runs and processes.
+    """
+
+    def __init__(self, permutations=128, seed=1):
+        self.permutations = permutations
+        self.seed = random.Random(seed).randint(0, MAX_HASH)
+        self.width = MAX_HASH // permutations + 1
+
+    def mix(self, hash):
+        """
+        Output: the 32 bit hash, scrambled by the seed.
+        """
+        hash = ((hash ^ self.seed ^ (hash >> 16)) * 0x45d9f3b) & MAX_HASH
+        hash = ((hash ^ (hash >> 16)) * 0x45d9f3b) & MAX_HASH
+        return hash ^ (hash >> 16)
+
+    def signature(self, hashes):
+        """
+        Output: array('I') of the signature of the set of hashes, or None for an empty set.
+        """
+        if not hashes:
+            return None
+        bins = [None] * self.permutations
+        for hash in hashes:
+            bin, value = divmod(self.mix(hash), self.width)
+            if bins[bin] is None or value < bins[bin]:
+                bins[bin] = value
+        # Going twice round right to left, every empty bin is last filled from the nearest bin to its right.
+        signature = list(bins)
+        nearest = None
+        for step in range(2 * self.permutations - 1, -1, -1):
+            bin = step % self.permutations
+            if bins[bin] is not None:
+                nearest = step
+            elif nearest is not None:
+                signature[bin] = (bins[nearest % self.permutations] + (nearest - step) * self.width) & MAX_HASH
+        return array('I', signature)
+
+
+class DuplicateDetector():
+    """
+    Groups near-duplicate documents as they are read, using MinHash signatures of their word
+    shingles and locality sensitive hashing over bands of the signatures.
+
+    The first document of a group represents it. Every later document is compared with the
+    representatives it shares a band with, and joins the first one whose estimated similarity
+    reaches threshold; otherwise it represents a group of its own. Only the signatures of
+    representatives are kept, so members are always near-duplicates of their representative,
+    never only of another member. Documents without words are never grouped.
+    """
+
+    def __init__(self, threshold=0.8, permutations=128, shingle_size=3, seed=1):
+        if not 0 < threshold <= 1:
+            raise ValueError("near-duplicate threshold must be in (0, 1], not {0}".format(threshold))
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.minhash = MinHash(permutations, seed)
+        self.bands, self.rows = choose_bands(permutations, threshold)
+        self.buckets = [{} for band in range(self.bands)]
+        self.signatures = {}
+        self.members = OrderedDict()
+
+    def add(self, doc_id, text):
+        """
+        Input: the id and body of the next document.
+        Output: the id of the representative of the group the document joins, or None when it
+        represents a group of its own.
+        """
+        signature = self.minhash.signature(shingles(text, self.shingle_size))
+        if signature is None:
+            return None
+        keys = [hash(tuple(signature[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+        compared = set()
+        for buckets, key in zip(self.buckets, keys):
+            for representative in buckets.get(key, ()):
+                if representative in compared:
+                    continue
+                compared.add(representative)
+                if similarity(signature, self.signatures[representative]) >= self.threshold:
+                    self.members[doc_id] = representative
+                    return representative
+        self.signatures[doc_id] = signature
+        for buckets, key in zip(self.buckets, keys):
+            buckets.setdefault(key, []).append(doc_id)
+        return None
+
+    def groups(self):
+        """
+        Output: {representative id: [member id, ...]} of the groups having members, members in
+        the order they were read.
+        """
+        groups = {}
+        for member, representative in self.members.items():
+            groups.setdefault(representative, []).append(member)
+        return groups
@@ -1,12 +1,21 @@
-import nltk
-from nltk.collocations import *
+from ngrams import NgramCounter
+from ..preprocessing.vocabulary import Vocabulary
 
 __author__ = 'mailfrancisco@gmail.com'
 
 class Collocations():
+    """
+    Finds the top n-grams of documents by pointwise mutual information, for any n.
 
-    def __init__(self):
-        pass
+    With corpus_counts, the n-gram counts of every document are also added to corpus-wide
+    counters, one per n, that share a single vocabulary. corpus_ngrams scores n-grams over the
+    whole corpus, and merge adds the counts of another Collocations, e.g. from a worker process.
+    """
+
+    def __init__(self, corpus_counts=False):
+        self.corpus_counts = corpus_counts
+        self.vocabulary = Vocabulary()
+        self.counters = {}
 
     def find_ngrams(self, n=2, body=None, top=10):
         """
@@ -18,20 +27,32 @@ class Collocations():
         Output:
         A list of the top 'top' n-grams in body.
         """
-        measures = {
-            2: nltk.collocations.BigramAssocMeasures,
-            3: nltk.collocations.TrigramAssocMeasures
-        }
+        if not body:
+            return []
 
-        finder = {
-            2: BigramCollocationFinder,
-            3: TrigramCollocationFinder
-        }
+        counter = NgramCounter.from_words(n, body, self.vocabulary)
+        if self.corpus_counts:
+            self.counter(n).merge(counter)
+        return counter.nbest(top)
 
+    def counter(self, n):
+        """
+        Return the corpus-wide counter of n-grams.
+        """
+        if n not in self.counters:
+            self.counters[n] = NgramCounter(n, self.vocabulary)
+        return self.counters[n]
 
-        if not body:
-            return []
+    def corpus_ngrams(self, n=2, top=10):
+        """
+        Output: the top 'top' n-grams of the whole corpus by pmi.
+        """
+        return self.counter(n).nbest(top)
 
-        m = measures[n]()
-        result = finder[n].from_words(body)
-        return result.nbest(m.pmi, top)
+    def merge(self, other):
+        """
+        Add the corpus-wide counts of another Collocations.
+        """
+        for n, counter in other.counters.items():
+            self.counter(n).merge(counter)
+        return self
@@ -2,21 +2,57 @@
 __author__ = 'mailfrancisco@gmail.com'
 
 class Positioning():
+    """
+    Scores tokens by how early they first occur in a document. The first occurrences of every
+    token are found in a single pass over the document's tokens, instead of one scan per token.
 
-    def __init__(self):
-        pass
+    With keep_positions, the first occurrence of each scored token is kept in positions, under
+    the key given for its document, for reuse by other position-aware features.
+    """
 
-    def compute_position_score(self, tokens, document):
+    def __init__(self, keep_positions=False):
+        self.keep_positions = keep_positions
+        self.positions = {}
+
+    def compute_position_score(self, tokens, document, index=None, key=None):
         """
         Compute the positioning score for each of the tokens in this
-        document and return a map of token => score.
+        document and return a map of token => score. index, the document's
+        first_occurrences, is built when not given.
         """
+        if index is None:
+            index = self.first_occurrences(document)
         self.scores = {}
         for token in tokens:
-            if not token in self.scores.keys():
-                self.scores[token] = self.positioning_score(token, document)
+            if not token in self.scores:
+                self.scores[token] = self.score(index.get(token, len(document)), len(document))
+        if self.keep_positions:
+            self.positions[key] = dict((token, index.get(token, len(document))) for token in self.scores)
         return self.scores
 
+    def compute_all(self, token_lists, documents, keys=None):
+        """
+        Input: the tokens to score and the body of tokens of each document, and optionally the
+        key of each document for its kept positions.
+        Output: [{token: score}, ...] for each document.
+        """
+        if keys is None:
+            keys = [None] * len(documents)
+        return [self.compute_position_score(tokens, document, key=key)
+                for tokens, document, key in zip(token_lists, documents, keys)]
+
+    @staticmethod
+    def first_occurrences(body):
+        """
+        Return a map of token => index of its first occurrence in the body of tokens,
+        built in one pass.
+        """
+        index = {}
+        for position, token in enumerate(body):
+            if token not in index:
+                index[token] = position
+        return index
+
     def first_occurrence(self, token, body):
         """
         Return the index of the first occurrence of token in
@@ -33,4 +69,12 @@ class Positioning():
         Return a score based on the position of token in a
         body of tokens, normalized by length.
         """
-        return 1.0 + (1.0 - float(self.first_occurrence(token, body)) / float(len(body)))
\ No newline at end of file
+        return self.score(self.first_occurrence(token, body), len(body))
+
+    @staticmethod
+    def score(first_occurrence, length):
+        """
+        Return the positioning score of a token first occurring at the given index of a body of
+        tokens of the given length.
+        """
+        return 1.0 + (1.0 - float(first_occurrence) / float(length))
@@ -0,0 +1,120 @@
+import heapq
+import math
+from collections import Counter
+
+from ..preprocessing.vocabulary import Vocabulary
+
+__author__ = 'fcanas'
+
+
+# Bits given to each token id when packing an n-gram into a single integer.
+ID_BITS = 32
+ID_MASK = (1 << ID_BITS) - 1
+
+
+class NgramCounter():
+    """
+    Counts the contiguous n-grams, for any n, of one or more token sequences in a single pass.
+    Tokens are encoded as integer ids of a Vocabulary and every n-gram is packed into one integer,
+    so the counts live in two flat Counters of ints:
+
+    unigrams:   {token id: count}
+    ngrams:     {packed n-gram: count}
+
+    Counters can be merged, e.g. the counts of several workers, and score n-grams by pointwise
+    mutual information with the same formula and ordering as nltk's collocation finders.
+    Counters sharing a Vocabulary merge without re-encoding.
+    """
+
+    def __init__(self, n, vocabulary=None):
+        self.n = n
+        self.vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+        self.unigrams = Counter()
+        self.ngrams = Counter()
+        self.total = 0
+
+    @classmethod
+    def from_words(cls, n, words, vocabulary=None):
+        """
+        Output: a counter of the n-grams of the sequence of words.
+        """
+        return cls(n, vocabulary).count(words)
+
+    def count(self, words):
+        """
+        Add the unigrams and n-grams of a sequence of words to the counts.
+        """
+        ids = self.vocabulary.encode(words)
+        self.unigrams.update(ids)
+        self.total += len(ids)
+        n = self.n
+        for start in xrange(len(ids) - n + 1):
+            key = 0
+            for token_id in ids[start:start + n]:
+                key = (key << ID_BITS) | token_id
+            self.ngrams[key] += 1
+        return self
+
+    def merge(self, other):
+        """
+        Add the counts of another counter of the same n.
+        """
+        if other.n != self.n:
+            raise ValueError("cannot merge counts of {0}-grams into {1}-grams".format(other.n, self.n))
+        if other.vocabulary is self.vocabulary:
+            self.unigrams.update(other.unigrams)
+            self.ngrams.update(other.ngrams)
+        else:
+            ids = self.vocabulary.encode(other.vocabulary.tokens)
+            for token_id, count in other.unigrams.iteritems():
+                self.unigrams[ids[token_id]] += count
+            for key, count in other.ngrams.iteritems():
+                self.ngrams[self.pack(ids[token_id] for token_id in self.unpack(key))] += count
+        self.total += other.total
+        return self
+
+    def pack(self, ids):
+        key = 0
+        for token_id in ids:
+            key = (key << ID_BITS) | token_id
+        return key
+
+    def unpack(self, key):
+        ids = []
+        for _ in xrange(self.n):
+            ids.append(key & ID_MASK)
+            key >>= ID_BITS
+        ids.reverse()
+        return ids
+
+    def decode(self, key):
+        """
+        Output: the n-gram packed in key, as a tuple of tokens.
+        """
+        return tuple(self.vocabulary.decode(self.unpack(key)))
+
+    def pmi(self, key):
+        """
+        Pointwise mutual information of the packed n-gram, as in Manning and Schutze 5.4:
+        log2(count * total^(n-1)) - log2(product of the unigram counts)
+        """
+        product = 1
+        for token_id in self.unpack(key):
+            product *= self.unigrams[token_id]
+        return math.log(self.ngrams[key] * self.total ** (self.n - 1), 2.0) - math.log(product, 2.0)
+
+    def score_ngrams(self):
+        """
+        Output: [(n-gram, pmi score), ...] for every n-gram, from the highest score down.
+        """
+        scores = [(-self.pmi(key), self.decode(key)) for key in self.ngrams]
+        scores.sort()
+        return [(ngram, -score) for score, ngram in scores]
+
+    def nbest(self, top):
+        """
+        Output: the top n-grams by pmi score, ties broken by the n-grams themselves.
+        """
+        best = heapq.nsmallest(top, ((-self.pmi(key), key) for key in self.ngrams),
+                               key=lambda item: (item[0], self.decode(item[1])))
+        return [self.decode(key) for score, key in best]
@@ -1,53 +1,121 @@
+import heapq
 import math
-import nltk
+from operator import itemgetter
 
 __author__ = 'mailfrancisco@gmail.com'
 
 
 class TF_IDF():
-    def __init__(self, documents):
+    def __init__(self, documents=None, doc_freqs=None, docs_number=None, lowered=None):
+        """
+        Either documents, the whole body of docs, or doc_freqs, the number of documents each
+        token appears in collected as the docs were read, along with docs_number.
+        For tokens given as Vocabulary ids, lowered maps each id to the id of its lowercase token.
+        """
         self.idf_cache = {}
+        self.hits = 0
+        self.misses = 0
+        self.lowered = lowered
         self.documents = documents
-        self.docs_number = len(documents)
+        self.doc_freqs = doc_freqs
+        if documents is not None:
+            docs_number = len(documents)
+        self.docs_number = docs_number
 
-    def compute(self, candidates, document):
+    def compute(self, candidates, document, freq_dist=None, top=None, cutoff=None):
         """
         For each token used in candidates list:
         Compute the final tf-idf score. The product of tf * idf.
         Returns a list of tuples: (word, tf-idf score)
-        Sorted by tf-idf score.
+        Sorted by tf-idf score. With a cutoff, only scores above it are kept, and with top, only
+        the top best, see select_scores.
         """
-        tfs = self.compute_tf(candidates, document)
-        idfs = self.compute_idf(candidates)
-        return sorted(map(lambda x, y: (x[0], x[1] * y[1]), tfs, idfs), key=lambda item: item[1], reverse=True)
+        tfs = self.compute_tf(candidates, document, freq_dist)
+        idfs = dict(self.compute_idf(candidates))
+        return select_scores([(word, tf * idfs[word]) for word, tf in tfs], top, cutoff)
 
-    def compute_tf(self, candidates, document):
+    def compute_tf(self, candidates, document, freq_dist=None):
         """
         Compute the term frequency: How many times this word appears
-        in this document.
+        in this document. freq_dist, the document's term counts, is built when not given.
         Returns a list of tuples: (word, tf score)
         """
-        dist = nltk.FreqDist(document)
-        score_tf = lambda w, doc: dist[w.lower()] / float(len(doc))
+        dist = freq_dist
+        if dist is None:
+            import nltk
+            dist = nltk.FreqDist(document)
+        score_tf = lambda w, doc: dist[self.lower(w)] / float(len(doc))
         return [(word, score_tf(word, document)) for word in sorted(candidates)]
 
     def compute_idf(self, candidates):
         """
         Compute the inverse document frequency: A score of how uncommon a word
-        is among all the documents.
-        log(total_number_of_docs/1 + number_of_docs_tag_appears_in)
+        is among all the documents, see baseline_idf.
         Returns a list of tuples: (word, idf score)
         """
         idfs = []
-        score_idf = lambda w: sum([1 for d in self.documents if w.lower() in d])
-
         for word in set(sorted(candidates)):
             if not self.idf_cache.has_key(word):
-                idf = math.log(self.docs_number / 1.0 + score_idf(word))
+                # The document frequency is not looked up: baseline_idf does not use it.
+                idf = baseline_idf(self.docs_number)
                 self.idf_cache[word] = idf
+                self.misses += 1
             else:
                 idf = self.idf_cache[word]
+                self.hits += 1
             idfs.append((word, idf))
         return idfs
 
+    def cache_info(self):
+        """
+        Output: {hits, misses, hit_rate, size, maxsize} of the idf cache.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            'size': len(self.idf_cache),
+            'maxsize': None
+        }
+
+    def lower(self, word):
+        """
+        Return the lowercase form of word, or of the token it is the id of.
+        """
+        if self.lowered is None:
+            return word.lower()
+        return self.lowered[word]
+
+
+def baseline_idf(docs_number, doc_freq=None):
+    """
+    The idf of the original scorer, log(total_number_of_docs/1 + number_of_docs_tag_appears_in).
+    It looked words up among the (token, tag) pairs of the documents, where they are never found,
+    so every word scores log(total_number_of_docs) whatever its document frequency, doc_freq,
+    and the reports are built from these scores.
+    """
+    return math.log(docs_number / 1.0)
+
+
+def count_document_frequencies(doc_freqs, document):
+    """
+    Add one document to a map of token => number of documents the token appears in.
+    """
+    for token in set(document):
+        doc_freqs[token] = doc_freqs.get(token, 0) + 1
+    return doc_freqs
+
 
+def select_scores(scores, top=None, cutoff=None):
+    """
+    Input: [(word, score), ...]
+    Output: the scores from the highest down, only those above cutoff when given, and only the
+    top best when given. The top are picked with a heap instead of sorting every score. Equal
+    scores keep their order in the input.
+    """
+    if cutoff is not None:
+        scores = [item for item in scores if item[1] > cutoff]
+    if top is not None and top < len(scores):
+        return heapq.nlargest(top, scores, key=itemgetter(1))
+    return sorted(scores, key=itemgetter(1), reverse=True)
@@ -0,0 +1,151 @@
+from tf_idf import baseline_idf, select_scores
+
+try:
+    import numpy
+    from scipy import sparse
+except ImportError:
+    numpy = None
+    sparse = None
+
+__author__ = 'fcanas'
+
+
+class TF_IDF_Matrix():
+    """
+    Computes the same scores as TF_IDF, but for all documents at once. The vocabulary and a
+    sparse document-term count matrix are built a single time, and tf, df/idf and tf-idf are
+    gathered for every candidate of every document with batched numpy operations.
+
+    Requires numpy and scipy.
+    """
+
+    def __init__(self, documents=None, doc_freqs=None, docs_number=None, lowered=None):
+        """
+        Either documents, the whole body of docs, or doc_freqs, the number of documents each
+        token appears in, along with docs_number.
+        For tokens given as Vocabulary ids, lowered maps each id to the id of its lowercase token.
+        """
+        if numpy is None:
+            raise ImportError("TF_IDF_Matrix requires numpy and scipy")
+        self.vocabulary = {}
+        self.lowered = lowered
+        if documents is not None:
+            docs_number = len(documents)
+            occurrences = self.count_matrix(documents)
+            self.doc_freqs = numpy.bincount(occurrences.indices, minlength=len(self.vocabulary))
+        else:
+            for token in doc_freqs:
+                self.vocabulary.setdefault(token, len(self.vocabulary))
+            self.doc_freqs = numpy.zeros(len(self.vocabulary), dtype=numpy.int64)
+            for token, count in doc_freqs.items():
+                self.doc_freqs[self.vocabulary[token]] = count
+        self.docs_number = docs_number
+        self.idf_cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def count_matrix(self, documents, freq_dists=None):
+        """
+        Input: [[token, ...], ...] and optionally the {token: count} of each document, which
+        saves counting the tokens again.
+        Output: sparse matrix of documents x vocabulary holding token counts. Tokens not yet in
+        the vocabulary are added to it.
+        """
+        indptr = [0]
+        indices = []
+        data = []
+        if freq_dists is None:
+            for document in documents:
+                indices.extend(self.vocabulary.setdefault(token, len(self.vocabulary)) for token in document)
+                indptr.append(len(indices))
+            data = numpy.ones(len(indices), dtype=numpy.int64)
+        else:
+            for dist in freq_dists:
+                for token, count in dist.items():
+                    indices.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+                    data.append(count)
+                indptr.append(len(indices))
+        counts = sparse.csr_matrix((numpy.asarray(data, dtype=numpy.int64), indices, indptr),
+                                   shape=(len(documents), len(self.vocabulary)))
+        counts.sum_duplicates()
+        return counts
+
+    def compute_idf(self, doc_freqs):
+        """
+        Input: array of document frequencies.
+        Output: array of idf scores, see tf_idf.baseline_idf. The log is taken once per distinct
+        frequency, with the same math as TF_IDF.
+        """
+        idfs = numpy.empty(len(doc_freqs))
+        for df in numpy.unique(doc_freqs).tolist():
+            if df not in self.idf_cache:
+                self.idf_cache[df] = baseline_idf(self.docs_number, df)
+                self.misses += 1
+            else:
+                self.hits += 1
+            idfs[doc_freqs == df] = self.idf_cache[df]
+        return idfs
+
+    def cache_info(self):
+        """
+        Output: {hits, misses, hit_rate, size, maxsize} of the idf cache, keyed by document frequency.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            'size': len(self.idf_cache),
+            'maxsize': None
+        }
+
+    def compute_all(self, candidate_lists, documents, freq_dists=None, top=None, cutoff=None):
+        """
+        Input: the candidates list and the token list of each document, and optionally the
+        term counts of each document, and the top and cutoff of TF_IDF.compute.
+        Output: one list per document of tuples (word, tf-idf score) sorted by score, as
+        returned by TF_IDF.compute.
+        """
+        counts = self.count_matrix(documents, freq_dists)
+        lengths = numpy.array([len(document) for document in documents], dtype=numpy.float64)
+        lengths[lengths == 0] = 1.0
+
+        words = []
+        rows = []
+        for row, candidates in enumerate(candidate_lists):
+            for word in sorted(candidates):
+                words.append(word)
+                rows.append(row)
+        if not words:
+            return [[] for _ in candidate_lists]
+
+        rows = numpy.array(rows)
+        if self.lowered is None:
+            columns = numpy.array([self.vocabulary.get(word.lower(), -1) for word in words])
+        else:
+            columns = numpy.array([self.vocabulary.get(self.lowered[word], -1) for word in words])
+        in_documents = columns >= 0
+        in_corpus = in_documents & (columns < len(self.doc_freqs))
+
+        term_counts = numpy.zeros(len(columns))
+        term_counts[in_documents] = numpy.asarray(counts[rows[in_documents], columns[in_documents]]).ravel()
+        doc_freqs = numpy.zeros(len(columns), dtype=numpy.int64)
+        doc_freqs[in_corpus] = self.doc_freqs[columns[in_corpus]]
+
+        tfs = term_counts / lengths[rows]
+        scores = (tfs * self.compute_idf(doc_freqs)).tolist()
+
+        results = [[] for _ in candidate_lists]
+        for word, row, score in zip(words, rows.tolist(), scores):
+            results[row].append((word, score))
+        return [select_scores(result, top, cutoff) for result in results]
+
+    def compute(self, candidates, document, freq_dist=None, top=None, cutoff=None):
+        """
+        For each token used in candidates list:
+        Compute the final tf-idf score. The product of tf * idf.
+        Returns a list of tuples: (word, tf-idf score)
+        Sorted by tf-idf score, with the top and cutoff of TF_IDF.compute.
+        """
+        return self.compute_all([candidates], [document], None if freq_dist is None else [freq_dist], top,
+                                cutoff)[0]
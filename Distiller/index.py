@@ -0,0 +1,270 @@
+import heapq
+import mmap
+import struct
+
+__author__ = 'fcanas'
+
+
+MAGIC = 'DKIX'
+VERSION = 1
+
+# magic, version, number of keywords, number of documents, and the offset of each section below.
+HEADER = struct.Struct('<4sIII8Q')
+OFFSET = struct.Struct('<I')
+SCORE = struct.Struct('<f')
+
+
+def compile_index(documents):
+    """
+    Input: processed documents, with their keywords.
+    Output: {keyword: [(doc id, score), ...]} the postings of every keyword.
+    """
+    postings = {}
+    for doc in documents:
+        for keyword, score in doc['keywords']:
+            postings.setdefault(keyword, []).append((doc['id'], score))
+    return postings
+
+
+def write_index(file_name, postings):
+    """
+    Write the binary keyword index of postings, {keyword: [(doc id, score), ...]}, to file_name.
+    The index holds, after its header:
+
+    keyword table:  offsets of the keywords, sorted by their utf-8 bytes
+    posting table:  offsets of the posting list of each keyword
+    document table: offsets of the document ids, sorted by their utf-8 bytes
+    forward table:  offsets of the keyword list of each document
+    keywords:       utf-8 keywords
+    postings:       per keyword, (varint gap to the previous document number, float32 score), ...
+                    in document order
+    documents:      utf-8 document ids
+    forward:        per document, (varint keyword number, float32 score), ... best score first
+
+    Keywords and documents are numbered by their position in their tables. Table offsets are
+    uint32, relative to their section, and scores are stored as float32.
+    """
+    keywords = sorted((unicode(keyword).encode('utf-8'), keyword) for keyword in postings)
+    doc_ids = set()
+    for entries in postings.itervalues():
+        doc_ids.update(unicode(doc_id).encode('utf-8') for doc_id, score in entries)
+    doc_ids = sorted(doc_ids)
+    doc_numbers = dict((doc_id, number) for number, doc_id in enumerate(doc_ids))
+
+    posting_lists = []
+    forward_lists = [[] for _ in doc_ids]
+    for keyword_number, (encoded, keyword) in enumerate(keywords):
+        entries = sorted((doc_numbers[unicode(doc_id).encode('utf-8')], score)
+                         for doc_id, score in postings[keyword])
+        data = bytearray()
+        previous = 0
+        for doc_number, score in entries:
+            encode_varint(doc_number - previous, data)
+            data.extend(SCORE.pack(score))
+            previous = doc_number
+            forward_lists[doc_number].append((score, keyword_number))
+        posting_lists.append(data)
+
+    forward = []
+    for entries in forward_lists:
+        data = bytearray()
+        for score, keyword_number in sorted(entries, key=lambda entry: (-entry[0], entry[1])):
+            encode_varint(keyword_number, data)
+            data.extend(SCORE.pack(score))
+        forward.append(data)
+
+    blobs = [[encoded for encoded, keyword in keywords], posting_lists, doc_ids, forward]
+    tables = [offset_table(blob) for blob in blobs]
+    sections = tables + [''.join(str(item) for item in blob) for blob in blobs]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+
+    with open(file_name, 'wb') as index:
+        index.write(HEADER.pack(MAGIC, VERSION, len(keywords), len(doc_ids), *offsets))
+        for section in sections:
+            index.write(section)
+
+
+def offset_table(items):
+    """
+    Output: the packed offsets of items laid end to end, one more than items.
+    """
+    table = bytearray()
+    position = 0
+    table.extend(OFFSET.pack(position))
+    for item in items:
+        position += len(item)
+        table.extend(OFFSET.pack(position))
+    return str(table)
+
+
+def encode_varint(value, data):
+    """
+    Append value to the bytearray data, 7 bits per byte, low bits first.
+    """
+    while value >= 0x80:
+        data.append((value & 0x7f) | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+def decode_entries(data):
+    """
+    Input: the bytes of a posting or forward list.
+    Output: [(varint, score), ...]
+    """
+    data = bytearray(data)
+    entries = []
+    position = 0
+    while position < len(data):
+        value = 0
+        shift = 0
+        while data[position] & 0x80:
+            value |= (data[position] & 0x7f) << shift
+            shift += 7
+            position += 1
+        value |= data[position] << shift
+        position += 1
+        entries.append((value, SCORE.unpack_from(data, position)[0]))
+        position += SCORE.size
+    return entries
+
+
+class KeywordIndex():
+    """
+    Reads the binary keyword index written by write_index. The file is memory mapped, and only
+    the entries of the tables and lists a query touches are read: keywords and documents are
+    found by binary search over their sorted tables.
+
+    >>> index = KeywordIndex(target + 'keymap.idx')
+    >>> index.lookup(u'keyword')           # [(doc id, score), ...]
+    >>> index.top_documents(u'keyword', 10)
+    >>> index.top_keywords(u'42', 10)      # [(keyword, score), ...]
+    >>> index.search([u'key', u'word'])    # documents with every keyword, best first
+    """
+
+    def __init__(self, file_name):
+        self.file = open(file_name, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = HEADER.unpack_from(self.map, 0)
+        if header[0] != MAGIC or header[1] != VERSION:
+            self.close()
+            raise ValueError("{0} is not a keyword index".format(file_name))
+        self.keywords_number, self.documents_number = header[2:4]
+        (self.keyword_table, self.posting_table, self.document_table, self.forward_table,
+         self.keyword_data, self.posting_data, self.document_data, self.forward_data) = header[4:]
+
+    def item(self, table, data, number):
+        """
+        Output: the bytes of item number of the section data, located by its offset table.
+        """
+        start = OFFSET.unpack_from(self.map, table + number * OFFSET.size)[0]
+        end = OFFSET.unpack_from(self.map, table + (number + 1) * OFFSET.size)[0]
+        return self.map[data + start:data + end]
+
+    def keyword(self, number):
+        return self.item(self.keyword_table, self.keyword_data, number).decode('utf-8')
+
+    def document(self, number):
+        return self.item(self.document_table, self.document_data, number).decode('utf-8')
+
+    def find(self, table, data, size, key):
+        """
+        Output: the number of key in the sorted section data, or None.
+        """
+        key = unicode(key).encode('utf-8')
+        low, high = 0, size
+        while low < high:
+            middle = (low + high) // 2
+            if self.item(table, data, middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < size and self.item(table, data, low) == key:
+            return low
+        return None
+
+    def find_keyword(self, keyword):
+        return self.find(self.keyword_table, self.keyword_data, self.keywords_number, keyword)
+
+    def find_document(self, doc_id):
+        return self.find(self.document_table, self.document_data, self.documents_number, doc_id)
+
+    def postings(self, keyword):
+        """
+        Output: [(document number, score), ...] of keyword, in document order.
+        """
+        number = self.find_keyword(keyword)
+        if number is None:
+            return []
+        entries = decode_entries(self.item(self.posting_table, self.posting_data, number))
+        doc_number = 0
+        postings = []
+        for gap, score in entries:
+            doc_number += gap
+            postings.append((doc_number, score))
+        return postings
+
+    def lookup(self, keyword):
+        """
+        Output: [(doc id, score), ...] of the documents having keyword.
+        """
+        return [(self.document(number), score) for number, score in self.postings(keyword)]
+
+    def documents(self, keyword):
+        """
+        Output: [doc id, ...] of the documents having keyword.
+        """
+        return [self.document(number) for number, score in self.postings(keyword)]
+
+    def top_documents(self, keyword, top=10):
+        """
+        Output: [(doc id, score), ...] of the top documents for keyword, best first.
+        """
+        best = heapq.nsmallest(top, self.postings(keyword), key=lambda entry: (-entry[1], entry[0]))
+        return [(self.document(number), score) for number, score in best]
+
+    def top_keywords(self, doc_id, top=None):
+        """
+        Output: [(keyword, score), ...] of the top keywords of the document, best first.
+        """
+        number = self.find_document(doc_id)
+        if number is None:
+            return []
+        entries = decode_entries(self.item(self.forward_table, self.forward_data, number))
+        return [(self.keyword(keyword_number), score) for keyword_number, score in entries[:top]]
+
+    def intersect(self, keywords):
+        """
+        Output: [(document number, total score), ...] of the documents having every keyword,
+        in document order. The shortest posting list is read first.
+        """
+        lists = sorted((self.postings(keyword) for keyword in set(keywords)), key=len)
+        if not lists:
+            return []
+        totals = dict(lists[0])
+        for postings in lists[1:]:
+            if not totals:
+                break
+            totals = dict((number, totals[number] + score) for number, score in postings if number in totals)
+        return sorted(totals.items())
+
+    def search(self, keywords, top=None):
+        """
+        Output: [(doc id, total score), ...] of the documents having every keyword, best first.
+        """
+        matches = sorted(self.intersect(keywords), key=lambda entry: (-entry[1], entry[0]))
+        return [(self.document(number), score) for number, score in matches[:top]]
+
+    def __contains__(self, keyword):
+        return self.find_keyword(keyword) is not None
+
+    def __len__(self):
+        return self.keywords_number
+
+    def close(self):
+        self.map.close()
+        self.file.close()
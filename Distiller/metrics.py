@@ -0,0 +1,255 @@
+import cProfile
+import heapq
+import json
+import math
+import os
+import pstats
+import resource
+import signal
+import sys
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from StringIO import StringIO
+
+__author__ = 'fcanas'
+
+
+class Metrics():
+    """
+    Collects the measurements of a run, reported as metrics.json:
+
+    stages:       {stage: {seconds, cpu_seconds, calls, tokens, tokens_per_second, peak_rss_kb}}
+                  in the order the stages first ran. Stages that do not count their own tokens are
+                  rated against the tokens of the whole corpus. Time measured per document, or
+                  inside worker processes, adds up the seconds of every worker, and has no
+                  cpu_seconds or peak_rss_kb.
+    caches:       {cache: {hits, misses, hit_rate, size, maxsize}} summed over the processes using it.
+    per_document: {stage: {count, mean_seconds, stdev_seconds, max_seconds, outliers}} of the time
+                  taken by each document, where outliers are the slowest documents, [{id, seconds,
+                  tokens}, ...] slowest first.
+
+    The report also holds peak_rss_kb, the peak resident memory of the main process, and
+    peak_workers_rss_kb, that of the largest of its worker processes, once any has exited.
+    """
+
+    def __init__(self, outliers=10):
+        self.outliers = outliers
+        self.stages = OrderedDict()
+        self.caches = {}
+        self.documents = OrderedDict()
+        self.info = {}
+
+    @contextmanager
+    def stage(self, name, tokens=0):
+        """
+        Time the body of the with statement as a call to stage name, processing tokens.
+        """
+        wall = time.time()
+        cpu = cpu_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.time() - wall, cpu_time() - cpu, tokens)
+            self.stages[name]['peak_rss_kb'] = peak_rss_kb()
+
+    def add(self, name, seconds, cpu_seconds=None, tokens=0, calls=1):
+        """
+        Add a measurement of stage name.
+        """
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = {'seconds': 0.0, 'cpu_seconds': None, 'calls': 0, 'tokens': 0,
+                                         'peak_rss_kb': None}
+        stage['seconds'] += seconds
+        if cpu_seconds is not None:
+            stage['cpu_seconds'] = (stage['cpu_seconds'] or 0.0) + cpu_seconds
+        stage['calls'] += calls
+        stage['tokens'] += tokens
+
+    def document(self, stage, doc_id, seconds, tokens=0):
+        """
+        Add the time a document took in stage.
+        """
+        stats = self.documents.get(stage)
+        if stats is None:
+            stats = self.documents[stage] = {'count': 0, 'total': 0.0, 'squares': 0.0, 'slowest': []}
+        stats['count'] += 1
+        stats['total'] += seconds
+        stats['squares'] += seconds * seconds
+        entry = (seconds, doc_id, tokens)
+        if len(stats['slowest']) < self.outliers:
+            heapq.heappush(stats['slowest'], entry)
+        elif seconds > stats['slowest'][0][0]:
+            heapq.heapreplace(stats['slowest'], entry)
+
+    def cache(self, name, info, key=None):
+        """
+        Record the {hits, misses, size, maxsize} of a cache, as last seen in the process key.
+        Caches of the same name in several processes are reported summed.
+        """
+        if info is not None:
+            self.caches.setdefault(name, {})[key] = info
+
+    def report(self):
+        """
+        Output: the metrics, as written to metrics.json.
+        """
+        stages = OrderedDict()
+        for name, stage in self.stages.items():
+            stage = dict(stage)
+            tokens = stage['tokens'] or self.info.get('tokens', 0)
+            stage['tokens_per_second'] = tokens / stage['seconds'] if stage['seconds'] else None
+            stages[name] = stage
+
+        caches = {}
+        for name, processes in self.caches.items():
+            hits = sum(info['hits'] for info in processes.values())
+            misses = sum(info['misses'] for info in processes.values())
+            caches[name] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': float(hits) / (hits + misses) if hits + misses else 0.0,
+                'size': sum(info['size'] for info in processes.values()),
+                'maxsize': sum(info['maxsize'] or 0 for info in processes.values()) or None,
+                'processes': len(processes)
+            }
+
+        documents = OrderedDict()
+        for stage, stats in self.documents.items():
+            mean = stats['total'] / stats['count']
+            variance = max(0.0, stats['squares'] / stats['count'] - mean * mean)
+            slowest = sorted(stats['slowest'], reverse=True)
+            documents[stage] = {
+                'count': stats['count'],
+                'mean_seconds': mean,
+                'stdev_seconds': math.sqrt(variance),
+                'max_seconds': slowest[0][0],
+                'outliers': [{'id': doc_id, 'seconds': seconds, 'tokens': tokens}
+                             for seconds, doc_id, tokens in slowest]
+            }
+
+        report = OrderedDict()
+        report.update(self.info)
+        report['peak_rss_kb'] = peak_rss_kb()
+        report['peak_workers_rss_kb'] = peak_rss_kb(resource.RUSAGE_CHILDREN) or None
+        report['stages'] = stages
+        report['caches'] = caches
+        report['per_document'] = documents
+        return report
+
+    def summary(self):
+        """
+        Output: one line per stage, for the log, and a last one with the peak memory.
+        """
+        lines = []
+        report = self.report()
+        for name, stage in report['stages'].items():
+            line = "{0}: {1:.3f}s".format(name, stage['seconds'])
+            if stage['tokens_per_second']:
+                line += ", {0:.0f} tokens/s".format(stage['tokens_per_second'])
+            lines.append(line)
+        line = "peak memory: {0:.1f} MB".format(report['peak_rss_kb'] / 1024.0)
+        if report['peak_workers_rss_kb']:
+            line += ", {0:.1f} MB per worker".format(report['peak_workers_rss_kb'] / 1024.0)
+        lines.append(line)
+        return lines
+
+    def write(self, path):
+        """
+        Write the report to metrics.json in path.
+        """
+        with open(path + 'metrics.json', 'w') as out:
+            json.dump(self.report(), out, indent=2)
+        return path + 'metrics.json'
+
+
+def cpu_time():
+    """
+    Output: the user and system CPU time of this process.
+    """
+    times = os.times()
+    return times[0] + times[1]
+
+
+def peak_rss_kb(who=resource.RUSAGE_SELF):
+    """
+    Output: the peak resident memory of this process so far, in kilobytes, or with
+    RUSAGE_CHILDREN, that of the largest of its child processes that have exited.
+    """
+    peak = resource.getrusage(who).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+class Profiler():
+    """
+    Opt-in profiling of a run, in the main process:
+
+    cprofile:   deterministic profile with cProfile, saved as profile.pstats for pstats or
+                snakeviz, and its top functions by cumulative time added to the report.
+    sample:     statistical profile taking a stack sample every interval seconds of CPU time,
+                saved as profile.folded, one 'frame;frame;... count' line per stack, the input
+                of flamegraph.pl and speedscope. Sampling uses SIGPROF, so it is Unix only.
+    """
+
+    def __init__(self, mode, path, interval=0.005, top=25):
+        if mode not in ('cprofile', 'sample'):
+            raise ValueError("unknown profile mode {0}".format(mode))
+        self.mode = mode
+        self.path = path
+        self.interval = interval
+        self.top = top
+        self.profile = None
+        self.samples = Counter()
+
+    def start(self):
+        if self.mode == 'cprofile':
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        else:
+            signal.signal(signal.SIGPROF, self.sample)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append('{0} ({1}:{2})'.format(code.co_name, os.path.basename(code.co_filename),
+                                                code.co_firstlineno))
+            frame = frame.f_back
+        self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        """
+        Stop profiling and write the profile out.
+        Output: {mode, file, ...} describing the profile, for the report.
+        """
+        if self.mode == 'cprofile':
+            self.profile.disable()
+            file_name = self.path + 'profile.pstats'
+            self.profile.dump_stats(file_name)
+            output = StringIO()
+            stats = pstats.Stats(self.profile, stream=output)
+            stats.sort_stats('cumulative').print_stats(self.top)
+            return {'mode': self.mode, 'file': file_name, 'top': output.getvalue().splitlines()}
+
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+        file_name = self.path + 'profile.folded'
+        with open(file_name, 'w') as out:
+            for stack, count in self.samples.most_common():
+                out.write('{0} {1}\n'.format(stack, count))
+        return {'mode': self.mode, 'file': file_name, 'samples': sum(self.samples.values()),
+                'interval': self.interval}
+
+
+@contextmanager
+def timed(timings, name):
+    """
+    Add the wall clock time of the body of the with statement to timings[name].
+    """
+    start = time.time()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.time() - start
@@ -0,0 +1,165 @@
+import gzip
+import json
+import logging
+import os
+import time
+
+from collections import Counter
+from distiller import STATISTICS, CORPUS_FEATURES, compute_features, process_batch, required_features
+from features.Collocations import Collocations
+from features.Positioning import Positioning
+from features.tf_idf import TF_IDF
+from preprocessing.pipeline import Pipeline
+
+__author__ = 'fcanas'
+
+
+MODEL_VERSION = 1
+
+
+class CorpusModel():
+    """
+    The frozen state of a corpus that new documents are scored against, written by a Distiller run
+    with a model run_arg, as model.json (model.json.gz when compressed):
+
+    {
+        version: INT,
+        nlp_args: {...},                    # the nlp_args of the run
+        pipeline: {...},                    # the arguments of its pre-processing Pipeline
+        base_url: "...",
+        docs_number: INT,                   # the documents counted for idf
+        doc_freqs: {token: INT, ...},       # the idf table, as document frequencies
+        statistics: {stat: {key: INT}}      # optional, the bigrams and trigrams statistics
+    }
+
+    Scores from the document frequencies are computed exactly as TF_IDF computes them over the
+    whole corpus, so a document of the corpus scores the same against its model as in the run.
+    """
+
+    def __init__(self, nlp_args, pipeline, base_url, docs_number, doc_freqs, statistics=None):
+        self.nlp_args = nlp_args
+        self.pipeline = pipeline
+        self.base_url = base_url
+        self.docs_number = docs_number
+        self.doc_freqs = doc_freqs
+        self.statistics = statistics or {}
+
+    def to_json(self):
+        return {
+            'version': MODEL_VERSION,
+            'nlp_args': self.nlp_args,
+            'pipeline': self.pipeline,
+            'base_url': self.base_url,
+            'docs_number': self.docs_number,
+            'doc_freqs': self.doc_freqs,
+            'statistics': self.statistics
+        }
+
+    def write(self, path, compress=False):
+        """
+        Write the model to model.json in path, gzipped with compress.
+        Output: the name of the file written.
+        """
+        file_name = os.path.join(path, 'model.json.gz' if compress else 'model.json')
+        out = gzip.open(file_name, 'wb') if compress else open(file_name, 'wb')
+        try:
+            json.dump(self.to_json(), out)
+        finally:
+            out.close()
+        return file_name
+
+    @classmethod
+    def load(cls, path):
+        """
+        Input: the model file, or the path it was written to.
+        Output: the CorpusModel.
+        """
+        if os.path.isdir(path):
+            gzipped = os.path.join(path, 'model.json.gz')
+            path = gzipped if os.path.exists(gzipped) else os.path.join(path, 'model.json')
+        model = gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+        try:
+            state = json.load(model)
+        finally:
+            model.close()
+        if state.get('version') != MODEL_VERSION:
+            raise ValueError("unsupported corpus model version {0}".format(state.get('version')))
+        return cls(state['nlp_args'], state['pipeline'], state['base_url'], state['docs_number'],
+                   state['doc_freqs'], state['statistics'])
+
+    def tfidf(self):
+        """
+        Output: the TF_IDF scorer of the corpus.
+        """
+        return TF_IDF(doc_freqs=self.doc_freqs, docs_number=self.docs_number)
+
+
+class Scorer():
+    """
+    Extracts the features of new documents against a frozen CorpusModel, without the corpus: the
+    model, its pipeline and the nltk resources are loaded once, when the Scorer is created, and
+    every later call only processes the documents it is given.
+
+    >>> scorer = Scorer(CorpusModel.load(target))
+    >>> scorer.score(u'The page crashes when ...')
+    {'id': 0, 'keywords': [(u'crash', 0.41), ...], 'positioning': {...}, 'bigrams': [...], ...}
+    >>> scorer.score_batch(documents)
+
+    Features are those of the run that wrote the model, unless a selection is given. When the
+    model holds the corpus statistics, the results also hold corpus_counts, the number of times
+    each of the document's n-grams was counted over the corpus.
+    """
+
+    def __init__(self, model, features=None):
+        self.model = model
+        self.features = required_features(features if features is not None else model.nlp_args['features'])
+        self.cutoff = model.nlp_args['tfidf_cutoff']
+        self.top = model.nlp_args.get('tfidf_top')
+        self.pipeline = Pipeline(**model.pipeline)
+        self.pipeline.load_resources()
+        self.tfidf = model.tfidf() if any(feature in CORPUS_FEATURES for feature in self.features) else None
+        self.positioning = Positioning()
+        self.statistics = dict((stat, transformer) for stat, transformer in STATISTICS
+                               if stat in model.statistics and stat in self.features)
+
+    def score(self, document):
+        """
+        Input: the body of a document, or a document from json, {id, body, ...}.
+        Output: {id, feature: value, ...} of the features of the document, over tokens.
+        """
+        return self.score_batch([document])[0]
+
+    def score_batch(self, documents):
+        """
+        Input: [body or document from json, ...] tagged in a single batch. Documents without an
+        id are numbered by their position in the batch.
+        Output: [{id, feature: value, ...}, ...]
+        """
+        start = time.time()
+        documents = [document if isinstance(document, dict) else {'id': number, 'body': document}
+                     for number, document in enumerate(documents)]
+        documents = [document if 'id' in document else dict(document, id=number)
+                     for number, document in enumerate(documents)]
+        collocations = Collocations()
+        results = []
+        for doc in process_batch(self.pipeline, documents, self.model.base_url):
+            features = compute_features(doc, self.tfidf, self.positioning, collocations, self.cutoff,
+                                        features=self.features, top=self.top)
+            result = {'id': doc['id']}
+            result.update(features)
+            if self.statistics:
+                result['corpus_counts'] = self.corpus_counts(features)
+            results.append(result)
+        logging.debug("scored {0} documents in {1:.3f}s".format(len(documents), time.time() - start))
+        return results
+
+    def corpus_counts(self, features):
+        """
+        Output: {stat: {key: count over the corpus}} of the document's n-grams, keyed as in the
+        statistics reports.
+        """
+        counts = {}
+        for stat, transformer in self.statistics.items():
+            keys = Counter(transformer(ngram) for ngram in features[stat])
+            counts[stat] = dict((key, self.model.statistics[stat].get(key, 0)) for key in keys)
+        return counts
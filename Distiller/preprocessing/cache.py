@@ -0,0 +1,52 @@
+from collections import OrderedDict
+
+__author__ = 'fcanas'
+
+
+class LRUCache():
+    """
+    A bounded map that evicts its least recently used entry once it holds maxsize entries,
+    and keeps count of its hits and misses.
+    """
+
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        Return the value cached for key, marking it as the most recently used, or default.
+        """
+        try:
+            value = self.entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if key in self.entries:
+            del self.entries[key]
+        elif len(self.entries) >= self.maxsize:
+            self.entries.popitem(last=False)
+        self.entries[key] = value
+
+    def __len__(self):
+        return len(self.entries)
+
+    def info(self):
+        """
+        Output: {hits, misses, hit_rate, size, maxsize}
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / float(lookups) if lookups else 0.0,
+            'size': len(self.entries),
+            'maxsize': self.maxsize
+        }
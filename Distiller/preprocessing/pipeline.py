@@ -1,11 +1,23 @@
-from nltk import RegexpTokenizer
-from nltk.corpus import stopwords
 import re
-import nltk
+
+from cache import LRUCache
+from taggers import LexiconTagger, load_perceptron
+from tokens import TokenStream
+from ..metrics import timed
 
 __author__ = 'fcanas'
 
 
+NUMBERS = re.compile("^[0-9]*$")
+
+# nltk and its models are only loaded once a pipeline first needs them, and then kept in _shared
+# for every later pipeline of the process; see shared().
+_shared = {}
+
+# Marks a (word, pos) the memo has not seen, since None is cached for filtered out tokens.
+_MISSING = object()
+
+
 class Pipeline():
     """
     Responsible for pre-processing any given document by performing the following set of steps:
@@ -16,67 +28,222 @@ class Pipeline():
     4) Filter out useless tokens.
     5) Stem.
     6) Lemmatize
+
+    Steps 3 to 6 only depend on the (word, pos) pair, so their result is memoized in a bounded
+    LRU cache of cache_size entries (0 disables it). cache_info() reports its hit rate.
+
+    pre_process_batch tags the tokens of many documents in a single call to the tagger. With a
+    tag_cache_size, documents are tagged sentence by sentence and the tags of repeated sentences,
+    such as templates and stack trace headers, come from a cache instead of the tagger. The tagger
+    then sees each sentence on its own, so tags next to sentence boundaries may differ from tagging
+    the whole document at once.
+
+    tagger picks the POS tagger backend among TAGGERS, 'perceptron' for nltk's averaged perceptron,
+    or 'lexicon' for a lexicon and suffix rules tagger (see taggers.LexiconTagger), with the model
+    at tagger_model, or else the default model of the backend. Backends are loaded once per
+    process and model, and more are added by register_tagger.
     """
 
-    def __init__(self, pos_tag=True, black_list=None, pos_list=None, normalize=True, stem=True, lemmatize=True):
+    def __init__(self, pos_tag=True, black_list=None, pos_list=None, normalize=True, stem=True, lemmatize=True,
+                 cache_size=65536, tag_cache_size=0, tagger='perceptron', tagger_model=None):
         if not pos_list:
             pos_list = ['NN', 'JJ', 'NNP']
         if not black_list:
             black_list = []
+        if tagger not in TAGGERS:
+            raise ValueError("unknown tagger {0}, not one of {1}".format(tagger, sorted(TAGGERS)))
         self.pos_tag = pos_tag
+        self.tagger_backend = tagger
+        self.tagger_model = tagger_model
         self.black_list = black_list
         self.pos_list = pos_list
         self.normalize = normalize
         self.stem = stem
         self.lemmatize = lemmatize
+        self.tagger = None
+        self.stop_words = None
+        self.black_words = frozenset(map(unicode, black_list))
+        self.pos_tags = frozenset(pos_list)
+        self.cache = LRUCache(cache_size) if cache_size else None
+        self.tag_cache = LRUCache(tag_cache_size) if tag_cache_size else None
 
-    def pre_process(self, text):
+    def load_resources(self):
+        """
+        Load the POS tagger and the stop words list once, so that every later call to
+        pre_process reuses them instead of going back to the nltk data files. They are shared
+        with every other pipeline of the process.
         """
-        Input: "Blob of text..."
+        if self.tagger is None:
+            self.tagger = shared_tagger(self.tagger_backend, self.tagger_model)
+        if self.stop_words is None:
+            self.stop_words = shared('stop_words')
+
+    def pre_process(self, text=None, stream=None):
+        """
+        Input: "Blob of text...", or the TokenStream already made from it.
         Output: [(token, tag), ...]
         """
-        processed = []
-        tokens = self.tokenize(text)
-        if self.pos_tag:
-            tokens = self.pos_tag_tokens(tokens)
+        if stream is None:
+            stream = TokenStream(text)
+        return self.pre_process_batch([stream])[0]
+
+    def pre_process_batch(self, streams, timings=None):
+        """
+        Input: [TokenStream, ...] for a batch of documents, and optionally a dict the seconds spent
+        'tagging' and 'filtering' are added to.
+        Output: [[(token, tag), ...], ...] for each document, tagged in a single call to the tagger.
+        """
+        return self.filter_batch(self.tag_batch(streams, timings), timings)
 
+    def tag_batch(self, streams, timings=None):
+        """
+        Steps 1 and 2, which do not depend on the filtering arguments, so that pipelines filtering
+        differently can share their result.
+        Input: [TokenStream, ...] for a batch of documents, and optionally a dict the seconds spent
+        'tagging' are added to.
+        Output: [[(word, tag), ...], ...] for each document, tagged in a single call to the tagger.
+        """
+        if timings is None:
+            timings = {}
+        if not self.pos_tag:
+            return [stream.words for stream in streams]
+        with timed(timings, 'tagging'):
+            if self.tag_cache is None:
+                return self.pos_tag_batch([stream.words for stream in streams])
+            return self.pos_tag_sentences([stream.sentences() for stream in streams])
+
+    def filter_batch(self, tagged, timings=None):
+        """
+        Steps 3 to 6.
+        Input: [[(word, tag), ...], ...] the tagged words of each document of a batch, and optionally
+        a dict the seconds spent 'filtering' are added to.
+        Output: [[(token, tag), ...], ...] of the candidates of each document.
+        """
+        if timings is None:
+            timings = {}
+        with timed(timings, 'filtering'):
+            return [self.filter_tokens(tokens) for tokens in tagged]
+
+    def filter_tokens(self, tokens):
+        """
+        Input: [(token, tag), ...] for a document.
+        Output: [(token, tag), ...] of the candidates, filtered and normalized.
+        """
+        processed = []
+        cache = self.cache
         for token in tokens:
-            if not self.filter_by_pos(token) or not self.filter_by_pattern(token):
+            if not self.filter_by_pos(token):
                 continue
-            if self.normalize:
-                token = self.normalize_text(token)
-            if self.stem:
-                token = self.stem_token(token)
-            if self.lemmatize:
-                token = self.lemmatize_token(token)
-            processed.append(token)
+            if cache is None:
+                token = self.process_token(token)
+            else:
+                processed_token = cache.get(token, _MISSING)
+                if processed_token is _MISSING:
+                    processed_token = self.process_token(token)
+                    cache.put(token, processed_token)
+                token = processed_token
+            if token is not None:
+                processed.append(token)
         return processed
 
+    def process_token(self, token):
+        """
+        Input: (word, pos) that passed the POS filter.
+        Output: the filtered, normalized, stemmed and lemmatized (word, pos), or None when the
+        token is filtered out.
+        """
+        if not self.filter_by_pattern(token):
+            return None
+        if self.normalize:
+            token = self.normalize_text(token)
+        if self.stem:
+            token = self.stem_token(token)
+        if self.lemmatize:
+            token = self.lemmatize_token(token)
+        return token
+
+    def cache_info(self):
+        """
+        Output: {hits, misses, hit_rate, size, maxsize} of the token memo, or None when disabled.
+        """
+        if self.cache is None:
+            return None
+        return self.cache.info()
+
+    def tag_cache_info(self):
+        """
+        Output: {hits, misses, hit_rate, size, maxsize} of the sentence tag cache, or None when disabled.
+        """
+        if self.tag_cache is None:
+            return None
+        return self.tag_cache.info()
+
     @staticmethod
     def tokenize(text):
         """
         Input: "Body of text...:
         Output: [word, ...] list of tokenized words matching regex '\w+'
         """
-        tokenizer = RegexpTokenizer(r'\w+')
-        tokens = tokenizer.tokenize(text)
-        return tokens
+        return TokenStream(text).words
 
-    @staticmethod
-    def pos_tag_tokens(tokens):
+    def pos_tag_tokens(self, tokens):
         """
         Use nltk's pos taggers on the given tokens.
         Input: [token1, token2, ...]
         Output: [(token1, tag1), (token2, tag2), ...]
         """
-        return nltk.pos_tag(tokens)
+        return self.pos_tag_batch([tokens])[0]
+
+    def pos_tag_batch(self, token_lists):
+        """
+        Tag many token lists in one call to the tagger, loaded once per pipeline.
+        Input: [[token1, token2, ...], ...]
+        Output: [[(token1, tag1), (token2, tag2), ...], ...]
+        """
+        if self.tagger is None:
+            self.tagger = shared_tagger(self.tagger_backend, self.tagger_model)
+        if hasattr(self.tagger, 'tag_sents'):
+            return self.tagger.tag_sents(token_lists)
+        return self.tagger.batch_tag(token_lists)
+
+    def pos_tag_sentences(self, documents):
+        """
+        Tag documents sentence by sentence, taking repeated sentences from the tag cache and
+        tagging the rest in one batch.
+        Input: [[[token1, token2, ...], ...], ...] the sentences of each document.
+        Output: [[(token1, tag1), (token2, tag2), ...], ...] for each document.
+        """
+        tags = {}
+        missing = []
+        for sentences in documents:
+            for sentence in sentences:
+                key = tuple(sentence)
+                if key in tags:
+                    continue
+                tagged = self.tag_cache.get(key)
+                if tagged is None:
+                    missing.append(sentence)
+                    tags[key] = None
+                else:
+                    tags[key] = tagged
+        for sentence, tagged in zip(missing, self.pos_tag_batch(missing)):
+            tags[tuple(sentence)] = tagged
+            self.tag_cache.put(tuple(sentence), tagged)
+
+        tagged_documents = []
+        for sentences in documents:
+            tagged = []
+            for sentence in sentences:
+                tagged.extend(tags[tuple(sentence)])
+            tagged_documents.append(tagged)
+        return tagged_documents
 
     def filter_by_pos(self, token):
         """
         Input: (word, pos)
         Output: True if pos is noun, proper noun, or adj. False otherwise.
         """
-        return token[1] in self.pos_list
+        return token[1] in self.pos_tags
 
     @staticmethod
     def normalize_text(token):
@@ -92,8 +259,7 @@ class Pipeline():
         Input: (word, pos)
         Output: (stem of word, pos)
         """
-        porter = nltk.PorterStemmer()
-        return porter.stem(token[0]), token[1]
+        return shared('stemmer').stem(token[0]), token[1]
 
     @staticmethod
     def lemmatize_token(token):
@@ -101,8 +267,7 @@ class Pipeline():
         Input: (word, pos)
         Output: (Lemmatized word, pos)
         """
-        wnl = nltk.WordNetLemmatizer()
-        return wnl.lemmatize(token[0]), token[1]
+        return shared('lemmatizer').lemmatize(token[0]), token[1]
 
     def filter_by_pattern(self, token):
         """
@@ -111,8 +276,77 @@ class Pipeline():
         Input: (word, pos), [blacklist_word, ...]
         Output: False if word is any of the above. True otherwise.
         """
-        nums = re.compile("^[0-9]*$")
-        filtered = token[0].lower() not in map(unicode, self.black_list) and \
-                   token[0].lower() not in stopwords.words('english') and not \
-                       nums.match(token[0])
-        return filtered
+        if self.stop_words is None:
+            self.load_resources()
+        word = token[0].lower()
+        return word not in self.black_words and word not in self.stop_words and not NUMBERS.match(token[0])
+
+
+def shared(name):
+    """
+    Return the 'tagger', 'stop_words', 'stemmer' or 'lemmatizer' shared by all pipelines of the
+    process, loading it on first use.
+    """
+    if name not in _shared:
+        loaders = {
+            'tagger': load_tagger,
+            'stop_words': load_stop_words,
+            'stemmer': load_stemmer,
+            'lemmatizer': load_lemmatizer
+        }
+        _shared[name] = loaders[name]()
+    return _shared[name]
+
+
+def shared_tagger(backend='perceptron', model=None):
+    """
+    Return the tagger of backend with model shared by all pipelines of the process, loading it on
+    first use.
+    """
+    key = ('tagger', backend, model)
+    if key not in _shared:
+        _shared[key] = TAGGERS[backend](model)
+    return _shared[key]
+
+
+def register_tagger(name, loader):
+    """
+    Add a tagger backend, selected by the tagger argument of Pipeline. loader takes the path of a
+    model, or None, and returns the tagger, which tags a list of sentences by tag_sents.
+    """
+    TAGGERS[name] = loader
+
+
+def load_tagger():
+    """
+    Load the tagger used by nltk.pos_tag, so it can be kept around instead of being
+    looked up again on every call.
+    """
+    import nltk
+    try:
+        from nltk.tag.perceptron import PerceptronTagger
+    except ImportError:
+        return nltk.data.load(nltk.tag._POS_TAGGER)
+    return PerceptronTagger()
+
+
+def load_stop_words():
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words('english'))
+
+
+def load_stemmer():
+    import nltk
+    return nltk.PorterStemmer()
+
+
+def load_lemmatizer():
+    import nltk
+    return nltk.WordNetLemmatizer()
+
+
+# The tagger backends, by name: loaders of a tagger from the path of its model, or None.
+TAGGERS = {
+    'perceptron': lambda model: load_perceptron(model) if model else shared('tagger'),
+    'lexicon': LexiconTagger.load
+}
@@ -0,0 +1,90 @@
+import re
+
+__author__ = 'fcanas'
+
+
+# Words, or runs of punctuation. The words are exactly the tokens of RegexpTokenizer(r'\w+').
+TOKEN_PATTERN = re.compile(r'(\w+)|[^\w\s]+', re.UNICODE | re.MULTILINE | re.DOTALL)
+
+# Punctuation that ends a sentence.
+SENTENCE_END = re.compile(r'[.!?]')
+
+
+class TokenStream():
+    """
+    The result of a single tokenization pass over a document body, shared by every later stage:
+
+    tokens:     [token, ...] words and punctuation, in order
+    offsets:    [(start, end), ...] character offsets of each token in the body
+    lowered:    [token, ...] lowercase tokens, used for term counts and positions
+    words:      [word, ...] the word tokens only, used for tagging and candidates
+    word_index: [index, ...] position in tokens of each word
+    """
+
+    def __init__(self, text, offset=0):
+        """
+        Tokenize text. Offsets are shifted by offset, for text taken from within a larger body.
+        """
+        self.tokens = []
+        self.offsets = []
+        self.lowered = []
+        self.words = []
+        self.word_index = []
+        for match in TOKEN_PATTERN.finditer(text):
+            token = match.group()
+            if match.group(1) is not None:
+                self.word_index.append(len(self.tokens))
+                self.words.append(token)
+            self.tokens.append(token)
+            self.offsets.append((match.start() + offset, match.end() + offset))
+            self.lowered.append(token.lower())
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def sentences(self):
+        """
+        Output: [[word, ...], ...] the words of each sentence, split after punctuation holding
+        a '.', '!' or '?'.
+        """
+        sentences = []
+        sentence = []
+        word_index = 0
+        for index, token in enumerate(self.tokens):
+            if word_index < len(self.word_index) and self.word_index[word_index] == index:
+                sentence.append(self.words[word_index])
+                word_index += 1
+            elif sentence and SENTENCE_END.search(token):
+                sentences.append(sentence)
+                sentence = []
+        if sentence:
+            sentences.append(sentence)
+        return sentences
+
+
+def split_text(text, size):
+    """
+    Split a body of text at sentence boundaries, as TokenStream.sentences splits its words, into
+    parts of about size characters, each cut at the first boundary past size characters. Parts
+    are cut at the start of a token, so tokenizing them gives the tokens of the whole text.
+    Output: [(offset, part), ...] the parts of text with the offset each starts at, text whole
+    when it is no longer than size or has no boundary to cut at.
+    """
+    if len(text) <= size:
+        return [(0, text)]
+    parts = []
+    start = 0
+    words = False
+    boundary = False
+    for match in TOKEN_PATTERN.finditer(text):
+        if boundary and match.start() - start >= size:
+            parts.append((start, text[start:match.start()]))
+            start = match.start()
+        if match.group(1) is not None:
+            words = True
+            boundary = False
+        elif words and SENTENCE_END.search(match.group()):
+            words = False
+            boundary = True
+    parts.append((start, text[start:]))
+    return parts
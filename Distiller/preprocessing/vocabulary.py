@@ -0,0 +1,92 @@
+from array import array
+
+__author__ = 'fcanas'
+
+
+# The Penn Treebank tags used by nltk's taggers, in sorted order. A Vocabulary seeded with them is
+# the enum of POS tags: tag ids fit in a byte, array('B').
+TAGS = ('#', '$', "''", '(', ')', ',', '-NONE-', '.', ':', 'CC', 'CD', 'DT', 'EX', 'FW', 'IN', 'JJ',
+        'JJR', 'JJS', 'LS', 'MD', 'NN', 'NNP', 'NNPS', 'NNS', 'PDT', 'POS', 'PRP', 'PRP$', 'RB', 'RBR',
+        'RBS', 'RP', 'SYM', 'TO', 'UH', 'VB', 'VBD', 'VBG', 'VBN', 'VBP', 'VBZ', 'WDT', 'WP', 'WP$',
+        'WRB', '``')
+
+
+class Vocabulary():
+    """
+    Interns tokens as consecutive integer ids, so sequences of tokens can be stored and counted
+    as integers and turned back into tokens when needed.
+
+    Ids are handed out in order of first appearance. Once every token is in, sort renumbers them
+    in the order of the tokens themselves, so that sorting ids sorts tokens.
+    """
+
+    def __init__(self, tokens=()):
+        self.ids = {}
+        self.tokens = []
+        for token in tokens:
+            self.add(token)
+
+    def add(self, token):
+        """
+        Return the id of token, adding it to the vocabulary when it is new.
+        """
+        token_id = self.ids.get(token)
+        if token_id is None:
+            token_id = self.ids[token] = len(self.tokens)
+            self.tokens.append(token)
+        return token_id
+
+    def get(self, token, default=None):
+        """
+        Return the id of token, or default when it is not in the vocabulary.
+        """
+        return self.ids.get(token, default)
+
+    def encode(self, tokens):
+        """
+        Input: [token, ...]
+        Output: [id, ...] adding new tokens to the vocabulary.
+        """
+        ids = self.ids
+        encoded = []
+        for token in tokens:
+            token_id = ids.get(token)
+            if token_id is None:
+                token_id = self.add(token)
+            encoded.append(token_id)
+        return encoded
+
+    def decode(self, ids):
+        """
+        Input: [id, ...]
+        Output: [token, ...]
+        """
+        tokens = self.tokens
+        return [tokens[token_id] for token_id in ids]
+
+    def sort(self):
+        """
+        Renumber the tokens in sorted order.
+        Output: array('I') mapping each old id to its new id.
+        """
+        order = sorted(xrange(len(self.tokens)), key=self.tokens.__getitem__)
+        remap = array('I', [0]) * len(order)
+        for token_id, old_id in enumerate(order):
+            remap[old_id] = token_id
+        self.tokens = [self.tokens[old_id] for old_id in order]
+        self.ids = dict((token, token_id) for token_id, token in enumerate(self.tokens))
+        return remap
+
+    def lowered(self):
+        """
+        Output: array('I') mapping each id to the id of its lowercase token, or to len(self)
+        when the lowercase token is not in the vocabulary.
+        """
+        missing = len(self.tokens)
+        return array('I', [self.ids.get(token.lower(), missing) for token in self.tokens])
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __contains__(self, token):
+        return token in self.ids
@@ -0,0 +1,161 @@
+import glob
+import gzip
+import json
+import os
+from multiprocessing.pool import ThreadPool
+
+__author__ = 'fcanas'
+
+
+# Fields of the processed documents that only feed the features, left out of a slim docmap.
+BULKY_FIELDS = ('tokenized_body', 'processed_tokens', 'freq_distribution')
+
+
+class ReportWriter():
+    """
+    Writes one report record by record, so that no report has to be serialized as a whole:
+
+    json:   a JSON object of key: value, the same as json.dump of the whole report.
+    jsonl:  JSON Lines, one [key, value] record per line.
+
+    With compress, files are gzipped (.gz). With a shard_size, the report is split into files of
+    at most shard_size bytes of JSON each, named name-00000.json, name-00001.json, ... A single
+    record larger than shard_size gets a shard of its own.
+    """
+
+    def __init__(self, path, name, export_format='json', compress=False, shard_size=0):
+        if export_format not in ('json', 'jsonl'):
+            raise ValueError("unknown export format {0}".format(export_format))
+        self.path = path
+        self.name = name
+        self.export_format = export_format
+        self.compress = compress
+        self.shard_size = shard_size
+        self.files = []
+        self.out = None
+        self.size = 0
+        self.records = 0
+
+    def file_name(self):
+        """
+        Output: the path of the next file of the report.
+        """
+        name = self.name
+        if self.shard_size:
+            name += '-{0:05d}'.format(len(self.files))
+        name += '.' + self.export_format
+        if self.compress:
+            name += '.gz'
+        return self.path + name
+
+    def open(self):
+        file_name = self.file_name()
+        self.out = gzip.open(file_name, 'wb') if self.compress else open(file_name, 'wb')
+        self.files.append(file_name)
+        self.size = 0
+        self.records = 0
+        if self.export_format == 'json':
+            self.emit('{')
+
+    def close_file(self):
+        if self.export_format == 'json':
+            self.emit('}')
+        self.out.close()
+        self.out = None
+
+    def emit(self, text):
+        self.out.write(text)
+        self.size += len(text)
+
+    def write(self, key, value):
+        """
+        Add the record key: value to the report.
+        """
+        if self.export_format == 'json':
+            record = json.dumps(key if isinstance(key, basestring) else str(key)) + ': ' + json.dumps(value)
+        else:
+            record = json.dumps([key, value]) + '\n'
+        if self.out is None:
+            self.open()
+        elif self.shard_size and self.records and self.size + len(record) + 3 > self.shard_size:
+            self.close_file()
+            self.open()
+        if self.export_format == 'json' and self.records:
+            self.emit(', ')
+        self.emit(record)
+        self.records += 1
+
+    def write_all(self, items):
+        """
+        Input: a dict, or an iterable of (key, value) records.
+        """
+        if hasattr(items, 'iteritems'):
+            items = items.iteritems()
+        for key, value in items:
+            self.write(key, value)
+        return self
+
+    def close(self):
+        """
+        Finish the report, writing an empty one when no records were written.
+        Output: [path, ...] of the files written.
+        """
+        if self.out is None and not self.files:
+            self.open()
+        if self.out is not None:
+            self.close_file()
+        return self.files
+
+
+def write_reports(path, reports, export_format='json', compress=False, shard_size=0, workers=1):
+    """
+    Input: the target path, and [(name, dict or iterable of (key, value) records), ...]
+    Write each report with a ReportWriter. Reports are independent, so with several workers they
+    are written concurrently by a pool of threads.
+    Output: {name: [path, ...]} of the files written for each report.
+    """
+    def write(report):
+        name, items = report
+        for stale in report_files(path, name):
+            os.remove(stale)
+        writer = ReportWriter(path, name, export_format, compress, shard_size)
+        return name, writer.write_all(items).close()
+
+    if workers > 1 and len(reports) > 1:
+        pool = ThreadPool(min(workers, len(reports)))
+        try:
+            return dict(pool.map(write, reports))
+        finally:
+            pool.close()
+            pool.join()
+    return dict(map(write, reports))
+
+
+def report_files(path, name):
+    """
+    Output: [path, ...] of the files of a report, in any format, in order.
+    """
+    files = []
+    for export_format in ('json', 'jsonl'):
+        for pattern in ('{0}.{1}', '{0}.{1}.gz', '{0}-[0-9]*.{1}', '{0}-[0-9]*.{1}.gz'):
+            files.extend(glob.glob(os.path.join(path, pattern.format(name, export_format))))
+    return sorted(files)
+
+
+def iter_report(path, name):
+    """
+    Output: a generator of the (key, value) records of a report, read from whichever files were
+    written for it.
+    """
+    for file_name in report_files(path, name):
+        report = gzip.open(file_name, 'rb') if file_name.endswith('.gz') else open(file_name, 'rb')
+        try:
+            if '.jsonl' in file_name:
+                for line in report:
+                    key, value = json.loads(line)
+                    yield key, value
+            else:
+                for key, value in json.load(report).iteritems():
+                    yield key, value
+        finally:
+            report.close()
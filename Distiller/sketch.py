@@ -0,0 +1,120 @@
+import heapq
+import math
+import random
+import zlib
+from array import array
+
+__author__ = 'fcanas'
+
+
+# A Mersenne prime above the 64 bit item hashes, the modulus of the row hashes.
+PRIME = (1 << 89) - 1
+
+
+def item_hash(item):
+    """
+    Output: a 64 bit hash of a string, the same in every process.
+    """
+    if isinstance(item, unicode):
+        item = item.encode('utf-8')
+    return ((zlib.crc32(item) & 0xffffffff) << 32) | (zlib.adler32(item) & 0xffffffff)
+
+
+class CountMinSketch():
+    """
+    Approximate counts of items in a fixed depth x width table of counters, whatever the number
+    of distinct items. Each item adds to one counter per row, picked by a pairwise independent
+    hash, and its count is estimated by the smallest of its counters.
+
+    With width = ceil(e / epsilon) and depth = ceil(ln(1 / delta)), over a stream of total
+    counts, an estimate is never below the true count, and exceeds it by more than
+    epsilon * total with probability at most delta.
+    """
+
+    def __init__(self, epsilon=0.0001, delta=0.01, seed=1):
+        self.width = int(math.ceil(math.e / epsilon))
+        self.depth = int(math.ceil(math.log(1.0 / delta)))
+        generator = random.Random(seed)
+        self.rows = [(generator.randint(1, PRIME - 1), generator.randint(0, PRIME - 1)) for row in range(self.depth)]
+        self.counters = [array('L', [0]) * self.width for row in range(self.depth)]
+        self.total = 0
+
+    def columns(self, item):
+        hash = item_hash(item)
+        return [((a * hash + b) % PRIME) % self.width for a, b in self.rows]
+
+    def add(self, item, count=1):
+        """
+        Add count to item.
+        Output: the new estimate of item's count.
+        """
+        self.total += count
+        estimate = None
+        for counters, column in zip(self.counters, self.columns(item)):
+            counters[column] += count
+            if estimate is None or counters[column] < estimate:
+                estimate = counters[column]
+        return estimate
+
+    def estimate(self, item):
+        """
+        Output: the estimated count of item.
+        """
+        return min(counters[column] for counters, column in zip(self.counters, self.columns(item)))
+
+
+class HeavyHitters():
+    """
+    The most frequent items of a stream in bounded memory: a CountMinSketch estimates every
+    item's count, and the top items by estimate are tracked, each item being admitted when its
+    estimate beats the smallest tracked one.
+
+    Reported counts are CountMinSketch estimates, so each is at least the item's true count, and
+    at most epsilon * total above it with probability 1 - delta. Since tracked estimates only
+    grow, an item is only ever left out when its estimate, and so its true count, is at most the
+    smallest reported count: every item counted more often than that is reported.
+    """
+
+    def __init__(self, top=1000, epsilon=0.0001, delta=0.01, seed=1):
+        self.top = top
+        self.sketch = CountMinSketch(epsilon, delta, seed)
+        self.tracked = {}
+        self.heap = []
+
+    def add(self, item, count=1):
+        estimate = self.sketch.add(item, count)
+        if item in self.tracked:
+            self.tracked[item] = estimate
+            heapq.heappush(self.heap, (estimate, item))
+            if len(self.heap) > 4 * self.top:
+                self.heap = [(tracked, tracked_item) for tracked_item, tracked in self.tracked.items()]
+                heapq.heapify(self.heap)
+        elif len(self.tracked) < self.top:
+            self.tracked[item] = estimate
+            heapq.heappush(self.heap, (estimate, item))
+        elif estimate > self.smallest():
+            del self.tracked[heapq.heappop(self.heap)[1]]
+            self.tracked[item] = estimate
+            heapq.heappush(self.heap, (estimate, item))
+
+    def smallest(self):
+        """
+        Output: the smallest tracked estimate, dropping the stale entries of the heap above it.
+        """
+        while self.heap[0][1] not in self.tracked or self.tracked[self.heap[0][1]] != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0]
+
+    def update(self, items):
+        """
+        Add one to the count of each of items.
+        """
+        for item in items:
+            self.add(item)
+        return self
+
+    def counts(self):
+        """
+        Output: {item: estimated count} of the tracked items.
+        """
+        return dict((item, self.sketch.estimate(item)) for item in self.tracked)
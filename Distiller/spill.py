@@ -0,0 +1,99 @@
+import struct
+import tempfile
+from array import array
+
+__author__ = 'fcanas'
+
+
+# Lengths of the body, tokens, tags and candidates arrays of an entry.
+HEADER = struct.Struct('<IIII')
+
+
+class DocumentSpill():
+    """
+    A disk-backed store for the arrays of Documents, body, tokens, tags and candidates, which hold
+    the bulk of a processed document but are only read to extract its features and to export it.
+    A spilled Document keeps its id, url, description and features in memory, and its arrays are
+    written to the end of an unnamed temporary file, removed when the store is closed:
+
+    >>> spill = DocumentSpill(path)
+    >>> spill.spill(document)          # document.body, tokens, tags and candidates are now None
+    >>> spill.restore(document)        # read back while in use
+    >>> spill.release(document)        # and dropped again
+
+    Entries are never rewritten in place: spilling a document again appends a new entry, and the
+    old one is left unused in the file.
+    """
+
+    ARRAYS = (('body', 'I'), ('tokens', 'I'), ('tags', 'B'), ('candidates', 'I'))
+
+    def __init__(self, path=None):
+        self.file = tempfile.TemporaryFile(prefix='spill-', dir=path)
+        self.index = {}
+        self.bytes = 0
+        self.reads = 0
+
+    def __contains__(self, doc_id):
+        return doc_id in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def spill(self, document):
+        """
+        Write the arrays of document to the end of the file, and release them.
+        """
+        self.file.seek(0, 2)
+        offset = self.file.tell()
+        arrays = [getattr(document, name) for name, typecode in self.ARRAYS]
+        self.file.write(HEADER.pack(*[len(values) for values in arrays]))
+        for values in arrays:
+            self.file.write(values.tostring())
+        self.bytes += self.file.tell() - offset
+        self.index[document.id] = offset
+        self.release(document)
+
+    def alias(self, doc_id, other_id):
+        """
+        Spill document doc_id as sharing the arrays of the spilled document other_id, as a
+        near-duplicate does, without writing them again.
+        """
+        self.index[doc_id] = self.index[other_id]
+
+    def restore(self, document):
+        """
+        Read the arrays of a spilled document back into it.
+        Output: True when the document was spilled, False when its arrays were never released.
+        """
+        offset = self.index.get(document.id)
+        if offset is None:
+            return False
+        self.file.seek(offset)
+        lengths = HEADER.unpack(self.file.read(HEADER.size))
+        for (name, typecode), length in zip(self.ARRAYS, lengths):
+            values = array(typecode)
+            values.fromstring(self.file.read(length * values.itemsize))
+            setattr(document, name, values)
+        self.reads += 1
+        return True
+
+    def release(self, document):
+        """
+        Drop the arrays of a spilled document from memory, once restored and used.
+        """
+        for name, typecode in self.ARRAYS:
+            setattr(document, name, None)
+
+    def info(self):
+        return {'documents': len(self.index), 'bytes': self.bytes, 'reads': self.reads}
+
+    def close(self):
+        self.file.close()
+
+
+def array_bytes(document):
+    """
+    Output: the bytes held by the arrays of document.
+    """
+    return sum(values.itemsize * len(values) for values in
+               (document.body, document.tokens, document.tags, document.candidates))
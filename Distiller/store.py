@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import shelve
+
+from distiller import Distiller, STATISTICS, process_document, compute_document_features, score_keywords, \
+    compile_statistic, compile_collections, export_reports, make_path, frequencies
+from index import compile_index
+from features.Collocations import Collocations
+from features.Positioning import Positioning
+from features.tf_idf import TF_IDF
+from preprocessing.pipeline import Pipeline
+
+__author__ = 'fcanas'
+
+
+class CorpusStore():
+    """
+    Keeps the processed state of a document collection on disk, so that documents can be added,
+    updated and deleted without reprocessing the rest of the collection. The store at path holds:
+
+    corpus.json:    nlp_args, base_url, and for every candidate token the ids of the documents it
+                    appears in, which gives its document frequency.
+    documents.db:   doc id => processed document, with its term counts (freq_distribution),
+                    positioning scores, n-grams, tf-idf scores and keywords.
+
+    Only added and updated documents go through the pre-processing pipeline. On refresh, the tf-idf
+    scores and keywords are recomputed for the documents whose idf values changed: every document
+    when the number of documents changed, otherwise the documents sharing a token whose document
+    frequency changed. The reports written by export go through the documents in the order of their
+    numeric ids.
+    """
+
+    def __init__(self, path, nlp_args=None, base_url=None):
+        """
+        Open the store at path, creating it when it does not exist yet. An existing store keeps the
+        nlp_args it was created with.
+        """
+        self.path = make_path(path)
+        state_file = self.path + 'corpus.json'
+        if os.path.exists(state_file):
+            with open(state_file) as state:
+                self.state = json.load(state)
+            if nlp_args is not None and nlp_args != self.state['nlp_args']:
+                raise ValueError("store at {0} was created with different nlp_args".format(path))
+            if base_url is not None:
+                self.state['base_url'] = base_url
+        else:
+            self.state = {
+                'nlp_args': nlp_args if nlp_args is not None else Distiller.default_args,
+                'base_url': base_url or '',
+                'postings': {},
+                'dirty': [],
+                'changed_tokens': [],
+                'scored_docs_number': 0
+            }
+        self.documents = shelve.open(self.path + 'documents.db')
+        self.args = dict(Distiller.default_args)
+        self.args.update(self.state['nlp_args'])
+        self.pipeline = None
+        self.positioning = Positioning()
+        self.collocations = Collocations()
+
+    def add(self, documents):
+        """
+        Process documents from json and add them to the store, replacing stored documents with the
+        same id.
+        """
+        if self.pipeline is None:
+            self.pipeline = Pipeline(black_list=self.args['black_list'],
+                                     pos_list=self.args['pos_list'],
+                                     normalize=self.args['normalize'],
+                                     stem=self.args['stem'],
+                                     lemmatize=self.args['lemmatize'],
+                                     tagger=self.args['tagger'],
+                                     tagger_model=self.args['tagger_model'])
+        dirty = set(self.state['dirty'])
+        for document in documents:
+            key = str(document['id'])
+            if key in self.documents:
+                self.remove_postings(self.documents[key])
+            doc = process_document(self.pipeline, document, self.state['base_url'])
+            doc.update(compute_document_features(doc, self.positioning, self.collocations))
+            self.add_postings(doc)
+            self.documents[key] = doc
+            dirty.add(key)
+        self.state['dirty'] = list(dirty)
+
+    def update(self, documents):
+        """
+        Replace stored documents with their new versions from json.
+        """
+        self.add(documents)
+
+    def delete(self, ids):
+        """
+        Remove the documents with the given ids from the store.
+        """
+        dirty = set(self.state['dirty'])
+        for doc_id in ids:
+            key = str(doc_id)
+            if key not in self.documents:
+                continue
+            self.remove_postings(self.documents[key])
+            del self.documents[key]
+            dirty.discard(key)
+        self.state['dirty'] = list(dirty)
+
+    def add_postings(self, doc):
+        postings = self.state['postings']
+        for token in doc['candidates']:
+            postings.setdefault(token, []).append(str(doc['id']))
+        self.state['changed_tokens'].extend(doc['candidates'])
+
+    def remove_postings(self, doc):
+        postings = self.state['postings']
+        for token in doc['candidates']:
+            postings[token].remove(str(doc['id']))
+            if not postings[token]:
+                del postings[token]
+        self.state['changed_tokens'].extend(doc['candidates'])
+
+    def refresh(self):
+        """
+        Recompute the tf-idf scores and keywords of the documents affected by the changes since the
+        last refresh.
+        """
+        postings = self.state['postings']
+        docs_number = len(self.documents)
+        if docs_number != self.state['scored_docs_number']:
+            affected = set(self.documents.keys())
+        else:
+            affected = set(self.state['dirty'])
+            for token in set(self.state['changed_tokens']):
+                affected.update(postings.get(token, []))
+
+        logging.info("rescoring {0} of {1} stored documents".format(len(affected), docs_number))
+        tfidf = TF_IDF(doc_freqs=dict((token, len(ids)) for token, ids in postings.items()),
+                       docs_number=docs_number)
+        for key in affected:
+            doc = self.documents[key]
+            doc.update(score_keywords(doc, doc['positioning'], tfidf, self.args['tfidf_cutoff'],
+                                      top=self.args['tfidf_top']))
+            self.documents[key] = doc
+
+        self.state['dirty'] = []
+        self.state['changed_tokens'] = []
+        self.state['scored_docs_number'] = docs_number
+        self.save()
+
+    def export(self, target_path):
+        """
+        Refresh the store, then write the keywords, bigrams, trigrams, keymap and docmap reports and
+        the keyword index to the target path.
+        """
+        self.refresh()
+        # Shelve keys are strings: sort them as numeric ids, so reports come out in a stable order.
+        documents = [self.documents[key] for key in sorted(self.documents.keys(), key=int)]
+        statistics = {}
+        for stat, transformer in STATISTICS:
+            statistics[stat] = compile_statistic(documents, stat, transformer, frequencies)
+        keymap, docmap = compile_collections(documents)
+        export_reports(make_path(target_path), statistics, keymap, docmap, compile_index(documents))
+
+    def save(self):
+        """
+        Write the corpus state out and flush the stored documents.
+        """
+        state_file = self.path + 'corpus.json'
+        with open(state_file + '.tmp', 'w') as state:
+            json.dump(self.state, state)
+        os.rename(state_file + '.tmp', state_file)
+        self.documents.sync()
+
+    def close(self):
+        self.save()
+        self.documents.close()
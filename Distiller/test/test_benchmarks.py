@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from Distiller.benchmarks.bench import compare, compare_taggers
+from Distiller.benchmarks.synthetic import SyntheticCorpus
+from Distiller.corpus import Corpus
+from Distiller.preprocessing.taggers import LexiconTagger
+
+
+class TestSyntheticCorpus(unittest.TestCase):
+    """
+    Checks the synthetic corpora the benchmarks run on.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_Controlled(self):
+        """
+        Corpora have the requested documents, about the requested length and vocabulary, and the
+        same arguments generate the same corpus.
+        """
+        corpus = SyntheticCorpus(documents=40, length=100, vocabulary=50, seed=3)
+        documents = list(corpus)
+        self.assertEqual([document['id'] for document in documents], range(1, 41))
+        self.assertEqual(documents, list(SyntheticCorpus(documents=40, length=100, vocabulary=50, seed=3)))
+        self.assertNotEqual(documents, list(SyntheticCorpus(documents=40, length=100, vocabulary=50, seed=4)))
+
+        words = [word.strip('.').lower() for document in documents for word in document['body'].split()]
+        self.assertTrue(60 <= len(words) / 40.0 <= 140)
+        self.assertTrue(set(corpus.words) - set(words) <= set(corpus.words[10:]))
+        self.assertTrue(len(set(words) - set(corpus.words)) <= 14)
+
+    def test_Write(self):
+        """
+        Written corpora read back in both formats.
+        """
+        corpus = SyntheticCorpus(documents=5, length=20)
+        for name in ('corpus.json', 'corpus.jsonl'):
+            written = Corpus(corpus.write(os.path.join(self.path, name)))
+            self.assertEqual(list(written), json.loads(json.dumps(list(corpus))))
+            self.assertEqual(written.metadata, {'base_url': 'http://example.com/{0}'})
+
+
+class TestCompare(unittest.TestCase):
+    """
+    Checks that results are compared with baselines stage by stage.
+    """
+
+    def test_Regressions(self):
+        """
+        Slower stages and grown peak memory are reported, noise below min_seconds is not.
+        """
+        stages = lambda tfidf, export: {'tfidf': {'seconds': tfidf}, 'export': {'seconds': export}}
+        baseline = {'runs': [{'documents': 10, 'peak_rss_kb': 1000, 'stages': stages(1.0, 0.01)}]}
+        results = {'runs': [{'documents': 10, 'peak_rss_kb': 1100, 'stages': stages(1.2, 0.03)},
+                            {'documents': 20, 'peak_rss_kb': 9000, 'stages': stages(9.0, 9.0)}]}
+        self.assertEqual(compare(results, baseline), [])
+        results['runs'][0]['stages']['tfidf']['seconds'] = 2.0
+        results['runs'][0]['peak_rss_kb'] = 2000
+        self.assertEqual(compare(results, baseline), [(10, 'tfidf', 1.0, 2.0, 2.0),
+                                                      (10, 'peak_rss_kb', 1000, 2000, 2.0)])
+
+
+class TestCompareTaggers(unittest.TestCase):
+    """
+    Checks that tagger backends are compared for speed and accuracy.
+    """
+
+    def test_Accuracy(self):
+        """
+        Taggers are scored against the gold tags, or else against the first tagger.
+        """
+        gold = [[(u'The', 'DT'), (u'parser', 'NN'), (u'crashed', 'VBD')], [(u'It', 'PRP'), (u'runs', 'VBZ')]]
+        sentences = [[word for word, tag in sentence] for sentence in gold]
+        taggers = [('trained', LexiconTagger.train(gold)), ('rules', LexiconTagger())]
+        results = compare_taggers(taggers, sentences, gold)
+        self.assertEqual([result['tagger'] for result in results], ['trained', 'rules'])
+        self.assertEqual([result['accuracy'] for result in results], [1.0, 0.4])
+        self.assertEqual(results[0]['tokens'], 5)
+        self.assertEqual([result['accuracy'] for result in compare_taggers(taggers, sentences)], [1.0, 0.4])
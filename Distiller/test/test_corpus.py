@@ -0,0 +1,80 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from Distiller.corpus import Corpus, iter_json_collection, _JSONReader
+
+data = 'data/data.json'
+
+
+def write_lines(records):
+    """
+    Write records to a temporary JSON Lines file and return its path.
+    """
+    handle, path = tempfile.mkstemp(suffix='.jsonl')
+    with io.open(handle, 'w', encoding='utf-8') as lines:
+        for record in records:
+            lines.write(unicode(json.dumps(record)) + u'\n')
+    return path
+
+
+class CountingStream(io.StringIO):
+    """
+    A text stream counting the reads made from it.
+    """
+
+    reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return io.StringIO.read(self, size)
+
+
+class TestCorpus(unittest.TestCase):
+    """
+    Checks that streamed corpora match what json.load reads.
+    """
+
+    def setUp(self):
+        with open(data) as d:
+            self.jdata = json.load(d)
+
+    def test_StreamedDocuments(self):
+        """
+        Streams the test data and checks documents and metadata match json.load.
+        """
+        corpus = Corpus(data)
+        self.assertEqual(list(corpus), self.jdata['documents'])
+        self.assertEqual(corpus.metadata, self.jdata['metadata'])
+
+    def test_SmallBuffer(self):
+        """
+        Decoding must not depend on where the read buffer splits the file.
+        """
+        for size in (1, 7, 64):
+            records = list(iter_json_collection(data, buffer_size=size))
+            self.assertEqual([value for kind, value in records if kind == 'document'],
+                             self.jdata['documents'])
+
+    def test_JsonLines(self):
+        """
+        Streams a JSON Lines copy of the test data.
+        """
+        path = write_lines([{'metadata': self.jdata['metadata']}] + self.jdata['documents'])
+        try:
+            corpus = Corpus(path)
+            self.assertEqual(corpus.metadata, self.jdata['metadata'])
+            self.assertEqual(list(corpus), self.jdata['documents'])
+        finally:
+            os.remove(path)
+
+    def test_LargeDocument(self):
+        """
+        A document far larger than the buffer is decoded whole, with the buffered part of it
+        doubling between attempts instead of growing a buffer at a time.
+        """
+        document = {'id': 1, 'body': u' '.join(u'word{0}'.format(number) for number in range(50000))}
+        stream = CountingStream(unicode(json.dumps(document)) + u' ')
+        self.assertEqual(_JSONReader(stream, 64).decode(), document)
+        self.assertTrue(stream.reads < 20)
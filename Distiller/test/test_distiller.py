@@ -1,7 +1,15 @@
 from dircache import listdir
+import json
 import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
-from Distiller.distiller import Distiller
+from Distiller.distiller import Distiller, merge_shards, run_configurations
+from Distiller.model import CorpusModel, Scorer
+from Distiller.preprocessing.pipeline import register_tagger, TAGGERS
+from Distiller.preprocessing.taggers import LexiconTagger
 
 test_data = {
         'metadata': {
@@ -61,6 +69,11 @@ nlp_args = {
     'black_list': []
 }
 
+run_args = {
+    'workers': 2,
+    'chunk_size': 1
+}
+
 def clean_folder(path):
     """
     Remove any existing files or folders at path.
@@ -99,7 +112,280 @@ class TestDistiller(unittest.TestCase):
         self.assertTrue(d.statistics['bigrams'])
         self.assertTrue(d.statistics['trigrams'])
 
+    def test_DistillerParallel(self):
+        """
+        Runs on test data with a pool of workers and checks the results match a serial run.
+        """
+        clean_folder(result)
+        serial = Distiller(data, result, nlp_args, verbosity=3)
+        clean_folder(result)
+        parallel = Distiller(data, result, nlp_args, verbosity=3, run_args=run_args)
+        self.assertEqual(serial.processed_documents, parallel.processed_documents)
+        self.assertEqual(serial.statistics, parallel.statistics)
+
+    def test_DistillerStreaming(self):
+        """
+        Runs on streamed test data and checks the results match a run on the loaded file.
+        """
+        clean_folder(result)
+        loaded = Distiller(data, result, nlp_args, verbosity=3)
+        clean_folder(result)
+        streamed = Distiller(data, result, nlp_args, verbosity=3, run_args={'streaming': True})
+        self.assertEqual(loaded.processed_documents, streamed.processed_documents)
+        self.assertEqual(loaded.statistics, streamed.statistics)
+
+
+    def test_DistillerFeatures(self):
+        """
+        Runs with a selection of features and checks only those are extracted and reported,
+        the same as in a full run.
+        """
+        clean_folder(result)
+        full = Distiller(data, result, nlp_args, verbosity=3)
+        clean_folder(result)
+        trigrams = Distiller(data, result, dict(nlp_args, features=['trigrams']), verbosity=3)
+        self.assertEqual(trigrams.extracted, set(['trigrams']))
+        self.assertEqual(trigrams.statistics.keys(), ['trigrams'])
+        self.assertEqual(trigrams.statistics['trigrams'], full.statistics['trigrams'])
+        self.assertTrue(os.path.exists(result + 'trigrams.json'))
+        self.assertFalse(os.path.exists(result + 'keywords.json'))
+        self.assertFalse(os.path.exists(result + 'keymap.json'))
+        self.assertRaises(ValueError, Distiller, data, result, dict(nlp_args, features=['quadgrams']))
+
+    def test_DistillerStaged(self):
+        """
+        Runs stage by stage and checks features are only extracted when asked for.
+        """
+        clean_folder(result)
+        full = Distiller(data, result, nlp_args, verbosity=3)
+        clean_folder(result)
+        staged = Distiller(data, result, nlp_args, verbosity=3, run=False)
+        self.assertFalse(staged.processed_documents)
+        staged.process_documents()
+        self.assertEqual(staged.extracted, set())
+        self.assertEqual(staged.feature('bigrams', 1), full.processed_documents[1].decode(
+            full.vocabulary, full.tags, ['bigrams'])['bigrams'])
+        self.assertEqual(staged.extracted, set(['bigrams']))
+        self.assertEqual(staged.statistic('keywords'), full.statistics['keywords'])
+        self.assertEqual(staged.extracted, set(['bigrams', 'keywords', 'positioning', 'tfidf']))
+        staged.export()
+        self.assertEqual(staged.statistics, full.statistics)
+        self.assertEqual(staged.processed_documents, full.processed_documents)
+        self.assertTrue(os.path.exists(result + 'docmap.json'))
+
+    def test_DistillerDocumentCache(self):
+        """
+        Runs twice over a document cache and checks the second run is served from the cache,
+        with the same results as a run without it.
+        """
+        cache = tempfile.mkdtemp()
+        try:
+            clean_folder(result)
+            uncached = Distiller(data, result, nlp_args, verbosity=3)
+            for run in range(2):
+                clean_folder(result)
+                cached = Distiller(data, result, nlp_args, verbosity=3, run_args={'document_cache': cache})
+                self.assertEqual(cached.processed_documents, uncached.processed_documents)
+                self.assertEqual(cached.statistics, uncached.statistics)
+            self.assertEqual(cached.metrics.report()['caches']['documents']['hit_rate'], 1.0)
+        finally:
+            shutil.rmtree(cache)
+
+    def test_DistillerNearDuplicates(self):
+        """
+        Runs over copies of the test data and checks the copies share the features of the
+        documents they duplicate, are marked in the docmap, and leave the reports unchanged.
+        """
+        documents = test_data['documents']
+        copies = [dict(documents[0], id=4),
+                  dict(documents[2], id=5, body=documents[2]['body'].replace('wonderful', 'great'))]
+        path = tempfile.mkdtemp()
+        try:
+            with open(path + '/data.json', 'w') as out:
+                json.dump(dict(test_data, documents=documents + copies), out)
+            clean_folder(result)
+            args = dict(nlp_args, near_duplicates=0.8)
+            grouped = Distiller(path + '/data.json', result, args, verbosity=3)
+            self.assertEqual(grouped.duplicates, [(4, '', 1), (5, '', 3)])
+            self.assertEqual(grouped.processed_documents[5]['keywords'], grouped.processed_documents[3]['keywords'])
+            with open(result + 'docmap.json') as docmap:
+                docmap = json.load(docmap)
+            self.assertEqual([docmap[doc_id].get('duplicate_of') for doc_id in '12345'], [None, None, None, 1, 3])
+
+            with open(path + '/data.json', 'w') as out:
+                json.dump(dict(test_data, documents=documents + copies[:1]), out)
+            clean_folder(result)
+            full = Distiller(path + '/data.json', result, nlp_args, verbosity=3)
+            clean_folder(result)
+            grouped = Distiller(path + '/data.json', result, args, verbosity=3)
+            self.assertEqual(grouped.statistics, full.statistics)
+            clean_folder(result)
+            grouped = Distiller(path + '/data.json', result, dict(args, group_idf=True), verbosity=3)
+            self.assertEqual(grouped.tfidf.docs_number, 3)
+        finally:
+            shutil.rmtree(path)
+
+    def test_DistillerShards(self):
+        """
+        Runs two shards of the test data as separate processes, merges them and checks the
+        results match a run over the whole file.
+        """
+        path = tempfile.mkdtemp()
+        try:
+            clean_folder(result)
+            single = Distiller(data, result, nlp_args, verbosity=3)
+            code = ("import json, sys; from Distiller.distiller import Distiller; "
+                    "Distiller(sys.argv[1], sys.argv[2], json.loads(sys.argv[3]), verbosity=0, "
+                    "run_args={'shard': [int(sys.argv[4]), 2]})")
+            shards = [os.path.join(path, str(index)) for index in range(2)]
+            processes = [subprocess.Popen([sys.executable, '-c', code, data, shard, json.dumps(nlp_args), str(index)])
+                         for index, shard in enumerate(shards)]
+            self.assertEqual([process.wait() for process in processes], [0, 0])
+            self.assertTrue(os.path.exists(os.path.join(shards[0], 'shard.json')))
+            clean_folder(result)
+            merged = merge_shards(shards, result, verbosity=3)
+            self.assertEqual(merged.statistics, single.statistics)
+            self.assertEqual(merged.processed_documents, single.processed_documents)
+            self.assertEqual(merged.keymap, single.keymap)
+        finally:
+            shutil.rmtree(path)
+
+    def test_DistillerApproximate(self):
+        """
+        Runs with top tf-idf scores and approximate statistics, and checks they are the head of
+        the exact scores and bounded by the exact counts.
+        """
+        clean_folder(result)
+        exact = Distiller(data, result, nlp_args, verbosity=3)
+        clean_folder(result)
+        top = Distiller(data, result, dict(nlp_args, tfidf_top=3), verbosity=3)
+        for doc_id, document in exact.processed_documents.items():
+            self.assertEqual(top.processed_documents[doc_id].tfidf, document.tfidf[:3])
+        clean_folder(result)
+        approximate = Distiller(data, result, dict(nlp_args, statistics_top=5), verbosity=3)
+        for stat in ('keywords', 'bigrams', 'trigrams'):
+            counts = approximate.statistics[stat]
+            self.assertEqual(len(counts), min(5, len(exact.statistics[stat])))
+            for item, count in counts.items():
+                self.assertTrue(count >= exact.statistics[stat][item])
+
+    def test_DistillerModel(self):
+        """
+        Runs with a corpus model, and checks the documents of the corpus score the same against
+        it as in the run, with the corpus counts of their n-grams.
+        """
+        clean_folder(result)
+        distiller = Distiller(data, result, nlp_args, verbosity=3, run_args={'model': 'ngrams'})
+        self.assertTrue(os.path.exists(result + 'model.json'))
+        with open(data) as documents:
+            documents = json.load(documents)['documents']
+        scorer = Scorer(CorpusModel.load(result))
+        fields = ['positioning', 'tfidf', 'keywords', 'bigrams', 'trigrams']
+        for scored in scorer.score_batch(documents):
+            document = distiller.processed_documents[scored['id']].decode(distiller.vocabulary, distiller.tags,
+                                                                          fields)
+            for field in fields:
+                self.assertEqual(scored[field], document[field])
+            for key, count in scored['corpus_counts']['bigrams'].items():
+                self.assertEqual(count, distiller.statistics['bigrams'][key])
+        self.assertEqual(scorer.score(documents[0]['body'])['keywords'], scorer.score(documents[0])['keywords'])
+        self.assertRaises(ValueError, Distiller, data, result, nlp_args, run_args={'model': 'all'}, run=False)
+
+    def test_DistillerConfigurations(self):
+        """
+        Runs several configurations sharing their tagging, and checks each matches a run of its own.
+        """
+        path = tempfile.mkdtemp()
+        try:
+            configurations = {'stemmed': dict(nlp_args, stem=True),
+                              'nouns': dict(nlp_args, pos_list=['NN'], features=['keywords', 'bigrams'])}
+            distillers = run_configurations(data, path, configurations, verbosity=3, run_args=run_args)
+            for distiller, name in zip(distillers, sorted(configurations)):
+                self.assertTrue(os.path.exists(os.path.join(path, name, 'keymap.json')))
+                clean_folder(result)
+                single = Distiller(data, result, configurations[name], verbosity=3)
+                self.assertEqual(distiller.processed_documents, single.processed_documents)
+                self.assertEqual(distiller.statistics, single.statistics)
+            self.assertFalse(os.path.exists(os.path.join(path, 'nouns', 'trigrams.json')))
+        finally:
+            shutil.rmtree(path)
 
+    def test_DistillerSplit(self):
+        """
+        Runs with long bodies split into parts, and checks the tokens, counts and positions match
+        those of the whole documents, and with sentence tagging, every feature does.
+        """
+        clean_folder(result)
+        whole = Distiller(data, result, nlp_args, verbosity=3)
+        clean_folder(result)
+        split = Distiller(data, result, nlp_args, verbosity=3, run_args=dict(run_args, split_size=200))
+        fields = ['tokenized_body', 'freq_distribution']
+        for doc_id, document in whole.processed_documents.items():
+            self.assertEqual(split.processed_documents[doc_id].decode(split.vocabulary, split.tags, fields),
+                             document.decode(whole.vocabulary, whole.tags, fields))
+        clean_folder(result)
+        whole = Distiller(data, result, nlp_args, verbosity=3, run_args={'tag_cache_size': 64})
+        clean_folder(result)
+        split = Distiller(data, result, nlp_args, verbosity=3, run_args={'tag_cache_size': 64, 'split_size': 200})
+        self.assertEqual(split.processed_documents, whole.processed_documents)
+        self.assertEqual(split.statistics, whole.statistics)
 
+    def test_DistillerTaggers(self):
+        """
+        Runs configurations with different taggers, each tagging the documents with its own, and
+        checks each matches a run of its own.
+        """
+        path = tempfile.mkdtemp()
+        try:
+            model = os.path.join(path, 'lexicon.json')
+            LexiconTagger({u'samsa': 'NNP', u'gregor': 'NNP'}).save(model)
+            configurations = [nlp_args, dict(nlp_args, tagger='lexicon', tagger_model=model)]
+            distillers = run_configurations(data, path, configurations, verbosity=3)
+            for distiller, configuration in zip(distillers, configurations):
+                clean_folder(result)
+                single = Distiller(data, result, configuration, verbosity=3)
+                self.assertEqual(distiller.processed_documents, single.processed_documents)
+            self.assertNotEqual(distillers[0].statistics, distillers[1].statistics)
+            self.assertRaises(ValueError, Distiller, data, result, dict(nlp_args, tagger='missing'), run=False)
+        finally:
+            shutil.rmtree(path)
 
+    def test_DistillerWorkerErrors(self):
+        """
+        Runs with workers that fail to load their tagger, and checks the error reaches the caller,
+        both pre-processing and tagging for several configurations.
+        """
+        def broken(model):
+            raise LookupError("missing tagger model")
+        register_tagger('broken', broken)
+        try:
+            clean_folder(result)
+            args = dict(nlp_args, tagger='broken')
+            self.assertRaises(LookupError, Distiller, data, result, args, verbosity=3, run_args=run_args)
+            path = tempfile.mkdtemp()
+            try:
+                self.assertRaises(LookupError, run_configurations, data, path, [args], verbosity=3, run_args=run_args)
+            finally:
+                shutil.rmtree(path)
+        finally:
+            del TAGGERS['broken']
 
+    def test_DistillerMemoryBudget(self):
+        """
+        Runs with a memory budget too small for any document, serially and with workers, and
+        checks every document is spilled, the reports match those of a run in memory, and the
+        spill is closed once the run ends.
+        """
+        clean_folder(result)
+        loaded = Distiller(data, result, nlp_args, verbosity=3)
+        with open(result + 'docmap.json') as docmap:
+            docmap = json.load(docmap)
+        for args in ({'memory_budget': 1}, dict(run_args, memory_budget=1)):
+            clean_folder(result)
+            spilled = Distiller(data, result, nlp_args, verbosity=3, run_args=args)
+            self.assertEqual(len(spilled.spill), len(loaded.processed_documents))
+            self.assertEqual(spilled.processed_documents[1].body, None)
+            self.assertTrue(spilled.spill.file.closed)
+            self.assertEqual(spilled.statistics, loaded.statistics)
+            with open(result + 'docmap.json') as spilled_docmap:
+                self.assertEqual(json.load(spilled_docmap), docmap)
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from Distiller.doccache import DocumentCache, encode_entry, decode_entry
+
+body = [u'the', u'caf\xe9', u'opened', u'.', u'the', u'caf\xe9', u'closed']
+processed = [(u'caf\xe9', 'NN'), (u'open', 'VBD'), (u'caf\xe9', 'NN')]
+arguments = {'stem': True, 'pos_list': ['NN']}
+
+
+class TestDocumentCache(unittest.TestCase):
+    """
+    Checks the on-disk cache of pre-processed documents.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_Entry(self):
+        """
+        Entries decode to the tokens they were encoded from.
+        """
+        self.assertEqual(decode_entry(encode_entry(body, processed)), (body, processed))
+        self.assertEqual(decode_entry(encode_entry([], [])), ([], []))
+        nul_body = [u'crash', u'in', u'module\x00\x00', u'foo', u'bar', u'\x00']
+        self.assertEqual(decode_entry(encode_entry(nul_body, [(u'module\x00\x00', 'NN')])),
+                         (nul_body, [(u'module\x00\x00', 'NN')]))
+        self.assertRaises(ValueError, decode_entry, 'not an entry')
+
+    def test_Keys(self):
+        """
+        Keys change with the body and with the arguments, not with the order of the arguments.
+        """
+        cache = DocumentCache(self.path, arguments)
+        self.assertEqual(cache.key(u'Some text'), cache.key('Some text'))
+        self.assertNotEqual(cache.key(u'Some text'), cache.key(u'Some other text'))
+        self.assertEqual(cache.key(u'Some text'),
+                         DocumentCache(self.path, {'pos_list': ['NN'], 'stem': True}).key(u'Some text'))
+        self.assertNotEqual(cache.key(u'Some text'),
+                            DocumentCache(self.path, dict(arguments, stem=False)).key(u'Some text'))
+
+    def test_Persistent(self):
+        """
+        Entries are found again by a later cache over the same path.
+        """
+        cache = DocumentCache(self.path, arguments)
+        key = cache.key(u'The caf\xe9 opened. The caf\xe9 closed')
+        self.assertEqual(cache.get(key), None)
+        cache.put(key, body, processed)
+        self.assertEqual(cache.get(key), (body, processed))
+
+        cache = DocumentCache(self.path, arguments)
+        self.assertTrue(key in cache)
+        self.assertEqual(cache.get(key), (body, processed))
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_Eviction(self):
+        """
+        Past max_bytes, the least recently used entries are removed, from memory and from disk.
+        """
+        cache = DocumentCache(self.path, arguments)
+        keys = [cache.key(str(number)) for number in range(4)]
+        for number, key in enumerate(keys):
+            cache.put(key, body, processed)
+            os.utime(cache.file_name(key), (time.time() - 100 + number, time.time() - 100 + number))
+        size = cache.bytes / 4
+
+        cache = DocumentCache(self.path, arguments, max_bytes=size * 3)
+        self.assertEqual(len(cache), 3)
+        self.assertFalse(keys[0] in cache)
+        self.assertFalse(os.path.exists(cache.file_name(keys[0])))
+
+        cache.get(keys[1])
+        cache.put(keys[0], body, processed)
+        self.assertEqual(set(cache.entries), set([keys[0], keys[1], keys[3]]))
+        self.assertTrue(cache.bytes <= size * 3)
+
+    def test_Unreadable(self):
+        """
+        Unreadable entries are dropped and count as misses.
+        """
+        cache = DocumentCache(self.path, arguments)
+        key = cache.key(u'text')
+        cache.put(key, body, processed)
+        with open(cache.file_name(key), 'wb') as entry:
+            entry.write('garbage')
+        self.assertEqual(cache.get(key), None)
+        self.assertFalse(key in cache)
+        self.assertEqual(cache.misses, 1)
@@ -0,0 +1,120 @@
+import pickle
+import unittest
+from Distiller.document import Document
+from Distiller.preprocessing.vocabulary import Vocabulary, TAGS
+
+doc = {
+    'id': 7,
+    'url': 'http://github.com/franciscocanas/Distiller/7',
+    'description': u'',
+    'tokenized_body': u'the blind text far far away , from the blind world'.split(),
+    'processed_tokens': [(u'blind', 'JJ'), (u'text', 'NN'), (u'World', 'NNP'), (u'blind', 'JJ'), (u'xyz', 'XYZ')]
+}
+
+
+class TestVocabulary(unittest.TestCase):
+    """
+    Checks interning, renumbering and lowercase ids.
+    """
+
+    def test_Sort(self):
+        """
+        After sort, ids are in token order and the remapping keeps every token.
+        """
+        vocabulary = Vocabulary([u'text', u'World', u'blind', u'world', u'Away'])
+        before = vocabulary.encode([u'blind', u'world', u'text'])
+        token_ids = vocabulary.sort()
+        self.assertEqual(vocabulary.tokens, [u'Away', u'World', u'blind', u'text', u'world'])
+        self.assertEqual(vocabulary.decode([token_ids[token] for token in before]), [u'blind', u'world', u'text'])
+        lowered = vocabulary.lowered()
+        self.assertEqual(lowered[0], len(vocabulary))
+        self.assertEqual(vocabulary.decode(lowered[1:]), [u'world', u'blind', u'text', u'world'])
+
+    def test_Tags(self):
+        """
+        The tag enum is sorted, so tag ids sort like tags.
+        """
+        self.assertEqual(list(TAGS), sorted(TAGS))
+        self.assertEqual(len(set(TAGS)), len(TAGS))
+
+
+class TestDocument(unittest.TestCase):
+    """
+    Checks the compact document form against the processed document dict.
+    """
+
+    def setUp(self):
+        self.vocabulary = Vocabulary()
+        self.tags = Vocabulary(TAGS)
+        self.document = Document.encode(doc, self.vocabulary, self.tags)
+
+    def test_Decode(self):
+        """
+        A Document decodes to the dict it was encoded from. Candidates are in token order once
+        the ids are renumbered.
+        """
+        expected = dict(doc)
+        expected['candidates'] = sorted(set(token for token, tag in doc['processed_tokens']))
+        expected['freq_distribution'] = {u'the': 2, u'blind': 2, u'text': 1, u'far': 2, u'away': 1, u',': 1,
+                                         u'from': 1, u'world': 1}
+        decoded = self.document.decode(self.vocabulary, self.tags)
+        self.assertEqual(sorted(decoded.pop('candidates')), expected.pop('candidates'))
+        self.assertEqual(decoded, expected)
+
+        expected['candidates'] = sorted(set(token for token, tag in doc['processed_tokens']))
+        self.document.remap(self.vocabulary.sort(), self.tags.sort())
+        self.assertEqual(self.document.decode(self.vocabulary, self.tags), expected)
+        self.assertEqual(list(self.document['candidates']), sorted(self.document['candidates']))
+
+    def test_Features(self):
+        """
+        Features set over ids decode to features over tokens.
+        """
+        blind = self.vocabulary.get(u'blind')
+        text = self.vocabulary.get(u'text')
+        jj = self.tags.get('JJ')
+        nn = self.tags.get('NN')
+        self.document.update({'keywords': [(blind, 0.5)], 'bigrams': [((blind, jj), (text, nn))]})
+        decoded = self.document.decode(self.vocabulary, self.tags)
+        self.assertEqual(decoded['keywords'], [(u'blind', 0.5)])
+        self.assertEqual(decoded['bigrams'], [((u'blind', 'JJ'), (u'text', 'NN'))])
+        self.assertFalse('tfidf' in decoded)
+        self.assertEqual(self.document.decode(self.vocabulary, self.tags, ['id', 'keywords']),
+                         {'id': 7, 'keywords': [(u'blind', 0.5)]})
+
+    def test_Pickle(self):
+        """
+        Documents survive pickling, as when sent to worker processes.
+        """
+        self.document.update({'positioning': {0: 1.5}})
+        self.assertEqual(pickle.loads(pickle.dumps(self.document, 2)), self.document)
+        self.assertEqual(pickle.loads(pickle.dumps(self.document)), self.document)
+
+    def test_Duplicate(self):
+        """
+        A near-duplicate shares the tokens of its document, and decodes with its own id and the
+        document it duplicates.
+        """
+        duplicate = self.document.duplicate(8, 'http://github.com/franciscocanas/Distiller/8', u'copy')
+        self.assertTrue(duplicate.body is self.document.body)
+        decoded = duplicate.decode(self.vocabulary, self.tags)
+        self.assertEqual((decoded['id'], decoded['description'], decoded['duplicate_of']), (8, u'copy', 7))
+        self.assertEqual(decoded['processed_tokens'], self.document.decode(self.vocabulary, self.tags)['processed_tokens'])
+        self.assertFalse('duplicate_of' in self.document.decode(self.vocabulary, self.tags))
+        self.assertEqual(pickle.loads(pickle.dumps(duplicate, 2)), duplicate)
+
+    def test_EncodeFeatures(self):
+        """
+        Features decoded to tokens encode back to the features over ids.
+        """
+        blind = self.vocabulary.get(u'blind')
+        text = self.vocabulary.get(u'text')
+        jj = self.tags.get('JJ')
+        nn = self.tags.get('NN')
+        features = {'positioning': {blind: 1.5, text: 1.25}, 'keywords': [(blind, 0.5)],
+                    'bigrams': [((blind, jj), (text, nn))]}
+        self.document.update(features)
+        decoded = self.document.decode(self.vocabulary, self.tags, ['positioning', 'keywords', 'bigrams'])
+        document = Document.encode(doc, self.vocabulary, self.tags)
+        document.encode_features(decoded, self.vocabulary, self.tags)
+        self.assertEqual(document, self.document)
@@ -0,0 +1,80 @@
+import random
+import unittest
+from Distiller.duplicates import DuplicateDetector, MinHash, choose_bands, shingles, similarity
+
+generator = random.Random(7)
+words = [u'word{0}'.format(number) for number in range(1000)]
+texts = [u' '.join(generator.choice(words) for word in range(150)) for text in range(50)]
+
+
+def edit(text, edits):
+    """
+    Output: text with its words at edits positions replaced.
+    """
+    replaced = text.split()
+    for position in edits:
+        replaced[position] = u'edited'
+    return u' '.join(replaced)
+
+
+class TestMinHash(unittest.TestCase):
+    """
+    Checks the signatures estimate the Jaccard similarity of sets.
+    """
+
+    def test_Shingles(self):
+        """
+        Shingles are runs of lowercase words, and short texts are a single shingle.
+        """
+        self.assertEqual(shingles(u'The blind text, far away.'), shingles(u'the BLIND text far away'))
+        self.assertEqual(len(shingles(u'the blind text far away')), 3)
+        self.assertEqual(len(shingles(u'blind text')), 1)
+        self.assertEqual(shingles(u' , . '), set())
+
+    def test_Similarity(self):
+        """
+        Estimates are within a few standard errors of the Jaccard similarity, and identical or
+        disjoint sets are estimated exactly.
+        """
+        minhash = MinHash()
+        for number in range(50):
+            first = set(generator.sample(xrange(100000), 200))
+            second = set(generator.sample(first, generator.randint(0, 200))) | \
+                set(generator.sample(xrange(100000, 200000), generator.randint(0, 200)))
+            jaccard = len(first & second) / float(len(first | second))
+            self.assertAlmostEqual(similarity(minhash.signature(first), minhash.signature(second)), jaccard,
+                                   delta=0.2)
+        self.assertEqual(similarity(minhash.signature(first), minhash.signature(set(first))), 1.0)
+        self.assertEqual(similarity(minhash.signature(set([1])), minhash.signature(set([2]))), 0.0)
+        self.assertEqual(minhash.signature(set()), None)
+
+    def test_Bands(self):
+        """
+        Bands split the signature, with their threshold at most the similarity asked for.
+        """
+        for threshold in (0.3, 0.5, 0.8, 0.9):
+            bands, rows = choose_bands(128, threshold)
+            self.assertEqual(bands * rows, 128)
+            self.assertTrue((1.0 / bands) ** (1.0 / rows) <= threshold)
+
+
+class TestDuplicateDetector(unittest.TestCase):
+    """
+    Checks near-duplicates are grouped with the first document like them.
+    """
+
+    def test_Groups(self):
+        """
+        Copies and lightly edited copies join the group of their original, and distinct texts
+        and heavily edited copies do not.
+        """
+        detector = DuplicateDetector(0.8)
+        for number, text in enumerate(texts):
+            self.assertEqual(detector.add(number, text), None)
+        self.assertEqual(detector.add(100, texts[3]), 3)
+        self.assertEqual(detector.add(101, edit(texts[4], [75])), 4)
+        self.assertEqual(detector.add(102, edit(texts[5], range(0, 150, 5))), None)
+        self.assertEqual(detector.add(103, edit(texts[5], [75])), 5)
+        self.assertEqual(detector.add(104, u''), None)
+        self.assertEqual(detector.groups(), {3: [100], 4: [101], 5: [103]})
+        self.assertRaises(ValueError, DuplicateDetector, 0)
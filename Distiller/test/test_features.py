@@ -0,0 +1,69 @@
+import unittest
+from nltk.collocations import BigramCollocationFinder, TrigramCollocationFinder
+from nltk.metrics import BigramAssocMeasures, TrigramAssocMeasures
+from Distiller.features.Collocations import Collocations
+from Distiller.features.ngrams import NgramCounter
+from Distiller.features.Positioning import Positioning
+
+body = u'the blind text far far away from the blind world of grammar . the text'.split()
+
+
+class TestPositioning(unittest.TestCase):
+    """
+    Checks positioning scores from the first-occurrence index.
+    """
+
+    def test_FirstOccurrences(self):
+        """
+        Batched scores from the one-pass index match scanning the body for each token.
+        """
+        positioning = Positioning(keep_positions=True)
+        tokens = [u'blind', u'text', u'grammar', u'missing', u'text']
+        scores = positioning.compute_all([tokens, []], [body, []], keys=[1, 2])
+        self.assertEqual(scores[0], dict((token, positioning.positioning_score(token, body)) for token in tokens))
+        self.assertEqual(scores[1], {})
+        self.assertEqual(positioning.positions[1], {u'blind': 1, u'text': 2, u'grammar': 11, u'missing': len(body)})
+
+
+class TestNgrams(unittest.TestCase):
+    """
+    Checks the n-gram engine against nltk's collocation finders.
+    """
+
+    def setUp(self):
+        self.words = [(word, 'NN') for word in body * 3 + [u'blind', u'world', u'text']]
+
+    def test_FinderParity(self):
+        """
+        Top bigrams and trigrams match nltk's finders, ties included.
+        """
+        bigrams = BigramCollocationFinder.from_words(self.words).nbest(BigramAssocMeasures.pmi, 10)
+        trigrams = TrigramCollocationFinder.from_words(self.words).nbest(TrigramAssocMeasures.pmi, 10)
+        collocations = Collocations()
+        self.assertEqual(collocations.find_ngrams(2, self.words), bigrams)
+        self.assertEqual(collocations.find_ngrams(3, self.words), trigrams)
+        self.assertEqual(collocations.find_ngrams(3, []), [])
+
+    def test_Merge(self):
+        """
+        Counts merged across counters and vocabularies equal counting everything at once.
+        """
+        whole = NgramCounter(3)
+        halves = NgramCounter(3)
+        for part in (self.words[:20], self.words[20:], self.words[18:22]):
+            whole.count(part)
+            halves.merge(NgramCounter.from_words(3, part))
+        self.assertEqual(halves.score_ngrams(), whole.score_ngrams())
+        self.assertEqual(halves.nbest(5), whole.nbest(5))
+
+    def test_CorpusCounts(self):
+        """
+        Corpus-wide counts gather every document, and merge across Collocations.
+        """
+        first, second = Collocations(corpus_counts=True), Collocations(corpus_counts=True)
+        first.find_ngrams(2, self.words[:20])
+        second.find_ngrams(2, self.words[20:])
+        first.merge(second)
+        counter = first.counter(2)
+        self.assertEqual(counter.total, len(self.words))
+        self.assertEqual(sum(counter.ngrams.values()), len(self.words) - 2)
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+from Distiller.index import KeywordIndex, compile_index, write_index
+
+documents = [{'id': doc_id, 'keywords': [(u'common', doc_id / 1000.0)]} for doc_id in range(1, 301)]
+documents[0]['keywords'].extend([(u'rare', 0.75), (u'caf\xe9', 0.25)])
+documents[1]['keywords'].append((u'rare', 0.5))
+documents[299]['keywords'].append((u'rare', 0.125))
+
+
+class TestKeywordIndex(unittest.TestCase):
+    """
+    Checks queries on the binary keyword index against the documents it was written from.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        write_index(os.path.join(self.path, 'keymap.idx'), compile_index(documents))
+        self.index = KeywordIndex(os.path.join(self.path, 'keymap.idx'))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.path)
+
+    def test_Lookup(self):
+        """
+        Posting lists hold every document of a keyword, with its score.
+        """
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(sorted(self.index.documents(u'common'), key=int), [unicode(i) for i in range(1, 301)])
+        self.assertEqual(sorted(self.index.lookup(u'rare')), [(u'1', 0.75), (u'2', 0.5), (u'300', 0.125)])
+        self.assertEqual(self.index.lookup(u'caf\xe9'), [(u'1', 0.25)])
+        self.assertEqual(self.index.lookup(u'missing'), [])
+        self.assertFalse(u'missing' in self.index)
+
+    def test_Top(self):
+        """
+        Top documents of a keyword and top keywords of a document come best first.
+        """
+        self.assertEqual([doc_id for doc_id, score in self.index.top_documents(u'common', 3)], [u'300', u'299', u'298'])
+        self.assertEqual(self.index.top_documents(u'rare', 1), [(u'1', 0.75)])
+        self.assertEqual([keyword for keyword, score in self.index.top_keywords(1)], [u'rare', u'caf\xe9', u'common'])
+        self.assertEqual(len(self.index.top_keywords(u'1', 2)), 2)
+        self.assertEqual(self.index.top_keywords(u'1000'), [])
+
+    def test_Search(self):
+        """
+        Searches return the documents having every keyword, by total score.
+        """
+        results = self.index.search([u'common', u'rare'])
+        self.assertEqual([doc_id for doc_id, score in results], [u'1', u'2', u'300'])
+        self.assertAlmostEqual(results[2][1], 0.425, places=6)
+        results = self.index.search([u'rare', u'caf\xe9', u'common'])
+        self.assertEqual([doc_id for doc_id, score in results], [u'1'])
+        self.assertAlmostEqual(results[0][1], 1.001, places=6)
+        self.assertEqual(self.index.search([u'rare', u'missing']), [])
+        self.assertEqual(self.index.search([]), [])
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from Distiller.metrics import Metrics, Profiler, timed
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Checks the measurements collected over a run.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + '/'
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_Stages(self):
+        """
+        Stages add up their calls, in the order they first ran, and are rated in tokens per second,
+        and the summary ends with the peak memory.
+        """
+        metrics = Metrics()
+        with metrics.stage('pre_process', tokens=100):
+            pass
+        metrics.add('tagging', 2.0)
+        metrics.add('tagging', 3.0)
+        metrics.add('compile', 0.5, 0.25)
+        metrics.info['tokens'] = 1000
+
+        stages = metrics.report()['stages']
+        self.assertEqual(stages.keys(), ['pre_process', 'tagging', 'compile'])
+        self.assertEqual(stages['tagging']['calls'], 2)
+        self.assertEqual(stages['tagging']['seconds'], 5.0)
+        self.assertEqual(stages['tagging']['cpu_seconds'], None)
+        self.assertEqual(stages['tagging']['tokens_per_second'], 200.0)
+        self.assertEqual(stages['compile']['cpu_seconds'], 0.25)
+        self.assertEqual(stages['pre_process']['tokens'], 100)
+        self.assertTrue(stages['pre_process']['peak_rss_kb'] > 0)
+        self.assertEqual(metrics.summary()[1], 'tagging: 5.000s, 200 tokens/s')
+        self.assertTrue(metrics.summary()[-1].startswith('peak memory: '))
+
+    def test_Outliers(self):
+        """
+        Documents are summarized, and only the slowest are kept, slowest first, the earliest of equals.
+        """
+        metrics = Metrics(outliers=2)
+        for doc_id, seconds in enumerate([1.0, 3.0, 2.0, 2.0]):
+            metrics.document('features', doc_id, seconds, tokens=doc_id * 10)
+
+        features = metrics.report()['per_document']['features']
+        self.assertEqual(features['count'], 4)
+        self.assertEqual(features['mean_seconds'], 2.0)
+        self.assertAlmostEqual(features['stdev_seconds'], 0.5 ** 0.5)
+        self.assertEqual(features['max_seconds'], 3.0)
+        self.assertEqual(features['outliers'], [{'id': 1, 'seconds': 3.0, 'tokens': 10},
+                                                {'id': 2, 'seconds': 2.0, 'tokens': 20}])
+
+    def test_Caches(self):
+        """
+        Caches keep the latest state seen in each process, summed over the processes.
+        """
+        metrics = Metrics()
+        metrics.cache('pipeline', {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 10}, 1)
+        metrics.cache('pipeline', {'hits': 6, 'misses': 2, 'size': 2, 'maxsize': 10}, 1)
+        metrics.cache('pipeline', {'hits': 0, 'misses': 2, 'size': 2, 'maxsize': 10}, 2)
+        metrics.cache('tags', None)
+
+        caches = metrics.report()['caches']
+        self.assertEqual(caches.keys(), ['pipeline'])
+        self.assertEqual(caches['pipeline'], {'hits': 6, 'misses': 4, 'hit_rate': 0.6, 'size': 4,
+                                              'maxsize': 20, 'processes': 2})
+
+    def test_Write(self):
+        """
+        The report is written to metrics.json, and timings add up.
+        """
+        timings = {}
+        with timed(timings, 'tagging'):
+            time.sleep(0.01)
+        with timed(timings, 'tagging'):
+            pass
+        self.assertTrue(timings['tagging'] >= 0.01)
+
+        metrics = Metrics()
+        metrics.info['documents'] = 3
+        metrics.add('tagging', timings['tagging'])
+        report = json.load(open(metrics.write(self.path)))
+        self.assertEqual(report['documents'], 3)
+        self.assertEqual(report['stages']['tagging']['seconds'], timings['tagging'])
+        self.assertTrue(os.path.exists(self.path + 'metrics.json'))
+
+    def test_Profiler(self):
+        """
+        Both kinds of profile are written to the target path.
+        """
+        profiler = Profiler('cprofile', self.path)
+        profiler.start()
+        sum(x * x for x in range(10000))
+        info = profiler.stop()
+        self.assertEqual(info['file'], self.path + 'profile.pstats')
+        self.assertTrue(os.path.exists(info['file']))
+        self.assertTrue(info['top'])
+
+        profiler = Profiler('sample', self.path, interval=0.001)
+        profiler.start()
+        start = time.time()
+        while time.time() - start < 0.2:
+            sum(x * x for x in range(1000))
+        info = profiler.stop()
+        self.assertTrue(info['samples'] > 0)
+        lines = open(info['file']).read().splitlines()
+        self.assertEqual(sum(int(line.rsplit(' ', 1)[1]) for line in lines), info['samples'])
+
+        self.assertRaises(ValueError, Profiler, 'trace', self.path)
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+from Distiller.features.tf_idf import TF_IDF
+from Distiller.model import CorpusModel
+
+candidates = [
+    [u'blind', u'text', u'world', u'grammar'],
+    [u'gregor', u'samsa', u'bed', u'dreams', u'world'],
+    [u'serenity', u'soul', u'spring'],
+    []
+]
+
+doc_freqs = {u'blind': 1, u'text': 1, u'world': 2, u'grammar': 1, u'gregor': 1, u'samsa': 1, u'bed': 1,
+             u'dreams': 1, u'serenity': 1, u'soul': 1, u'spring': 1}
+
+
+def corpus_model():
+    return CorpusModel({'features': ['keywords'], 'tfidf_cutoff': 0.001}, {'stem': False}, 'http://bug/{0}', 4,
+                       doc_freqs, {'bigrams': {u'blind text': 2}})
+
+
+class TestCorpusModel(unittest.TestCase):
+    """
+    Checks corpus models are written and read back whole, and score as the corpus does.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_Roundtrip(self):
+        """
+        A model reads back the same from model.json and from model.json.gz.
+        """
+        model = corpus_model()
+        for compress, name in ((False, 'model.json'), (True, 'model.json.gz')):
+            path = os.path.join(self.path, name[-2:])
+            os.mkdir(path)
+            self.assertEqual(model.write(path, compress), os.path.join(path, name))
+            for loaded in (CorpusModel.load(path), CorpusModel.load(os.path.join(path, name))):
+                self.assertEqual(loaded.to_json(), model.to_json())
+
+    def test_Version(self):
+        """
+        Models of another version are refused.
+        """
+        model = corpus_model()
+        model.write(self.path)
+        with open(os.path.join(self.path, 'model.json')) as written:
+            state = written.read()
+        with open(os.path.join(self.path, 'model.json'), 'w') as written:
+            written.write(state.replace('"version": 1', '"version": 0'))
+        self.assertRaises(ValueError, CorpusModel.load, self.path)
+
+    def test_Scores(self):
+        """
+        Idf from the model matches idf over the documents it was built from.
+        """
+        words = [u'world', u'blind', u'missing', u'World']
+        self.assertEqual(corpus_model().tfidf().compute_idf(words), TF_IDF(candidates).compute_idf(words))
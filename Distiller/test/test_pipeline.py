@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import unittest
+from nltk import RegexpTokenizer
+from nltk.tag import DefaultTagger
+from Distiller.preprocessing.cache import LRUCache
+from Distiller.preprocessing.pipeline import Pipeline
+from Distiller.preprocessing.tokens import TokenStream, split_text
+
+text = u"One morning, when Gregor Samsa woke from troubled dreams, he found himself transformed " \
+       u"in his bed into a horrible vermin. He lay on his armour-like back... \"What's happened to me?\" " \
+       u"Café 1912 naïve_token"
+
+
+class TestTokenStream(unittest.TestCase):
+    """
+    Checks the single tokenization pass shared by the pipeline and the features.
+    """
+
+    def test_Words(self):
+        """
+        The word tokens are the tokens the pipeline used to get from RegexpTokenizer.
+        """
+        self.assertEqual(TokenStream(text).words, RegexpTokenizer(r'\w+').tokenize(text))
+
+    def test_Offsets(self):
+        """
+        Offsets point back at each token, and word_index at each word, in the body.
+        """
+        stream = TokenStream(text)
+        for token, lowered, (start, end) in zip(stream.tokens, stream.lowered, stream.offsets):
+            self.assertEqual(text[start:end], token)
+            self.assertEqual(lowered, token.lower())
+        self.assertEqual([stream.tokens[i] for i in stream.word_index], stream.words)
+        self.assertEqual(u''.join(text.split()), u''.join(stream.tokens))
+
+    def test_Sentences(self):
+        """
+        Sentences split after '.', '!' or '?' and hold every word once, in order.
+        """
+        sentences = TokenStream(text).sentences()
+        self.assertEqual(sentences[1][:3], [u'He', u'lay', u'on'])
+        self.assertEqual(sentences[2], [u'What', u's', u'happened', u'to', u'me'])
+        self.assertEqual(sum(sentences, []), TokenStream(text).words)
+
+    def test_Split(self):
+        """
+        Parts are cut at sentence boundaries, and tokenizing them at their offsets gives the tokens,
+        offsets and sentences of the whole text.
+        """
+        stream = TokenStream(text)
+        parts = split_text(text, 10)
+        self.assertEqual(len(parts), len(stream.sentences()))
+        self.assertEqual(u''.join(part for offset, part in parts), text)
+        streams = [TokenStream(part, offset) for offset, part in parts]
+        self.assertEqual(sum([part.tokens for part in streams], []), stream.tokens)
+        self.assertEqual(sum([part.offsets for part in streams], []), stream.offsets)
+        self.assertEqual(sum([part.sentences() for part in streams], []), stream.sentences())
+        self.assertEqual(split_text(text, len(text)), [(0, text)])
+        self.assertEqual(split_text(u'no sentence ends here', 5), [(0, u'no sentence ends here')])
+
+
+class TestTagging(unittest.TestCase):
+    """
+    Checks batched tagging and the sentence tag cache.
+    """
+
+    def test_TagCache(self):
+        """
+        Repeated sentences are tagged once, and documents get the same tags as tagging them whole.
+        """
+        pipeline = Pipeline(tag_cache_size=16)
+        pipeline.tagger = DefaultTagger('NN')
+        streams = [TokenStream(u'Stack trace follows. ' + text), TokenStream(u'Stack trace follows. Done.')]
+        tagged = pipeline.pos_tag_sentences([stream.sentences() for stream in streams])
+        self.assertEqual(tagged, pipeline.pos_tag_batch([stream.words for stream in streams]))
+        pipeline.pos_tag_sentences([streams[1].sentences()])
+        info = pipeline.tag_cache_info()
+        self.assertEqual((info['hits'], info['misses']), (2, 6))
+
+
+class TestLRUCache(unittest.TestCase):
+    """
+    Checks the bounded memo used by the pipeline.
+    """
+
+    def test_Eviction(self):
+        """
+        The least recently used entry is evicted first, and hits and misses are counted.
+        """
+        cache = LRUCache(2)
+        cache.put(('far', 'RB'), None)
+        cache.put(('text', 'NN'), ('text', 'NN'))
+        self.assertEqual(cache.get(('far', 'RB'), 'missing'), None)
+        cache.put(('world', 'NN'), ('world', 'NN'))
+        self.assertEqual(cache.get(('text', 'NN'), 'missing'), 'missing')
+        self.assertEqual(cache.get(('world', 'NN')), ('world', 'NN'))
+        self.assertEqual(len(cache), 2)
+        info = cache.info()
+        self.assertEqual((info['hits'], info['misses']), (2, 1))
+        self.assertAlmostEqual(info['hit_rate'], 2 / 3.0)
+
@@ -0,0 +1,60 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from Distiller.reports import ReportWriter, write_reports, report_files, iter_report
+
+docmap = dict((doc_id, {'id': doc_id, 'tokenized_body': [u'word'] * doc_id, 'keywords': [[u'word', 0.5]]})
+              for doc_id in range(1, 21))
+keymap = {u'word': [str(doc_id) for doc_id in range(1, 21)], u'caf\xe9': ['3']}
+
+
+class TestReports(unittest.TestCase):
+    """
+    Checks that reports written record by record read back as the collections they hold.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + '/'
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_JsonObject(self):
+        """
+        A json report holds the same object as json.dump of the whole collection.
+        """
+        files = ReportWriter(self.path, 'keymap').write_all(keymap).close()
+        self.assertEqual(files, [self.path + 'keymap.json'])
+        with open(files[0]) as report:
+            self.assertEqual(report.read(), json.dumps(keymap))
+
+        files = ReportWriter(self.path, 'empty').write_all({}).close()
+        self.assertEqual(json.load(open(files[0])), {})
+
+    def test_Shards(self):
+        """
+        Sharded reports keep each file under shard_size bytes and read back whole, in both formats.
+        """
+        for export_format in ('json', 'jsonl'):
+            writer = ReportWriter(self.path, 'docmap' + export_format, export_format, compress=True, shard_size=400)
+            files = writer.write_all(sorted(docmap.items())).close()
+            self.assertTrue(len(files) > 1)
+            for file_name in files:
+                self.assertTrue(file_name.endswith('.gz'))
+                self.assertTrue(len(gzip.open(file_name).read()) <= 400)
+            self.assertEqual(dict((int(key), value) for key, value in iter_report(self.path, 'docmap' + export_format)),
+                             docmap)
+
+    def test_WriteReports(self):
+        """
+        Reports written concurrently match the collections, and replace the files of earlier runs.
+        """
+        write_reports(self.path, [('docmap', docmap), ('keymap', keymap)], 'jsonl', shard_size=200)
+        files = write_reports(self.path, [('docmap', docmap.iteritems()), ('keymap', keymap)], workers=2)
+        self.assertEqual(files, {'docmap': [self.path + 'docmap.json'], 'keymap': [self.path + 'keymap.json']})
+        self.assertEqual(report_files(self.path, 'docmap'), files['docmap'])
+        self.assertEqual(dict(iter_report(self.path, 'keymap')), keymap)
+        self.assertEqual(sorted(os.listdir(self.path)), ['docmap.json', 'keymap.json'])
@@ -0,0 +1,63 @@
+import random
+import unittest
+from collections import Counter
+from Distiller.sketch import CountMinSketch, HeavyHitters
+
+generator = random.Random(2)
+# A heavy tailed stream: a few very frequent items and many rare ones.
+stream = [u'item {0}'.format(int(generator.paretovariate(0.8))) for count in range(20000)]
+counts = Counter(stream)
+
+
+class TestCountMinSketch(unittest.TestCase):
+    """
+    Checks the estimates of the sketch stay within its error bounds.
+    """
+
+    def test_Size(self):
+        """
+        The table is sized from epsilon and delta.
+        """
+        sketch = CountMinSketch(epsilon=0.01, delta=0.01)
+        self.assertEqual((sketch.width, sketch.depth), (272, 5))
+
+    def test_Bounds(self):
+        """
+        No estimate is below the true count, and no more than a delta share of the estimates
+        exceed it by epsilon * total.
+        """
+        epsilon = 0.01
+        sketch = CountMinSketch(epsilon=epsilon, delta=0.01)
+        for item in stream:
+            sketch.add(item)
+        errors = [sketch.estimate(item) - count for item, count in counts.items()]
+        self.assertTrue(min(errors) >= 0)
+        self.assertTrue(sum(1 for error in errors if error > epsilon * len(stream)) <= 0.01 * len(errors))
+        self.assertEqual(sketch.estimate(u'never added'), 0)
+
+
+class TestHeavyHitters(unittest.TestCase):
+    """
+    Checks the most frequent items are found within the error bounds.
+    """
+
+    def test_Top(self):
+        """
+        Every item counted more often than the smallest reported count is reported, and the
+        reported counts are within epsilon * total above the true counts.
+        """
+        epsilon = 0.01
+        reported = HeavyHitters(top=20, epsilon=epsilon).update(stream).counts()
+        self.assertEqual(len(reported), 20)
+        smallest = min(reported.values())
+        self.assertEqual([item for item, count in counts.items() if count > smallest and item not in reported], [])
+        for item, count in reported.items():
+            self.assertTrue(counts[item] <= count <= counts[item] + epsilon * len(stream))
+        self.assertEqual(set(reported), set(item for item, count in counts.most_common(20)))
+
+    def test_Few(self):
+        """
+        With fewer distinct items than tracked, every item is reported.
+        """
+        reported = HeavyHitters(top=10).update([u'a', u'b', u'a', u'c', u'a']).counts()
+        self.assertEqual(reported, {u'a': 3, u'b': 1, u'c': 1})
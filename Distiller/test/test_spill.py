@@ -0,0 +1,58 @@
+import unittest
+from array import array
+from Distiller.document import Document
+from Distiller.spill import DocumentSpill, array_bytes
+
+
+def document(doc_id, length):
+    return Document(doc_id, 'http://bug/{0}'.format(doc_id), '', array('I', range(length)),
+                    array('I', range(0, length, 2)), array('B', [1] * len(range(0, length, 2))))
+
+
+class TestDocumentSpill(unittest.TestCase):
+    """
+    Checks the arrays of spilled documents are released, and read back whole.
+    """
+
+    def setUp(self):
+        self.spill = DocumentSpill()
+
+    def tearDown(self):
+        self.spill.close()
+
+    def test_Roundtrip(self):
+        """
+        Spilled documents hold no arrays until restored, and then equal their originals.
+        """
+        documents = [document(doc_id, length) for doc_id, length in ((1, 10), (2, 0), (3, 1000))]
+        for spilled in documents:
+            spilled.keywords = [(0, 0.5)]
+            self.spill.spill(spilled)
+        self.assertEqual(documents[0].body, None)
+        self.assertEqual(documents[0].keywords, [(0, 0.5)])
+        for original, spilled in reversed(zip([document(1, 10), document(2, 0), document(3, 1000)], documents)):
+            self.assertTrue(self.spill.restore(spilled))
+            original.keywords = [(0, 0.5)]
+            self.assertEqual(spilled, original)
+            self.spill.release(spilled)
+        self.assertFalse(self.spill.restore(document(4, 10)))
+        self.assertEqual(self.spill.info(), {'documents': 3, 'bytes': 3 * 16 + 4 * 1010 + 4 * 505 + 505 + 4 * 505,
+                                             'reads': 3})
+
+    def test_Respill(self):
+        """
+        A document spilled again, and its near-duplicates, read back its latest arrays.
+        """
+        spilled = document(1, 10)
+        self.spill.spill(spilled)
+        self.spill.restore(spilled)
+        spilled.remap(array('I', reversed(range(10))), array('B', [0, 0]))
+        remapped = document(1, 10)
+        remapped.__setstate__(spilled.__getstate__())
+        self.spill.spill(spilled)
+        self.spill.alias(2, 1)
+        duplicate = spilled.duplicate(2, 'http://bug/2', '')
+        for restored in (spilled, duplicate):
+            self.spill.restore(restored)
+            self.assertEqual((restored.body, restored.tags), (remapped.body, remapped.tags))
+        self.assertEqual(array_bytes(spilled), 4 * 10 + 4 * 5 + 5 + 4 * 5)
@@ -0,0 +1,83 @@
+import json
+import shutil
+import tempfile
+import unittest
+from Distiller.distiller import Distiller
+from Distiller.store import CorpusStore
+
+data = 'data/data.json'
+
+nlp_args = {
+    'normalize': True,
+    'stem': False,
+    'lemmatize': False,
+    'tfidf_cutoff': 0.0001,
+    'pos_list': ['NN', 'NP', 'JJ'],
+    'black_list': []
+}
+
+
+def read_report(path, name):
+    with open(path + name + '.json') as report:
+        return json.load(report)
+
+
+class TestCorpusStore(unittest.TestCase):
+    """
+    Checks that incremental updates to a store reproduce a full Distiller run.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + '/'
+        with open(data) as d:
+            self.jdata = json.load(d)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_IncrementalUpdates(self):
+        """
+        Adds, deletes and re-adds documents across reopened stores and compares the reports.
+        """
+        Distiller(data, self.path + 'full', nlp_args, verbosity=3)
+        documents = self.jdata['documents']
+
+        store = CorpusStore(self.path + 'store', nlp_args, self.jdata['metadata']['base_url'])
+        store.add(documents[:2])
+        store.export(self.path + 'partial')
+        store.close()
+
+        store = CorpusStore(self.path + 'store')
+        store.add(documents[2:])
+        store.delete([documents[0]['id']])
+        store.update(documents[:1])
+        store.export(self.path + 'incremental')
+        store.close()
+
+        for name in ['keywords', 'bigrams', 'trigrams', 'docmap']:
+            self.assertEqual(read_report(self.path + 'full/', name),
+                             read_report(self.path + 'incremental/', name))
+        full = read_report(self.path + 'full/', 'keymap')
+        incremental = read_report(self.path + 'incremental/', 'keymap')
+        self.assertEqual(set(full), set(incremental))
+        for keyword in full:
+            self.assertEqual(sorted(full[keyword]), sorted(incremental[keyword]))
+
+    def test_ExportOrder(self):
+        """
+        Exports a store of more than ten documents, and checks the keymap lists the documents of
+        each keyword in the order of a Distiller run, by numeric id.
+        """
+        documents = [dict(document, id=number * len(self.jdata['documents']) + position + 1)
+                     for number in range(4) for position, document in enumerate(self.jdata['documents'])]
+        with open(self.path + 'data.json', 'w') as out:
+            json.dump(dict(self.jdata, documents=documents), out)
+        Distiller(self.path + 'data.json', self.path + 'full', nlp_args, verbosity=3)
+        store = CorpusStore(self.path + 'store', nlp_args, self.jdata['metadata']['base_url'])
+        store.add(documents)
+        store.export(self.path + 'stored')
+        store.close()
+        full = read_report(self.path + 'full/', 'keymap')
+        self.assertEqual(read_report(self.path + 'stored/', 'keymap'), full)
+        # Some keyword is found both in documents 1 to 9 and in documents 10 to 12.
+        self.assertTrue(any(min(map(int, ids)) < 10 <= max(map(int, ids)) for ids in full.values()))
@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+from Distiller.preprocessing.pipeline import Pipeline, register_tagger, TAGGERS
+from Distiller.preprocessing.taggers import LexiconTagger, accuracy
+
+sentences = [
+    [(u'The', 'DT'), (u'page', 'NN'), (u'crashes', 'VBZ'), (u'on', 'IN'), (u'load', 'NN')],
+    [(u'The', 'DT'), (u'crashes', 'NNS'), (u'are', 'VBP'), (u'rare', 'JJ')],
+    [(u'Crashes', 'NNS'), (u'happen', 'VBP')]
+]
+
+
+class TestLexiconTagger(unittest.TestCase):
+    """
+    Checks the lexicon and suffix rules tagger, and its selection as a Pipeline backend.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_Train(self):
+        """
+        Words get their most frequent tag, looked up as written and then in lowercase, and unknown
+        words a tag from their shape.
+        """
+        tagger = LexiconTagger.train(sentences)
+        self.assertEqual(tagger.lexicon[u'crashes'], 'NNS')
+        self.assertEqual(tagger.tag([u'Crashes', u'CRASHES', u'The', u'loading', u'quickly', u'Samsa', u'1912',
+                                     u'vermin', u'bugs']),
+                         [(u'Crashes', 'NNS'), (u'CRASHES', 'NNS'), (u'The', 'DT'), (u'loading', 'VBG'),
+                          (u'quickly', 'RB'), (u'Samsa', 'NNP'), (u'1912', 'CD'), (u'vermin', 'NN'),
+                          (u'bugs', 'NNS')])
+        self.assertEqual(accuracy(tagger.tag_sents([[word for word, tag in sentence] for sentence in sentences]),
+                                  sentences), 10 / 11.0)
+
+    def test_Backend(self):
+        """
+        A saved lexicon is loaded as the tagger of a pipeline, and unknown backends are refused.
+        """
+        model = os.path.join(self.path, 'lexicon.json')
+        LexiconTagger.train(sentences).save(model)
+        self.assertEqual(LexiconTagger.load(model).lexicon, LexiconTagger.train(sentences).lexicon)
+        pipeline = Pipeline(tagger='lexicon', tagger_model=model)
+        self.assertEqual(pipeline.pos_tag_tokens([u'The', u'page']), [(u'The', 'DT'), (u'page', 'NN')])
+        self.assertRaises(ValueError, Pipeline, tagger='missing')
+        register_tagger('fixed', lambda model: LexiconTagger(default=model))
+        try:
+            self.assertEqual(Pipeline(tagger='fixed', tagger_model='JJ').pos_tag_tokens([u'rare']), [(u'rare', 'JJ')])
+        finally:
+            del TAGGERS['fixed']
@@ -0,0 +1,147 @@
+import math
+import unittest
+from nltk import FreqDist
+from Distiller.features.tf_idf import TF_IDF, count_document_frequencies, select_scores
+from Distiller.features.tfidf_matrix import TF_IDF_Matrix, numpy
+from Distiller.preprocessing.vocabulary import Vocabulary
+
+bodies = [
+    u'the blind text far far away from the blind world of grammar'.split(),
+    u'gregor samsa woke from troubled dreams in his bed'.split(),
+    u'a wonderful serenity of my entire soul like mornings of spring'.split(),
+    u''.split()
+]
+
+candidates = [
+    [u'blind', u'text', u'world', u'grammar', u'Away'],
+    [u'gregor', u'samsa', u'bed', u'dreams', u'world'],
+    [u'serenity', u'soul', u'spring', u'missing'],
+    []
+]
+
+
+class OriginalTF_IDF():
+    """
+    The tf-idf scorer as first written, scoring over the processed tokens of the documents, that
+    the engines must keep matching.
+    """
+
+    def __init__(self, documents):
+        self.idf_cache = {}
+        self.documents = documents
+        self.docs_number = len(documents)
+
+    def compute(self, candidates, document):
+        tfs = self.compute_tf(candidates, document)
+        idfs = self.compute_idf(candidates)
+        return sorted(map(lambda x, y: (x[0], x[1] * y[1]), tfs, idfs), key=lambda item: item[1], reverse=True)
+
+    def compute_tf(self, candidates, document):
+        dist = FreqDist(document)
+        score_tf = lambda w, doc: dist[w.lower()] / float(len(doc))
+        return [(word, score_tf(word, document)) for word in sorted(candidates)]
+
+    def compute_idf(self, candidates):
+        idfs = []
+        score_idf = lambda w: sum([1 for d in self.documents if w.lower() in d])
+        for word in set(sorted(candidates)):
+            if not self.idf_cache.has_key(word):
+                idf = math.log(self.docs_number / 1.0 + score_idf(word))
+                self.idf_cache[word] = idf
+            else:
+                idf = self.idf_cache[word]
+            idfs.append((word, idf))
+        return idfs
+
+
+class TestTFIDF(unittest.TestCase):
+    """
+    Checks tf-idf scores and that both engines agree.
+    """
+
+    def test_DocumentFrequency(self):
+        """
+        Every candidate scores log(4) for idf over four documents, as with the original scorer.
+        """
+        tfidf = TF_IDF(candidates)
+        idfs = dict(tfidf.compute_idf([u'world', u'blind']))
+        self.assertEqual(idfs, {u'world': math.log(4), u'blind': math.log(4)})
+
+    def test_OriginalScores(self):
+        """
+        Both engines, from the documents or from counted document frequencies, return exactly the
+        lists the original scorer returns over the processed tokens of the documents.
+        """
+        processed = [[(word, 'NN') for word in words] for words in candidates]
+        expected = [OriginalTF_IDF(processed).compute(words, body) for words, body in zip(candidates, bodies)]
+        doc_freqs = {}
+        for document in candidates:
+            count_document_frequencies(doc_freqs, document)
+        engines = [TF_IDF(candidates), TF_IDF(doc_freqs=doc_freqs, docs_number=len(candidates))]
+        for tfidf in engines:
+            self.assertEqual([tfidf.compute(words, body) for words, body in zip(candidates, bodies)], expected)
+        if numpy is not None:
+            self.assertEqual(TF_IDF_Matrix(candidates).compute_all(candidates, bodies), expected)
+
+    def test_DocumentFrequencyCounts(self):
+        """
+        Scores from counted document frequencies match scores from the bodies of docs.
+        """
+        doc_freqs = {}
+        for document in candidates:
+            count_document_frequencies(doc_freqs, document)
+        counted = TF_IDF(doc_freqs=doc_freqs, docs_number=len(candidates))
+        scanned = TF_IDF(candidates)
+        for words, body in zip(candidates, bodies):
+            self.assertEqual(counted.compute(words, body), scanned.compute(words, body))
+
+    def test_TopScores(self):
+        """
+        The top scores and the scores above a cutoff are the head of the full sorted list, ties
+        kept in order.
+        """
+        scores = [(u'a', 0.5), (u'b', 0.1), (u'c', 0.5), (u'd', 0.9), (u'e', 0.0)]
+        self.assertEqual(select_scores(scores), [(u'd', 0.9), (u'a', 0.5), (u'c', 0.5), (u'b', 0.1), (u'e', 0.0)])
+        self.assertEqual(select_scores(scores, top=2), [(u'd', 0.9), (u'a', 0.5)])
+        self.assertEqual(select_scores(scores, cutoff=0.1), [(u'd', 0.9), (u'a', 0.5), (u'c', 0.5)])
+        self.assertEqual(select_scores(scores, top=10, cutoff=0.0), select_scores(scores)[:4])
+        tfidf = TF_IDF(candidates)
+        for words, body in zip(candidates, bodies):
+            self.assertEqual(tfidf.compute(words, body, top=2), tfidf.compute(words, body)[:2])
+
+    @unittest.skipIf(numpy is None, "numpy and scipy are not installed")
+    def test_MatrixEngine(self):
+        """
+        The matrix engine returns exactly the lists TF_IDF returns.
+        """
+        expected = [TF_IDF(candidates).compute(words, body) for words, body in zip(candidates, bodies)]
+        self.assertEqual(TF_IDF_Matrix(candidates).compute_all(candidates, bodies), expected)
+        freq_dists = [FreqDist(body) for body in bodies]
+        self.assertEqual(TF_IDF_Matrix(candidates).compute_all(candidates, bodies, freq_dists), expected)
+
+        doc_freqs = {}
+        for document in candidates:
+            count_document_frequencies(doc_freqs, document)
+        matrix = TF_IDF_Matrix(doc_freqs=doc_freqs, docs_number=len(candidates))
+        self.assertEqual([matrix.compute(words, body) for words, body in zip(candidates, bodies)], expected)
+        self.assertEqual(matrix.compute_all(candidates, bodies, top=2), [scores[:2] for scores in expected])
+
+    def test_VocabularyIds(self):
+        """
+        Scores over the ids of a sorted Vocabulary decode to the scores over the tokens.
+        """
+        vocabulary = Vocabulary()
+        encoded_candidates = [vocabulary.encode(words) for words in candidates]
+        encoded_bodies = [vocabulary.encode(body) for body in bodies]
+        token_ids = vocabulary.sort()
+        encoded_candidates = [[token_ids[word] for word in words] for words in encoded_candidates]
+        encoded_bodies = [[token_ids[word] for word in body] for body in encoded_bodies]
+        decode = lambda scores: [(vocabulary.tokens[word], score) for word, score in scores]
+
+        expected = [TF_IDF(candidates).compute(words, body) for words, body in zip(candidates, bodies)]
+        tfidf = TF_IDF(encoded_candidates, lowered=vocabulary.lowered())
+        self.assertEqual([decode(tfidf.compute(words, body)) for words, body in zip(encoded_candidates, encoded_bodies)],
+                         expected)
+        if numpy is not None:
+            matrix = TF_IDF_Matrix(encoded_candidates, lowered=vocabulary.lowered())
+            self.assertEqual(map(decode, matrix.compute_all(encoded_candidates, encoded_bodies)), expected)
@@ -0,0 +1,88 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from StringIO import StringIO
+from Distiller.worker import Worker, submit
+
+data = 'data/data.json'
+
+
+class TestWorker(unittest.TestCase):
+    """
+    Checks that a resident worker runs jobs sent over stdin/stdout or a Unix socket.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_LazyImports(self):
+        """
+        Importing Distiller leaves nltk unloaded until it is needed.
+        """
+        code = "import sys, Distiller.distiller, Distiller.worker; sys.exit('nltk' in sys.modules)"
+        self.assertEqual(subprocess.call([sys.executable, '-c', code]), 0)
+
+    def test_Stream(self):
+        """
+        Jobs run one per line, failures are reported without stopping the worker, and stop ends it.
+        """
+        target = os.path.join(self.path, 'reports')
+        jobs = [
+            'not json',
+            json.dumps({'id': 1, 'document_file': os.path.join(self.path, 'missing.json'), 'target_path': target}),
+            '',
+            json.dumps({'id': 2, 'document_file': data, 'target_path': target, 'nlp_args': {'stem': False},
+                        'run_args': {'metrics': False}}),
+            json.dumps({'id': 3, 'command': 'stop'}),
+            json.dumps({'id': 4, 'document_file': data, 'target_path': target})
+        ]
+        output = StringIO()
+        worker = Worker()
+        worker.serve_stream(StringIO('\n'.join(jobs) + '\n'), output)
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+
+        self.assertEqual([result['id'] for result in results], [None, 1, 2, 3])
+        self.assertEqual([result['ok'] for result in results], [False, False, True, True])
+        self.assertTrue(results[0]['error'].startswith('ValueError'))
+        self.assertTrue(results[1]['error'].startswith('IOError'))
+        self.assertEqual(results[2]['metrics']['documents'], 3)
+        self.assertTrue(os.path.exists(os.path.join(target, 'docmap.json')))
+        self.assertFalse(worker.running)
+        self.assertEqual(worker.jobs, 1)
+
+    def test_Socket(self):
+        """
+        Jobs sent over the socket get their results back, connection after connection.
+        """
+        path = os.path.join(self.path, 'worker.sock')
+        worker = Worker()
+        thread = threading.Thread(target=worker.serve_socket, args=(path,))
+        thread.daemon = True
+        thread.start()
+        while not os.path.exists(path):
+            time.sleep(0.01)
+
+        stopped = None
+        try:
+            result = submit(path, {'id': 'a', 'document_file': os.path.join(self.path, 'missing.json'),
+                                   'target_path': self.path})
+            self.assertEqual((result['id'], result['ok']), ('a', False))
+            result = submit(path, {'id': 'b', 'document_file': data, 'target_path': self.path})
+            self.assertEqual((result['id'], result['ok']), ('b', True))
+            stopped = submit(path, {'command': 'stop'})
+        finally:
+            # Stop the worker even when an assertion failed, so the run does not hang on it.
+            if stopped is None and thread.is_alive():
+                submit(path, {'command': 'stop'})
+            thread.join()
+        self.assertEqual(stopped, {'id': None, 'ok': True})
+        self.assertFalse(os.path.exists(path))
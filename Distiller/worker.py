@@ -0,0 +1,193 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import sys
+import time
+
+from Distiller.distiller import Distiller, run_configurations
+from Distiller.model import CorpusModel, Scorer
+from Distiller.preprocessing.pipeline import Pipeline, shared
+
+__author__ = 'fcanas'
+
+
+class Worker():
+    """
+    A long running Distiller process for workloads of many small jobs. nltk, the POS tagger, the
+    stop words, the stemmer and the WordNet lemmatizer are loaded once by warm_up, and every job
+    after that runs the same pipeline as Distiller with them already in memory. A job run with
+    several workers forks its pool from the warm process, so the pool starts warm too.
+
+    Jobs and their results are single lines of JSON, run one at a time in the order received:
+
+    {"id": ..., "document_file": "...", "target_path": "...", "nlp_args": {...}, "run_args": {...}}
+    {"id": ..., "ok": true, "seconds": 0.42, "metrics": {...}}
+    {"id": ..., "ok": false, "error": "IOError: ..."}
+
+    id, nlp_args and run_args are optional, and relative paths are relative to the worker's
+    working directory. {"command": "stop"} stops the worker. A job with "configurations", a list of
+    nlp_args or a dict of name => nlp_args, in place of nlp_args runs them all over the documents,
+    tagged once (see distiller.run_configurations), and its metrics are those of every run.
+
+    Documents are scored against a corpus model (see model.Scorer) by a score job, the model being
+    loaded by the first job that names it and kept for the next ones:
+
+    {"id": ..., "command": "score", "model": "...", "documents": ["body", {"id": INT, "body": "..."}, ...]}
+    {"id": ..., "ok": true, "seconds": 0.004, "results": [{"id": ..., "keywords": [...], ...}, ...]}
+    """
+
+    def __init__(self, verbosity=0):
+        self.verbosity = verbosity
+        self.running = True
+        self.jobs = 0
+        self.scorers = {}
+
+    def warm_up(self):
+        """
+        Load every nltk resource a job can need.
+        """
+        start = time.time()
+        Pipeline().load_resources()
+        shared('stemmer').stem(u'documents')
+        shared('lemmatizer').lemmatize(u'documents')
+        logging.info("worker ready in {0:.2f}s".format(time.time() - start))
+
+    def run(self, job):
+        """
+        Input: a job dict.
+        Output: the result dict of the job.
+        """
+        if job.get('command') == 'stop':
+            self.running = False
+            return {'id': job.get('id'), 'ok': True}
+        start = time.time()
+        if job.get('command') == 'score':
+            return {'id': job.get('id'), 'ok': True, 'results': self.score(job['model'], job['documents']),
+                    'seconds': time.time() - start}
+        if 'configurations' in job:
+            distillers = run_configurations(job['document_file'],
+                                            job['target_path'],
+                                            job['configurations'],
+                                            verbosity=self.verbosity,
+                                            run_args=job.get('run_args') or {})
+            metrics = [distiller.metrics.report() for distiller in distillers]
+        else:
+            distiller = Distiller(job['document_file'],
+                                  job['target_path'],
+                                  job.get('nlp_args') or {},
+                                  verbosity=self.verbosity,
+                                  run_args=job.get('run_args') or {})
+            metrics = distiller.metrics.report()
+        self.jobs += 1
+        return {'id': job.get('id'), 'ok': True, 'seconds': time.time() - start, 'metrics': metrics}
+
+    def score(self, model, documents):
+        """
+        Input: the path of a corpus model, and the documents to score against it.
+        Output: [{id, feature: value, ...}, ...] of the documents, see model.Scorer.
+        """
+        if model not in self.scorers:
+            self.scorers[model] = Scorer(CorpusModel.load(model))
+        self.jobs += 1
+        return self.scorers[model].score_batch(documents)
+
+    def handle(self, line):
+        """
+        Input: a job, as a line of JSON.
+        Output: its result, as a line of JSON. A failed job is reported, never raised, so the
+        worker keeps serving.
+        """
+        job = {}
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("a job must be a JSON object")
+            result = self.run(job)
+        except Exception as e:
+            logging.error("job failed: {0}: {1}".format(type(e).__name__, e))
+            result = {'id': job.get('id'), 'ok': False, 'error': "{0}: {1}".format(type(e).__name__, e)}
+        return json.dumps(result) + '\n'
+
+    def serve_stream(self, input, output):
+        """
+        Run the jobs read from the input file, one per line, writing each result to the output
+        file as soon as it is done, until the input ends or the worker is stopped.
+        """
+        for line in iter(input.readline, ''):
+            if not line.strip():
+                continue
+            output.write(self.handle(line))
+            output.flush()
+            if not self.running:
+                break
+
+    def serve_socket(self, path):
+        """
+        Listen on the Unix socket path, serving one connection at a time, until the worker is stopped.
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(path)
+            server.listen(5)
+            logging.info("worker listening on {0}".format(path))
+            while self.running:
+                connection, address = server.accept()
+                input = connection.makefile('rb')
+                output = connection.makefile('wb')
+                try:
+                    self.serve_stream(input, output)
+                except socket.error as e:
+                    logging.warning("connection lost: {0}".format(e))
+                finally:
+                    input.close()
+                    output.close()
+                    connection.close()
+        finally:
+            server.close()
+            os.remove(path)
+
+
+def submit(path, job):
+    """
+    Send a job to the worker listening on the Unix socket path, and wait for it to finish.
+    Output: the result dict of the job.
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+        connection.sendall(json.dumps(job) + '\n')
+        result = connection.makefile('rb')
+        try:
+            return json.loads(result.readline())
+        finally:
+            result.close()
+    finally:
+        connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Distiller jobs in a warm, long running process.")
+    parser.add_argument('--socket', help="listen on this Unix socket instead of reading jobs from stdin")
+    parser.add_argument('--verbosity', type=int, default=0, help="logging verbosity of the jobs, 0 to 3")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s %(levelname)s: %(message)s',
+                        level=Distiller.get_logging_level(args.verbosity))
+    worker = Worker(args.verbosity)
+    worker.warm_up()
+    if args.socket:
+        worker.serve_socket(args.socket)
+    else:
+        # Results are the only thing written to stdout; anything else printed goes to stderr.
+        output = sys.stdout
+        sys.stdout = sys.stderr
+        worker.serve_stream(sys.stdin, output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
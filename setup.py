@@ -9,7 +9,8 @@ setup(
             'Distiller',
             'Distiller.test',
             'Distiller.features',
-            'Distiller.preprocessing'
+            'Distiller.preprocessing',
+            'Distiller.benchmarks'
         ],
         data_files=[('data', ['data/data.json'])],
         url='https://github.com/FranciscoCanas/Distiller',